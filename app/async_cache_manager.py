@@ -0,0 +1,223 @@
+"""
+Async counterpart of app/cache_manager.py built on `redis.asyncio`.
+
+Shares key formats, the value codec, the quota Lua script, the local cache tier
+and metrics with the sync API, so both can read each other's entries.
+"""
+import json
+import time
+import asyncio
+import weakref
+import redis.asyncio as aioredis
+
+from app import cache_manager
+from app.cache_codec import encode_value, decode_value, key_family
+from app.cache_metrics import cache_metrics
+from app.cache_manager import (
+    CHECK_AND_INCREMENT_LUA, local_cache, user_session_key, ai_memory_key, query_cache_key, usage_counter_key,
+    usage_rollup_key, usage_generation_key, usage_period_ttl, billing_month, period_id,
+    _local_cache_active, _queue_cached_set,
+)
+
+_async_clients = weakref.WeakKeyDictionary()  # ✅ event loop -> clients (asyncio connections are loop-bound)
+
+
+class _AsyncPipelineAdapter:
+    """Async facade over a sync pipeline of the in-memory backends."""
+
+    def __init__(self, pipeline):
+        self._pipeline = pipeline
+
+    def __getattr__(self, name):
+        return getattr(self._pipeline, name)
+
+    async def execute(self, raise_on_error=True):
+        return self._pipeline.execute()
+
+
+class _AsyncClientAdapter:
+    """Async facade over the in-memory backends (no I/O, so calling them inline never blocks the loop)."""
+
+    def __init__(self, client):
+        self._client = client
+
+    def __getattr__(self, name):
+        method = getattr(self._client, name)
+
+        async def call(*args, **kwargs):
+            return method(*args, **kwargs)
+
+        return call
+
+    def pipeline(self, transaction=True):
+        return _AsyncPipelineAdapter(self._client.pipeline(transaction))
+
+    def register_script(self, script):
+        sync_script = self._client.register_script(script)
+
+        async def call(keys=None, args=None, client=None):
+            return sync_script(keys=keys, args=args)
+
+        return call
+
+
+class _AsyncClients:
+    def __init__(self, client, binary_client):
+        self.client = client
+        self.binary_client = binary_client
+        self.check_and_increment = client.register_script(CHECK_AND_INCREMENT_LUA)
+
+
+def get_async_clients():
+    """Returns the async (text, binary) clients for the running event loop, creating them on first use."""
+    loop = asyncio.get_running_loop()
+    clients = _async_clients.get(loop)
+    if clients is None:
+        backend = cache_manager.cache_backend
+        if backend.name == "redis":
+            clients = _AsyncClients(
+                aioredis.Redis.from_url(backend.url, max_connections=backend.pool_size, decode_responses=True),
+                aioredis.Redis.from_url(backend.url, max_connections=backend.pool_size, decode_responses=False),
+            )
+        else:
+            clients = _AsyncClients(_AsyncClientAdapter(backend.client), _AsyncClientAdapter(backend.binary_client))
+        _async_clients[loop] = clients
+    return clients
+
+
+async def close_async_clients():
+    """Closes the connection pools of the running event loop's clients."""
+    clients = _async_clients.pop(asyncio.get_running_loop(), None)
+    if clients is not None and cache_manager.cache_backend.name == "redis":
+        await clients.client.aclose()
+        await clients.binary_client.aclose()
+
+
+async def _cached_get(key):
+    """Async version of cache_manager._cached_get (local tier, codec and metrics included)."""
+    family = key_family(key)
+    start = time.perf_counter()
+    try:
+        use_local = _local_cache_active()
+        if use_local:
+            value = local_cache.get(key)
+            if value is not None:
+                cache_metrics.record_hit(family, value, tier="local")
+                return value
+
+        pipe = get_async_clients().binary_client.pipeline(transaction=False)
+        pipe.get(key)
+        pipe.ttl(key)
+        data, ttl = await pipe.execute()
+        value = decode_value(data)
+        if value is not None and use_local:
+            local_cache.set(key, value, ttl if ttl and ttl > 0 else None)
+
+        if value is None:
+            cache_metrics.record_miss(family)
+        else:
+            cache_metrics.record_hit(family, value)
+        return value
+    finally:
+        cache_metrics.observe_latency(family, "get", time.perf_counter() - start)
+
+
+async def _cached_set(key, value, expiration):
+    """Async version of cache_manager._cached_set."""
+    start = time.perf_counter()
+    data = encode_value(value)
+
+    pipe = get_async_clients().binary_client.pipeline(transaction=False)
+    _queue_cached_set(pipe, key, value, data, expiration)
+    await pipe.execute()
+    if _local_cache_active():
+        local_cache.set(key, value, expiration)
+
+    cache_metrics.record_write(key_family(key), len(data))
+    cache_metrics.observe_latency(key_family(key), "set", time.perf_counter() - start)
+
+
+async def store_user_session(user_id, session_data, expiration=3600):
+    """Stores user session data in Redis for 1 hour (default)."""
+    await _cached_set(user_session_key(user_id), json.dumps(session_data), expiration)
+
+
+async def get_user_session(user_id):
+    """Retrieves stored user session data safely."""
+    session_data = await _cached_get(user_session_key(user_id))
+    if session_data:
+        try:
+            return json.loads(session_data)
+        except json.JSONDecodeError:
+            return None
+    return None
+
+
+async def store_ai_memory(user_id, query, response, expiration=86400):
+    """Stores AI memory (query-response pairs) in Redis for 24 hours."""
+    await _cached_set(ai_memory_key(user_id), json.dumps({"query": query, "response": response}), expiration)
+
+
+async def get_ai_memory(user_id):
+    """Retrieves stored AI memory for continuity in follow-ups."""
+    memory_data = await _cached_get(ai_memory_key(user_id))
+    if memory_data:
+        try:
+            return json.loads(memory_data)
+        except json.JSONDecodeError:
+            return None
+    return None
+
+
+async def cache_response(query, response, expiration=86400):
+    """Stores query responses in Redis for a set expiration (default: 24 hours)."""
+    await _cached_set(query_cache_key(query), str(response), expiration)
+
+
+async def get_cached_response(query):
+    """Retrieves cached response from Redis, if available."""
+    cached_response = await _cached_get(query_cache_key(query))
+    return str(cached_response) if cached_response else ""
+
+
+async def current_usage_period():
+    """Async version of cache_manager.current_usage_period."""
+    month = billing_month()
+    key = usage_generation_key(month)
+    generation = await _cached_get(key)
+    if generation is None:
+        await get_async_clients().client.set(key, 0, nx=True, ex=usage_period_ttl(month))
+        generation = await _cached_get(key) or 0
+    return period_id(month, generation)
+
+
+async def get_usage_count(user_id, service_type, period=None):
+    """Reads a usage counter for the current (or given) billing period without consuming anything."""
+    period = period or await current_usage_period()
+    count = await get_async_clients().client.get(usage_counter_key(user_id, service_type, period))
+    return int(count) if count and str(count).isdigit() else 0
+
+
+async def check_and_increment_usage(user_id, service_type, limit, expiration=None):
+    """Atomic check-and-increment of a usage counter (same Lua script as the sync API)."""
+    period = await current_usage_period()
+    if expiration is None:
+        expiration = usage_period_ttl()
+    allowed, remaining = await get_async_clients().check_and_increment(
+        keys=[usage_counter_key(user_id, service_type, period), usage_rollup_key(period)],
+        args=[int(limit), int(expiration), f"{user_id}:{service_type}"],
+    )
+    return bool(allowed), int(remaining)
+
+
+async def prefetch_request_state(user_id, cache_key, service_type="queries"):
+    """
+    Runs the cache lookup, the quota read and the session fetch concurrently.
+    The quota is only read here; consume it with `check_and_increment_usage` after a cache miss.
+    """
+    cached_response, usage_count, session = await asyncio.gather(
+        get_cached_response(cache_key),
+        get_usage_count(user_id, service_type),
+        get_user_session(user_id),
+    )
+    return {"cached_response": cached_response, "usage_count": usage_count, "session": session}
@@ -0,0 +1,222 @@
+"""
+Async counterpart of the psycopg2 data access in app/database.py, app/user_management.py
+and app/strategy_pdf.py, built on asyncpg.
+
+Uses its own connection pool per event loop, so an async serving path can overlap
+database writes with LLM calls (e.g. `asyncio.create_task(log_user_query(...))`).
+Return shapes match the sync functions (tuples, not asyncpg Records).
+Postgres only: it is not wired to STORAGE_BACKEND (see app/storage_backend.py).
+"""
+import os
+import time
+import asyncio
+import weakref
+import asyncpg
+
+from app.database import (
+    DB_USER, DB_PASSWORD, DB_HOST, DB_PORT, DB_NAME, DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE, DB_POOL_TIMEOUT,
+    DB_POOL_MAX_LIFETIME, HISTORY_PREVIEW_LENGTH, response_hash,
+)
+from app.storage_backend import history_window_start
+
+ASYNC_DB_POOL_MIN_SIZE = int(os.getenv("ASYNC_DB_POOL_MIN_SIZE", str(DB_POOL_MIN_SIZE)))
+ASYNC_DB_POOL_MAX_SIZE = int(os.getenv("ASYNC_DB_POOL_MAX_SIZE", str(DB_POOL_MAX_SIZE)))
+ASYNC_DB_COMMAND_TIMEOUT = float(os.getenv("ASYNC_DB_COMMAND_TIMEOUT", "30"))
+# ✅ Close connections idle this long (asyncpg's max_inactive_connection_lifetime; 0 = never)
+ASYNC_DB_POOL_IDLE_LIFETIME = float(os.getenv("ASYNC_DB_POOL_IDLE_LIFETIME", "300"))
+# ✅ Replace every connection after this many seconds, busy or not (0 = never)
+ASYNC_DB_POOL_MAX_LIFETIME = float(os.getenv("ASYNC_DB_POOL_MAX_LIFETIME", str(DB_POOL_MAX_LIFETIME)))
+
+_async_pools = weakref.WeakKeyDictionary()  # ✅ event loop -> pool task (asyncpg connections are loop-bound)
+_pool_recycled_at = weakref.WeakKeyDictionary()  # ✅ event loop -> monotonic time its connections were last renewed
+
+
+def _create_pool():
+    return asyncpg.create_pool(
+        user=DB_USER,
+        password=DB_PASSWORD,
+        host=DB_HOST,
+        port=int(DB_PORT) if DB_PORT else None,
+        database=DB_NAME,
+        min_size=ASYNC_DB_POOL_MIN_SIZE,
+        max_size=ASYNC_DB_POOL_MAX_SIZE,
+        timeout=DB_POOL_TIMEOUT,
+        command_timeout=ASYNC_DB_COMMAND_TIMEOUT,
+        max_inactive_connection_lifetime=ASYNC_DB_POOL_IDLE_LIFETIME,
+    )
+
+
+async def _recycle_expired_connections(loop, pool):
+    """
+    asyncpg only closes idle connections, so busy ones would live forever. Once per
+    ASYNC_DB_POOL_MAX_LIFETIME, mark all of them expired: each is replaced on its next acquire
+    (connections in use finish their work first).
+    """
+    recycled_at = _pool_recycled_at.setdefault(loop, time.monotonic())
+    if ASYNC_DB_POOL_MAX_LIFETIME > 0 and time.monotonic() - recycled_at >= ASYNC_DB_POOL_MAX_LIFETIME:
+        _pool_recycled_at[loop] = time.monotonic()
+        await pool.expire_connections()
+
+
+async def get_async_pool():
+    """Returns the asyncpg pool for the running event loop, creating it on first use."""
+    loop = asyncio.get_running_loop()
+    pool_task = _async_pools.get(loop)
+    if pool_task is None:
+        # ✅ Store the task, not the pool, so concurrent first callers share one pool
+        pool_task = _async_pools[loop] = asyncio.ensure_future(_create_pool())
+    try:
+        pool = await asyncio.shield(pool_task)
+    except Exception:
+        _async_pools.pop(loop, None)  # ✅ Let the next call retry instead of caching the failure
+        raise
+    await _recycle_expired_connections(loop, pool)
+    return pool
+
+
+async def close_async_pool():
+    """Closes the running event loop's pool."""
+    loop = asyncio.get_running_loop()
+    _pool_recycled_at.pop(loop, None)
+    pool_task = _async_pools.pop(loop, None)
+    if pool_task is not None and pool_task.done() and not pool_task.exception():
+        await pool_task.result().close()
+
+
+async def log_user_query(user_id, query, response, plan, archetype=None):
+    """Stores user query logs along with AI responses (response bodies are stored once per content hash)."""
+    body_hash = response_hash(response) if response else None
+    try:
+        pool = await get_async_pool()
+        async with pool.acquire() as conn:
+            async with conn.transaction():
+                if body_hash:
+                    await conn.execute("""
+                        INSERT INTO responses (hash, body, size_bytes) VALUES ($1, $2, $3)
+                        ON CONFLICT (hash) DO NOTHING;
+                    """, body_hash, response, len(response.encode("utf-8")))
+                await conn.execute("""
+                    INSERT INTO query_logs (user_id, query, archetype, response_hash, plan, created_at)
+                    VALUES ($1, $2, $3, $4, $5, CURRENT_TIMESTAMP);
+                """, user_id, query, archetype, body_hash, plan)
+    except Exception as e:
+        print(f"❌ Failed to log user query: {e}")
+
+
+async def log_user_feedback(user_id, query, feedback_text):
+    """Stores user feedback in the database."""
+    try:
+        pool = await get_async_pool()
+        await pool.execute("""
+            INSERT INTO user_feedback (user_id, query, feedback_text, created_at)
+            VALUES ($1, $2, $3, NOW());
+        """, user_id, query, feedback_text)
+    except Exception as e:
+        print(f"❌ Failed to log user feedback: {e}")
+
+
+async def get_recent_queries_with_responses(user_id, limit=10):
+    """Fetches the most recent queries along with their responses."""
+    try:
+        pool = await get_async_pool()
+        rows = await pool.fetch("""
+            SELECT ql.query, r.body, ql.created_at
+            FROM query_logs ql
+            LEFT JOIN responses r ON r.hash = ql.response_hash
+            WHERE ql.user_id = $1 AND ql.created_at >= $2
+            ORDER BY ql.created_at DESC
+            LIMIT $3;
+        """, user_id, history_window_start(), limit)
+        return [tuple(row) for row in rows]
+    except Exception as e:
+        print(f"❌ Failed to fetch recent queries: {e}")
+        return []
+
+
+async def get_query_history(user_id, limit=20, before=None, search=None):
+    """Async version of database.get_query_history (keyset pages, optional full-text search)."""
+    conditions = ["ql.user_id = $2", "ql.created_at >= $3"]
+    params = [HISTORY_PREVIEW_LENGTH, user_id, history_window_start()]
+    if before:
+        params.extend(before)
+        conditions.append(f"(ql.created_at, ql.id) < (${len(params) - 1}, ${len(params)})")
+    if search and search.strip():
+        params.append(search.strip())
+        search_query = f"websearch_to_tsquery('english', ${len(params)})"
+        conditions.append(f"""(ql.search_vector @@ {search_query}
+            OR ql.response_hash IN (SELECT hash FROM responses WHERE search_vector @@ {search_query}))""")
+    params.append(limit + 1)
+
+    try:
+        pool = await get_async_pool()
+        rows = await pool.fetch(f"""
+            SELECT ql.id, ql.created_at, LEFT(ql.query, $1), COALESCE(r.size_bytes, 0)
+            FROM query_logs ql
+            LEFT JOIN responses r ON r.hash = ql.response_hash
+            WHERE {" AND ".join(conditions)}
+            ORDER BY ql.created_at DESC, ql.id DESC
+            LIMIT ${len(params)};
+        """, *params)
+        rows = [tuple(row) for row in rows]
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = (rows[-1][1], rows[-1][0])
+        return rows, next_cursor
+    except Exception as e:
+        print(f"❌ Failed to fetch query history: {e}")
+        return [], None
+
+
+async def get_query_log(user_id, log_id):
+    """Loads the full query and response of one history entry (scoped to its owner)."""
+    try:
+        pool = await get_async_pool()
+        row = await pool.fetchrow("""
+            SELECT ql.query, r.body, ql.created_at
+            FROM query_logs ql
+            LEFT JOIN responses r ON r.hash = ql.response_hash
+            WHERE ql.id = $1 AND ql.user_id = $2;
+        """, log_id, user_id)
+        return tuple(row) if row else None
+    except Exception as e:
+        print(f"❌ Failed to fetch query log {log_id}: {e}")
+        return None
+
+
+async def get_user_by_email(email):
+    """Fetches user details (id, email, plan, is_admin) by email."""
+    try:
+        pool = await get_async_pool()
+        row = await pool.fetchrow("SELECT id, email, plan, is_admin FROM users WHERE email = $1;", email)
+        return tuple(row) if row else None
+    except Exception as e:
+        print(f"❌ Failed to fetch user by email: {e}")
+        return None
+
+
+async def store_generated_pdf(user_id, pdf_filename):
+    """Stores generated strategy reports in the database for user retrieval."""
+    try:
+        pool = await get_async_pool()
+        await pool.execute("""
+            INSERT INTO strategy_reports (user_id, pdf_filename, created_at)
+            VALUES ($1, $2, NOW());
+        """, user_id, pdf_filename)
+    except Exception as e:
+        print(f"❌ Failed to store PDF: {e}")
+
+
+async def get_user_reports(user_id):
+    """Retrieves previously generated strategy reports for a user."""
+    try:
+        pool = await get_async_pool()
+        rows = await pool.fetch(
+            "SELECT pdf_filename, created_at FROM strategy_reports WHERE user_id = $1 ORDER BY created_at DESC;",
+            user_id,
+        )
+        return [tuple(row) for row in rows]  # Returns a list of (pdf_filename, timestamp)
+    except Exception as e:
+        print(f"❌ Failed to fetch reports: {e}")
+        return []
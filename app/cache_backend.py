@@ -0,0 +1,444 @@
+import os
+import math
+import time
+import fnmatch
+import threading
+import redis
+
+# ✅ Backend selection: "redis" (default), "memory" (single process, no server needed) or "none" (caching off)
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "redis").lower()
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+REDIS_POOL_SIZE = int(os.getenv("REDIS_POOL_SIZE", "50"))
+REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", "5"))
+
+# ✅ Python equivalents of our Lua scripts, used by the in-memory backend (which has no Lua engine)
+SCRIPT_FALLBACKS = {}
+
+
+def register_script_fallback(lua_source, fallback):
+    """Registers `fallback(client, keys, args)` as the in-memory implementation of a Lua script."""
+    SCRIPT_FALLBACKS[lua_source] = fallback
+
+
+class CacheBackend:
+    """A cache backend exposes a text client and a byte-level client with the redis-py command API."""
+
+    name = "base"
+
+    def __init__(self, client, binary_client):
+        self.client = client
+        self.binary_client = binary_client
+
+
+class RedisCacheBackend(CacheBackend):
+    """Redis server reached via REDIS_URL, with a bounded connection pool per client."""
+
+    name = "redis"
+
+    def __init__(self, url=REDIS_URL, pool_size=REDIS_POOL_SIZE):
+        self.url = url
+        self.pool_size = pool_size
+        # ✅ Explicitly force Redis into synchronous mode
+        text_pool = redis.ConnectionPool.from_url(
+            url, max_connections=pool_size, socket_timeout=REDIS_SOCKET_TIMEOUT, decode_responses=True
+        )
+        binary_pool = redis.ConnectionPool.from_url(
+            url, max_connections=pool_size, socket_timeout=REDIS_SOCKET_TIMEOUT, decode_responses=False
+        )
+        super().__init__(redis.Redis(connection_pool=text_pool), redis.Redis(connection_pool=binary_pool))
+
+
+class MemoryCacheBackend(CacheBackend):
+    """Single-process in-memory store with TTL semantics, for tests, benchmarks and local runs."""
+
+    name = "memory"
+
+    def __init__(self):
+        store = _MemoryStore()
+        super().__init__(MemoryRedis(store, decode_responses=True), MemoryRedis(store, decode_responses=False))
+
+
+class NullCacheBackend(CacheBackend):
+    """Accepts every write and remembers nothing: every read is a miss, every quota check passes."""
+
+    name = "none"
+
+    def __init__(self):
+        store = _MemoryStore(data=_NullDict())
+        super().__init__(MemoryRedis(store, decode_responses=True), MemoryRedis(store, decode_responses=False))
+
+
+CACHE_BACKENDS = {
+    "redis": RedisCacheBackend,
+    "memory": MemoryCacheBackend,
+    "none": NullCacheBackend,
+}
+
+
+def create_cache_backend(name=CACHE_BACKEND):
+    """Builds the configured cache backend."""
+    if name not in CACHE_BACKENDS:
+        raise ValueError(f"❌ Unknown CACHE_BACKEND '{name}'. Expected one of: {', '.join(CACHE_BACKENDS)}")
+    backend = CACHE_BACKENDS[name]()
+    print(f"✅ Cache backend: {backend.name}")
+    return backend
+
+
+# ✅ In-memory implementation of the redis-py commands the app uses
+class _NullDict(dict):
+    """A dict that silently drops every assignment."""
+
+    def __setitem__(self, key, value):
+        pass
+
+
+class _MemoryStore:
+    """State shared by the text and binary views of an in-memory backend."""
+
+    def __init__(self, data=None):
+        self.data = data if data is not None else {}  # key -> [type, value, expires_at]
+        self.lock = threading.RLock()
+        self.subscribers = {}  # channel -> list of handlers
+
+
+def _to_bytes(value):
+    if isinstance(value, bytes):
+        return value
+    if isinstance(value, str):
+        return value.encode("utf-8")
+    if isinstance(value, float):
+        return repr(value).encode("utf-8")
+    return str(value).encode("utf-8")
+
+
+def _to_key(key):
+    return key.decode("utf-8") if isinstance(key, bytes) else str(key)
+
+
+class MemoryRedis:
+    """Thread-safe subset of the redis-py client API backed by a Python dict."""
+
+    def __init__(self, store, decode_responses=True):
+        self._store = store
+        self.decode_responses = decode_responses
+
+    # ✅ Internal helpers
+    def _out(self, value):
+        if value is None:
+            return None
+        return value.decode("utf-8") if self.decode_responses else value
+
+    def _entry(self, key, expected_type=None):
+        entry = self._store.data.get(_to_key(key))
+        if entry is None:
+            return None
+        if entry[2] is not None and entry[2] <= time.monotonic():
+            self._store.data.pop(_to_key(key), None)
+            return None
+        if expected_type and entry[0] != expected_type:
+            raise redis.ResponseError("WRONGTYPE Operation against a key holding the wrong kind of value")
+        return entry
+
+    def _container(self, key, data_type):
+        entry = self._entry(key, data_type)
+        if entry is None:
+            entry = [data_type, {}, None]
+            self._store.data[_to_key(key)] = entry
+        return entry[1]
+
+    # ✅ Strings
+    def get(self, name):
+        with self._store.lock:
+            entry = self._entry(name, "string")
+            return self._out(entry[1]) if entry else None
+
+    def set(self, name, value, ex=None, px=None, nx=False, xx=False):
+        with self._store.lock:
+            exists = self._entry(name) is not None
+            if (nx and exists) or (xx and not exists):
+                return None
+            expires_at = None
+            if ex is not None:
+                expires_at = time.monotonic() + ex
+            elif px is not None:
+                expires_at = time.monotonic() + px / 1000
+            self._store.data[_to_key(name)] = ["string", _to_bytes(value), expires_at]
+            return True
+
+    def setex(self, name, time_seconds, value):
+        return self.set(name, value, ex=time_seconds)
+
+    def incrby(self, name, amount=1):
+        with self._store.lock:
+            entry = self._entry(name, "string")
+            try:
+                value = int(entry[1]) + amount if entry else amount
+            except ValueError:
+                raise redis.ResponseError("value is not an integer or out of range")
+            expires_at = entry[2] if entry else None
+            self._store.data[_to_key(name)] = ["string", _to_bytes(value), expires_at]
+            return value
+
+    def incr(self, name, amount=1):
+        return self.incrby(name, amount)
+
+    # ✅ Keys
+    def delete(self, *names):
+        with self._store.lock:
+            removed = 0
+            for name in names:
+                if self._entry(name) is not None:
+                    self._store.data.pop(_to_key(name), None)
+                    removed += 1
+            return removed
+
+    def unlink(self, *names):
+        return self.delete(*names)
+
+    def exists(self, *names):
+        with self._store.lock:
+            return sum(1 for name in names if self._entry(name) is not None)
+
+    def expire(self, name, time_seconds):
+        with self._store.lock:
+            entry = self._entry(name)
+            if entry is None:
+                return False
+            entry[2] = time.monotonic() + time_seconds
+            return True
+
+    def ttl(self, name):
+        with self._store.lock:
+            entry = self._entry(name)
+            if entry is None:
+                return -2
+            if entry[2] is None:
+                return -1
+            return math.ceil(entry[2] - time.monotonic())
+
+    def scan_iter(self, match=None, count=None, _type=None):
+        with self._store.lock:
+            keys = [key for key in list(self._store.data) if self._entry(key) is not None]
+        for key in keys:
+            if match is None or fnmatch.fnmatchcase(key, _to_key(match)):
+                yield key if self.decode_responses else key.encode("utf-8")
+
+    def keys(self, pattern="*"):
+        return list(self.scan_iter(match=pattern))
+
+    def memory_usage(self, key, samples=None):
+        with self._store.lock:
+            entry = self._entry(key)
+            if entry is None:
+                return None
+            if entry[0] == "string":
+                return len(key) + len(entry[1])
+            return len(key) + sum(len(_to_bytes(k)) + len(_to_bytes(v)) for k, v in entry[1].items())
+
+    def flushdb(self):
+        with self._store.lock:
+            self._store.data.clear()
+            return True
+
+    def ping(self):
+        return True
+
+    # ✅ Hashes
+    def hset(self, name, key=None, value=None, mapping=None):
+        with self._store.lock:
+            fields = self._container(name, "hash")
+            items = dict(mapping or {})
+            if key is not None:
+                items[key] = value
+            added = 0
+            for field, field_value in items.items():
+                field = _to_bytes(field)
+                added += field not in fields
+                fields[field] = _to_bytes(field_value)
+            return added
+
+    def hget(self, name, key):
+        with self._store.lock:
+            entry = self._entry(name, "hash")
+            return self._out(entry[1].get(_to_bytes(key))) if entry else None
+
+    def hgetall(self, name):
+        with self._store.lock:
+            entry = self._entry(name, "hash")
+            if not entry:
+                return {}
+            return {self._out(field): self._out(value) for field, value in entry[1].items()}
+
+    def hincrby(self, name, key, amount=1):
+        with self._store.lock:
+            fields = self._container(name, "hash")
+            value = int(fields.get(_to_bytes(key), b"0")) + amount
+            fields[_to_bytes(key)] = _to_bytes(value)
+            return value
+
+    # ✅ Sorted sets
+    def zadd(self, name, mapping):
+        with self._store.lock:
+            members = self._container(name, "zset")
+            added = 0
+            for member, score in mapping.items():
+                member = _to_bytes(member)
+                added += member not in members
+                members[member] = float(score)
+            return added
+
+    def zincrby(self, name, amount, value):
+        with self._store.lock:
+            members = self._container(name, "zset")
+            member = _to_bytes(value)
+            members[member] = members.get(member, 0.0) + amount
+            return members[member]
+
+    def _ranked(self, name):
+        entry = self._entry(name, "zset")
+        if not entry:
+            return []
+        return sorted(entry[1].items(), key=lambda item: (item[1], item[0]))
+
+    @staticmethod
+    def _slice(items, start, end):
+        end = len(items) + end if end < 0 else end
+        return items[start if start >= 0 else max(len(items) + start, 0):end + 1]
+
+    def zrevrange(self, name, start, end, withscores=False):
+        with self._store.lock:
+            items = self._slice(list(reversed(self._ranked(name))), start, end)
+            if withscores:
+                return [(self._out(member), score) for member, score in items]
+            return [self._out(member) for member, _ in items]
+
+    def zrange(self, name, start, end, withscores=False):
+        with self._store.lock:
+            items = self._slice(self._ranked(name), start, end)
+            if withscores:
+                return [(self._out(member), score) for member, score in items]
+            return [self._out(member) for member, _ in items]
+
+    def zrem(self, name, *values):
+        with self._store.lock:
+            entry = self._entry(name, "zset")
+            if not entry:
+                return 0
+            return sum(entry[1].pop(_to_bytes(value), None) is not None for value in values)
+
+    def zremrangebyscore(self, name, min, max):
+        with self._store.lock:
+            items = [(member, score) for member, score in self._ranked(name) if float(min) <= score <= float(max)]
+            entry = self._entry(name, "zset")
+            for member, _ in items:
+                entry[1].pop(member, None)
+            return len(items)
+
+    def zremrangebyrank(self, name, min, max):
+        with self._store.lock:
+            items = self._slice(self._ranked(name), min, max)
+            entry = self._entry(name, "zset")
+            for member, _ in items:
+                entry[1].pop(member, None)
+            return len(items)
+
+    # ✅ Pub/Sub (delivered synchronously, in-process only)
+    def publish(self, channel, message):
+        with self._store.lock:
+            handlers = list(self._store.subscribers.get(_to_key(channel), []))
+        for handler in handlers:
+            handler({"type": "message", "channel": channel, "data": self._out(_to_bytes(message))})
+        return len(handlers)
+
+    def pubsub(self, **kwargs):
+        return _MemoryPubSub(self)
+
+    # ✅ Pipelines and scripts
+    def pipeline(self, transaction=True):
+        return _MemoryPipeline(self)
+
+    def register_script(self, script):
+        return _MemoryScript(self, script)
+
+
+class _MemoryPipeline:
+    """Buffers commands and runs them in order on `execute()`."""
+
+    def __init__(self, client):
+        self._client = client
+        self._commands = []
+
+    def __getattr__(self, name):
+        method = getattr(self._client, name)
+
+        def queue(*args, **kwargs):
+            self._commands.append((method, args, kwargs))
+            return self
+
+        return queue
+
+    def execute(self, raise_on_error=True):
+        with self._client._store.lock:
+            results = []
+            for method, args, kwargs in self._commands:
+                result = method(*args, **kwargs)
+                results.append(list(result) if hasattr(result, "__next__") else result)
+            self._commands = []
+            return results
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self._commands = []
+
+
+class _MemoryScript:
+    """Runs the registered Python fallback of a Lua script atomically."""
+
+    def __init__(self, client, script):
+        self._client = client
+        self.script = script
+
+    def __call__(self, keys=None, args=None, client=None):
+        if self.script not in SCRIPT_FALLBACKS:
+            raise NotImplementedError("No in-memory fallback registered for this Lua script.")
+        with self._client._store.lock:
+            return SCRIPT_FALLBACKS[self.script](self._client, list(keys or []), list(args or []))
+
+
+class _MemoryPubSub:
+    """Minimal stand-in for redis-py's PubSub: handlers are called from `publish()`."""
+
+    def __init__(self, client):
+        self._client = client
+        self._channels = {}
+
+    def subscribe(self, *channels, **handlers):
+        with self._client._store.lock:
+            for channel, handler in handlers.items():
+                self._channels[channel] = handler
+                self._client._store.subscribers.setdefault(channel, []).append(handler)
+
+    def unsubscribe(self, *channels):
+        with self._client._store.lock:
+            for channel in channels or list(self._channels):
+                handler = self._channels.pop(channel, None)
+                if handler in self._client._store.subscribers.get(channel, []):
+                    self._client._store.subscribers[channel].remove(handler)
+
+    def run_in_thread(self, sleep_time=0.0, daemon=False, exception_handler=None):
+        return _MemoryPubSubThread(self)
+
+
+class _MemoryPubSubThread:
+    """No real thread is needed since delivery is synchronous."""
+
+    def __init__(self, pubsub):
+        self._pubsub = pubsub
+
+    def stop(self):
+        self._pubsub.unsubscribe()
+
+    def is_alive(self):
+        return bool(self._pubsub._channels)
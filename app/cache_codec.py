@@ -0,0 +1,83 @@
+import os
+import zlib
+
+# ✅ Values smaller than this are stored as plain UTF-8 (compression would not pay off)
+COMPRESSION_THRESHOLD = int(os.getenv("CACHE_COMPRESSION_THRESHOLD", "2048"))
+COMPRESSION_LEVEL = int(os.getenv("CACHE_COMPRESSION_LEVEL", "6"))
+
+# ✅ Header layout: MAGIC (3 bytes) + format (1 byte) + dictionary version (1 byte)
+HEADER_MAGIC = b"\x00SG"
+FORMAT_ZLIB = b"z"
+FORMAT_ZLIB_DICT = b"d"
+HEADER_SIZE = len(HEADER_MAGIC) + 2
+
+# ✅ Preset dictionaries built from our report format. Never edit an existing version:
+# values compressed with it must stay readable. Add a new version and bump CURRENT_DICTIONARY_VERSION.
+# zlib weighs the end of the dictionary most, so the most frequent phrases go last.
+COMPRESSION_DICTIONARIES = {
+    1: (
+        "Comparative analysis of multiple business strategies. Global market trends, risk forecasting, and "
+        "geopolitical considerations. Executive team structuring, hiring roadmap, and leadership development. "
+        "Comparative financial planning (ROI models for £50K, £100K, and £250K investments). "
+        "Investment of £10K vs. £100K vs. £1M: What changes? High-risk, high-reward vs. conservative growth. "
+        "Market entry, scaling, and expansion insights. AI-driven forecasting based on market patterns. "
+        "Competitive landscape insights & growth hacking strategies. Industry-specific recommendations. "
+        "Strategic recommendations for the next 90 days. Full-scale growth roadmap (12-24 months). "
+        "Comprehensive strategic roadmap (24-36 months). Step-by-step execution plan for long-term success. "
+        "## Competitive Positioning Recommendations\n## Financial & Investment Considerations\n"
+        "## Scaling & Growth Strategies\n## Final Recommendations & Next Steps\n"
+        "## Risk Assessment & Mitigation\n## Step-by-Step Execution Plan\n## Executive Summary\n"
+        "### Key Insights\n### Actionable Steps\n### Risks to Consider\n### Mitigation Strategies\n"
+        "customer acquisition, customer retention, revenue growth, market share, competitive advantage, "
+        "value proposition, key performance indicators (KPIs), return on investment (ROI), cash flow, "
+        "stakeholders, partnerships, brand positioning, pricing strategy, operational efficiency, "
+        "- **Objective:** - **Action:** - **Timeline:** - **Expected Outcome:** - **Risk:** - **Mitigation:** "
+        "1. **Summary of key insights** 2. **Three actionable steps** 3. **One major risk to consider** "
+        "the business strategy should focus on the market and the customer to ensure sustainable growth. "
+    ).encode("utf-8"),
+}
+CURRENT_DICTIONARY_VERSION = 1
+
+
+def encode_value(value):
+    """Serializes a string for Redis, compressing it with a versioned header when it is large."""
+    raw = value.encode("utf-8") if isinstance(value, str) else bytes(value)
+    if len(raw) < COMPRESSION_THRESHOLD:
+        return raw
+
+    compressor = zlib.compressobj(COMPRESSION_LEVEL, zdict=COMPRESSION_DICTIONARIES[CURRENT_DICTIONARY_VERSION])
+    compressed = compressor.compress(raw) + compressor.flush()
+    if len(compressed) + HEADER_SIZE >= len(raw):
+        return raw  # ✅ Incompressible payload, keep it readable
+    return HEADER_MAGIC + FORMAT_ZLIB_DICT + bytes([CURRENT_DICTIONARY_VERSION]) + compressed
+
+
+def decode_value(data):
+    """Inverse of `encode_value`. Returns None for missing values and accepts legacy plain strings."""
+    if data is None:
+        return None
+    if isinstance(data, str):
+        return data
+    if not data.startswith(HEADER_MAGIC):
+        return data.decode("utf-8")
+
+    data_format = data[3:4]
+    version = data[4]
+    payload = data[HEADER_SIZE:]
+    if data_format == FORMAT_ZLIB_DICT:
+        if version not in COMPRESSION_DICTIONARIES:
+            raise ValueError(f"Unknown cache compression dictionary version: {version}")
+        decompressor = zlib.decompressobj(zdict=COMPRESSION_DICTIONARIES[version])
+        return (decompressor.decompress(payload) + decompressor.flush()).decode("utf-8")
+    if data_format == FORMAT_ZLIB:
+        return zlib.decompress(payload).decode("utf-8")
+    raise ValueError(f"Unknown cache value format: {data_format!r}")
+
+
+def key_family(key):
+    """Groups a Redis key into its family, e.g. `query_cache:user_query:<hash>` -> `user_query`."""
+    if isinstance(key, bytes):
+        key = key.decode("utf-8", "replace")
+    if key.startswith("query_cache:"):
+        key = key[len("query_cache:"):]
+    return key.split(":", 1)[0]
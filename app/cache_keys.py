@@ -0,0 +1,73 @@
+import re
+import json
+import hashlib
+
+from prompt_library.archetype_prompts import archetype_prompts
+from prompt_library.expert_prompts import expert_prompts
+from app.prompt_compiler import report_template_fingerprint
+
+# ✅ Filler words stripped from queries (shared with `preprocess_query`)
+FILLER_WORDS_PATTERN = re.compile(r'\b(hey|hi|thanks|wondering)\b', re.IGNORECASE)
+
+
+def _compute_prompt_library_version():
+    """
+    Hashes the prompt library, the report template and the plans' report depth settings,
+    so cached answers are invalidated whenever any of them changes.
+    """
+    library = json.dumps([archetype_prompts, expert_prompts, report_template_fingerprint()],
+                         sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(library.encode("utf-8")).hexdigest()[:12]
+
+
+PROMPT_LIBRARY_VERSION = _compute_prompt_library_version()
+
+
+def normalize_query(query):
+    """Canonical form of a query: lowercase, filler words and punctuation removed, whitespace collapsed."""
+    query = FILLER_WORDS_PATTERN.sub('', (query or "").lower())
+    query = re.sub(r'[^\w\s£$€%]', ' ', query)  # ✅ Keep currency/percent signs, they change the meaning
+    return re.sub(r'\s+', ' ', query).strip()
+
+
+def hash_document(file):
+    """Returns a SHA-256 of an uploaded file's contents without consuming the stream."""
+    if hasattr(file, "getvalue"):
+        content = file.getvalue()  # ✅ Streamlit UploadedFile / BytesIO
+    else:
+        position = file.tell()
+        content = file.read()
+        file.seek(position)
+
+    if isinstance(content, str):
+        content = content.encode("utf-8")
+    return hashlib.sha256(content).hexdigest()
+
+
+def build_request_context(archetype, selected_experts=None, user_plan=None, uploaded_files=None,
+                          doc_usage_option=None):
+    """
+    Digest of everything except the query text that changes the generated answer.
+    Two requests can only share a cached report if their contexts are identical.
+    """
+    fingerprint = {
+        "archetype": archetype,
+        "experts": sorted(selected_experts or []),
+        "plan": user_plan,
+        "documents": sorted(hash_document(file) for file in (uploaded_files or [])),
+        "doc_usage": doc_usage_option if uploaded_files else None,  # ✅ Only matters when documents exist
+        "prompt_version": PROMPT_LIBRARY_VERSION,
+    }
+    return hashlib.sha256(json.dumps(fingerprint, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def build_query_cache_key(query, archetype, selected_experts=None, user_plan=None, uploaded_files=None,
+                          doc_usage_option=None, family="user_query", context=None):
+    """
+    Builds a fixed-size, content-addressed cache key for an AI request.
+    Pass a precomputed `context` (from `build_request_context`) to avoid re-hashing documents.
+    """
+    if context is None:
+        context = build_request_context(archetype, selected_experts, user_plan, uploaded_files, doc_usage_option)
+    digest = hashlib.sha256(f"{context}\n{normalize_query(query)}".encode("utf-8")).hexdigest()
+    return f"{family}:{digest}"
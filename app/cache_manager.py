@@ -1,20 +1,323 @@
-import redis
+import os
+import sys
 import json
+import uuid
+import time
+import threading
+from datetime import datetime, timezone
+from collections import OrderedDict
+import redis
+from app.cache_codec import encode_value, decode_value, key_family
+from app.cache_backend import create_cache_backend, register_script_fallback
+from app.cache_metrics import cache_metrics
+
+# ✅ Backend chosen by CACHE_BACKEND / REDIS_URL / REDIS_POOL_SIZE (see app/cache_backend.py)
+cache_backend = create_cache_backend()
+redis_client = cache_backend.client
+
+# ✅ Byte-level client for values that may be stored compressed (see app/cache_codec.py)
+redis_binary_client = cache_backend.binary_client
+
+CACHE_BYTES_RAW_KEY = "cache_bytes:raw"  # ✅ Hash: key family -> uncompressed bytes written
+CACHE_BYTES_STORED_KEY = "cache_bytes:stored"  # ✅ Hash: key family -> bytes actually written to Redis
+CACHE_WRITES_KEY = "cache_bytes:writes"  # ✅ Hash: key family -> number of writes
+
+# ✅ Sorted set holding query frequencies (member = query, score = times asked)
+QUERY_LEADERBOARD_KEY = "query_leaderboard"
+QUERY_LEADERBOARD_MAX_SIZE = 10000  # ✅ Keeps the leaderboard bounded
+SCAN_BATCH_SIZE = 1000  # ✅ Keys fetched per SCAN cursor step / pipeline round trip
+
+# ✅ In-process cache tier (sits in front of Redis, shared by all Streamlit sessions in this process)
+LOCAL_CACHE_MAX_BYTES = int(os.getenv("LOCAL_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+LOCAL_CACHE_TTL = int(os.getenv("LOCAL_CACHE_TTL", "60"))  # ✅ Upper bound on local staleness (seconds)
+# ✅ Only worth it in front of a networked backend
+LOCAL_CACHE_ENABLED = os.getenv("LOCAL_CACHE_ENABLED", "true").lower() == "true" and cache_backend.name == "redis"
+CACHE_INVALIDATION_CHANNEL = "cache_invalidation"
+CACHE_INSTANCE_ID = uuid.uuid4().hex  # ✅ Lets replicas ignore their own invalidation messages
+
+
+class LocalCache:
+    """Thread-safe LRU cache with per-entry TTL and byte-size-aware eviction."""
+
+    def __init__(self, max_bytes=LOCAL_CACHE_MAX_BYTES, default_ttl=LOCAL_CACHE_TTL):
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self._entries = OrderedDict()  # key -> (value, expires_at, size)
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        """Returns the cached value, or None on a miss or expired entry."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            value, expires_at, _ = entry
+            if expires_at <= time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)  # ✅ Mark as most recently used
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        """Stores a value, evicting least recently used entries until it fits."""
+        size = sys.getsizeof(value)
+        if size > self.max_bytes:
+            return  # ✅ Never let one huge value flush the whole cache
+
+        ttl = min(ttl or self.default_ttl, self.default_ttl)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            while self._entries and self.current_bytes + size > self.max_bytes:
+                oldest_key = next(iter(self._entries))
+                self._remove(oldest_key)
+                self.evictions += 1
+                cache_metrics.record_eviction(key_family(oldest_key))
+
+            self._entries[key] = (value, time.monotonic() + ttl, size)
+            self.current_bytes += size
+
+    def delete(self, key):
+        """Drops a key if present."""
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+                self.invalidations += 1
+
+    def clear(self):
+        """Drops every entry (used when invalidation messages may have been missed)."""
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        """Returns hit/miss/eviction counters and current size for cache sizing."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+    def _remove(self, key):
+        _, _, size = self._entries.pop(key)
+        self.current_bytes -= size
+
+
+local_cache = LocalCache()
+_invalidation_thread = None
+_invalidation_lock = threading.Lock()
+
+
+# ✅ Key formats (shared with app/async_cache_manager.py)
+def user_session_key(user_id):
+    return f"user_session:{user_id}"
+
+
+def ai_memory_key(user_id):
+    return f"ai_memory:{user_id}"
+
+
+def query_cache_key(query):
+    return f"query_cache:{query}"
+
+
+def _invalidation_message(keys):
+    return json.dumps({"origin": CACHE_INSTANCE_ID, "keys": list(keys)})
+
+
+# ✅ Cross-replica invalidation over Redis pub/sub
+def _handle_invalidation_message(message):
+    """Drops keys announced by other replicas from the local cache."""
+    try:
+        payload = json.loads(message["data"])
+    except (TypeError, ValueError):
+        return
+    if payload.get("origin") == CACHE_INSTANCE_ID:
+        return  # ✅ Our own write, local cache is already up to date
+    for key in payload.get("keys", []):
+        local_cache.delete(key)
+
+
+def _handle_invalidation_error(error, pubsub, thread):
+    """Disables the local tier if the subscription dies, since we could miss invalidations."""
+    global _invalidation_thread
+    print(f"❌ Cache invalidation listener stopped: {error}")
+    _invalidation_thread = None
+    local_cache.clear()
+    thread.stop()
+
+
+def start_invalidation_listener():
+    """Subscribes to the invalidation channel in a daemon thread (idempotent)."""
+    global _invalidation_thread
+    with _invalidation_lock:
+        if _invalidation_thread is not None:
+            return True
+        try:
+            pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(**{CACHE_INVALIDATION_CHANNEL: _handle_invalidation_message})
+            _invalidation_thread = pubsub.run_in_thread(
+                sleep_time=1.0, daemon=True, exception_handler=_handle_invalidation_error
+            )
+            local_cache.clear()  # ✅ Anything cached before subscribing may be stale
+            return True
+        except redis.RedisError as e:
+            print(f"⚠️ Cache invalidation listener unavailable, local cache disabled: {e}")
+            return False
+
+
+def _local_cache_active():
+    """The local tier is only safe to use while we are receiving invalidations."""
+    return LOCAL_CACHE_ENABLED and (_invalidation_thread is not None or start_invalidation_listener())
+
+
+def _cached_get(key):
+    """Reads a (possibly compressed) string value through the local cache, falling back to Redis."""
+    family = key_family(key)
+    start = time.perf_counter()
+    try:
+        use_local = _local_cache_active()
+        if use_local:
+            value = local_cache.get(key)
+            if value is not None:
+                cache_metrics.record_hit(family, value, tier="local")
+                return value
+
+        if not use_local:
+            value = decode_value(redis_binary_client.get(key))
+        else:
+            pipe = redis_binary_client.pipeline(transaction=False)
+            pipe.get(key)
+            pipe.ttl(key)
+            data, ttl = pipe.execute()
+            value = decode_value(data)
+            if value is not None:
+                local_cache.set(key, value, ttl if ttl and ttl > 0 else None)
+
+        if value is None:
+            cache_metrics.record_miss(family)
+        else:
+            cache_metrics.record_hit(family, value)
+        return value
+    finally:
+        cache_metrics.observe_latency(family, "get", time.perf_counter() - start)
+
+
+def _queue_cached_set(pipe, key, value, data, expiration):
+    """Queues a cache write, its byte accounting and its invalidation broadcast on a (sync or async) pipeline."""
+    family = key_family(key)
+    pipe.setex(key, expiration, data)
+    pipe.hincrby(CACHE_BYTES_RAW_KEY, family, len(value.encode("utf-8")))
+    pipe.hincrby(CACHE_BYTES_STORED_KEY, family, len(data))
+    pipe.hincrby(CACHE_WRITES_KEY, family, 1)
+    pipe.publish(CACHE_INVALIDATION_CHANNEL, _invalidation_message([key]))
+
+
+def _cached_set(key, value, expiration):
+    """Writes a value to Redis and the local cache, then tells other replicas to drop it."""
+    start = time.perf_counter()
+    data = encode_value(value)
+    family = key_family(key)
+
+    pipe = redis_binary_client.pipeline(transaction=False)
+    _queue_cached_set(pipe, key, value, data, expiration)
+    pipe.execute()
+    if _local_cache_active():
+        local_cache.set(key, value, expiration)
+
+    cache_metrics.record_write(family, len(data))
+    cache_metrics.observe_latency(family, "set", time.perf_counter() - start)
+
+
+def invalidate_cache_keys(*keys):
+    """Deletes keys from Redis and from every replica's local cache."""
+    if not keys:
+        return
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.delete(*keys)
+    pipe.publish(CACHE_INVALIDATION_CHANNEL, _invalidation_message(keys))
+    pipe.execute()
+    for key in keys:
+        local_cache.delete(key)
+
 
-# ✅ Explicitly force Redis into synchronous mode
-redis_pool = redis.ConnectionPool(host="localhost", port=6379, db=0, decode_responses=True)
-redis_client = redis.Redis(connection_pool=redis_pool)
+def get_cache_byte_stats():
+    """Returns bytes written per key family, before and after compression."""
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.hgetall(CACHE_BYTES_RAW_KEY)
+    pipe.hgetall(CACHE_BYTES_STORED_KEY)
+    pipe.hgetall(CACHE_WRITES_KEY)
+    raw_bytes, stored_bytes, writes = pipe.execute()
+
+    stats = {}
+    for family in raw_bytes:
+        raw = int(raw_bytes[family])
+        stored = int(stored_bytes.get(family, 0))
+        stats[family] = {
+            "writes": int(writes.get(family, 0)),
+            "raw_bytes": raw,
+            "stored_bytes": stored,
+            "compression_ratio": round(raw / stored, 2) if stored else 0.0,
+        }
+    return stats
+
+
+def get_cache_memory_by_prefix(batch_size=SCAN_BATCH_SIZE):
+    """Walks the keyspace with SCAN and sums MEMORY USAGE per key family (what is live right now)."""
+    usage = {}
+    for keys in scan_key_batches("*", batch_size):
+        pipe = redis_client.pipeline(transaction=False)
+        for key in keys:
+            pipe.memory_usage(key)
+        sizes = pipe.execute()
+
+        for key, size in zip(keys, sizes):
+            family = key_family(key)
+            family_usage = usage.setdefault(family, {"keys": 0, "bytes": 0})
+            family_usage["keys"] += 1
+            family_usage["bytes"] += size or 0  # ✅ Key may have expired mid-scan
+    return usage
+
+
+def get_cache_metrics():
+    """Returns hits, misses, writes, evictions, bytes, latency and avoided LLM cost per key family."""
+    return cache_metrics.snapshot()
+
+
+def get_local_cache_stats():
+    """Returns the in-process cache counters (hits, misses, evictions, bytes)."""
+    return local_cache.stats()
 
 
 def store_user_session(user_id, session_data, expiration=3600):
     """Stores user session data in Redis for 1 hour (default)."""
     session_data_str = json.dumps(session_data)  # ✅ Convert to JSON string
-    redis_client.setex(f"user_session:{user_id}", expiration, session_data_str)
+    _cached_set(user_session_key(user_id), session_data_str, expiration)
 
 
 def get_user_session(user_id):
     """Retrieves stored user session data safely."""
-    session_data = redis_client.get(f"user_session:{user_id}")
+    session_data = _cached_get(user_session_key(user_id))
     if session_data:
         try:
             return json.loads(str(session_data))  # ✅ Ensure proper string handling
@@ -26,81 +329,275 @@ def get_user_session(user_id):
 def store_ai_memory(user_id, query, response, expiration=86400):
     """Stores AI memory (query-response pairs) in Redis for 24 hours."""
     ai_data = json.dumps({"query": query, "response": response})
-    redis_client.setex(f"ai_memory:{user_id}", expiration, ai_data)
-
-    # ✅ Track total user queries
-    redis_client.incr(f"user_query_count:{user_id}")
-
-    # ✅ Track follow-ups separately
-    if "follow-up" in query.lower():
-        redis_client.incr(f"user_follow_up_count:{user_id}")
+    _cached_set(ai_memory_key(user_id), ai_data, expiration)
 
 
 def get_ai_memory(user_id):
     """Retrieves stored AI memory for continuity in follow-ups."""
-    memory_data = redis_client.get(f"ai_memory:{user_id}")
+    memory_data = _cached_get(ai_memory_key(user_id))
     if memory_data:
         try:
             return json.loads(str(memory_data))  # ✅ Force correct type conversion
         except json.JSONDecodeError:
-            redis_client.delete(f"ai_memory:{user_id}")  # Remove corrupted data
+            invalidate_cache_keys(ai_memory_key(user_id))  # Remove corrupted data
     return None
 
 
+# ✅ Usage counters (shared by every quota check), one key per user, billing period and kind:
+#    usage:{user_id}:{period}:{kind}. Keys expire on their own after the period ends, so the
+#    monthly reset needs no scan. Every increment is mirrored into usage_rollup:{period}
+#    (field "{user_id}:{kind}") so the Postgres rollup reads a whole period with one HGETALL.
+USAGE_KEY_PREFIX = "usage"
+USAGE_ROLLUP_PREFIX = "usage_rollup"
+USAGE_GENERATION_PREFIX = "usage_generation"  # ✅ Bumped by a manual mid-period reset
+USAGE_COUNTER_GRACE = int(os.getenv("USAGE_COUNTER_GRACE", str(7 * 86400)))  # ✅ Kept after period end for the rollup
+
+# ✅ KEYS[1] = usage counter, KEYS[2] = period rollup hash (optional)
+#    ARGV[1] = plan limit, ARGV[2] = counter TTL in seconds (0 = no expiry), ARGV[3] = rollup field
+# Returns {allowed (1/0), remaining allowance after this use}
+CHECK_AND_INCREMENT_LUA = """
+local limit = tonumber(ARGV[1])
+local used = tonumber(redis.call('GET', KEYS[1]) or '0')
+if used >= limit then
+    return {0, 0}
+end
+used = redis.call('INCR', KEYS[1])
+local ttl = tonumber(ARGV[2])
+if ttl > 0 and used == 1 then
+    redis.call('EXPIRE', KEYS[1], ttl)
+end
+if KEYS[2] then
+    redis.call('HINCRBY', KEYS[2], ARGV[3], 1)
+    if ttl > 0 and used == 1 then
+        redis.call('EXPIRE', KEYS[2], ttl)
+    end
+end
+return {1, limit - used}
+"""
+
+
+def _check_and_increment_fallback(client, keys, args):
+    """Python version of CHECK_AND_INCREMENT_LUA for backends without a Lua engine."""
+    limit, ttl = int(args[0]), int(args[1])
+    used = int(client.get(keys[0]) or 0)
+    if used >= limit:
+        return [0, 0]
+    used = client.incr(keys[0])
+    if ttl > 0 and used == 1:
+        client.expire(keys[0], ttl)
+    if len(keys) > 1:
+        client.hincrby(keys[1], args[2], 1)
+        if ttl > 0 and used == 1:
+            client.expire(keys[1], ttl)
+    return [1, limit - used]
+
+
+register_script_fallback(CHECK_AND_INCREMENT_LUA, _check_and_increment_fallback)
+_check_and_increment_script = redis_client.register_script(CHECK_AND_INCREMENT_LUA)
+
+
+def billing_month(now=None):
+    """Calendar month (UTC) a usage event is billed to, as `yyyymm`."""
+    return (now or datetime.now(timezone.utc)).strftime("%Y%m")
+
+
+def usage_period_ttl(month=None):
+    """Seconds until `month` ends, plus the rollup grace period."""
+    month = month or billing_month()
+    year, month_number = int(month[:4]), int(month[4:6])
+    next_month = datetime(year + month_number // 12, month_number % 12 + 1, 1, tzinfo=timezone.utc)
+    return max(1, int((next_month - datetime.now(timezone.utc)).total_seconds()) + USAGE_COUNTER_GRACE)
+
+
+def usage_generation_key(month):
+    return f"{USAGE_GENERATION_PREFIX}:{month}"
+
+
+def period_id(month, generation):
+    """`yyyymm`, or `yyyymm-r<n>` after the n-th manual reset within that month."""
+    return month if int(generation) == 0 else f"{month}-r{int(generation)}"
+
+
+def current_usage_period():
+    """Returns the active period id (served from the local cache tier nearly always)."""
+    month = billing_month()
+    key = usage_generation_key(month)
+    generation = _cached_get(key)
+    if generation is None:
+        redis_client.set(key, 0, nx=True, ex=usage_period_ttl(month))  # ✅ NX: never clobber a concurrent reset
+        generation = _cached_get(key) or 0
+    return period_id(month, generation)
+
+
+def usage_counter_key(user_id, service_type, period=None):
+    """Returns the Redis counter key tracking a user's usage of a service in a billing period."""
+    return f"{USAGE_KEY_PREFIX}:{user_id}:{period or current_usage_period()}:{service_type}"
+
+
+def usage_rollup_key(period):
+    return f"{USAGE_ROLLUP_PREFIX}:{period}"
+
+
+def check_and_increment_usage(user_id, service_type, limit, expiration=None):
+    """
+    Atomically checks a usage counter against `limit` and consumes one unit if allowed.
+    One round trip, no race between concurrent submits. Returns (allowed, remaining).
+    Counters expire after the billing period (plus grace) unless `expiration` is given.
+    """
+    period = current_usage_period()
+    if expiration is None:
+        expiration = usage_period_ttl()
+    allowed, remaining = _check_and_increment_script(
+        keys=[usage_counter_key(user_id, service_type, period), usage_rollup_key(period)],
+        args=[int(limit), int(expiration), f"{user_id}:{service_type}"],
+    )
+    return bool(allowed), int(remaining)
+
+
+def increment_usage(user_id, service_type):
+    """Counts one unit of usage without a limit check."""
+    period = current_usage_period()
+    ttl = usage_period_ttl()
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.incr(usage_counter_key(user_id, service_type, period))
+    pipe.expire(usage_counter_key(user_id, service_type, period), ttl)
+    pipe.hincrby(usage_rollup_key(period), f"{user_id}:{service_type}", 1)
+    pipe.expire(usage_rollup_key(period), ttl)
+    pipe.execute()
+
+
+def get_usage_count(user_id, service_type, period=None):
+    """Reads a usage counter for the current (or given) billing period without consuming anything."""
+    count = redis_client.get(usage_counter_key(user_id, service_type, period))
+    return int(count) if count and str(count).isdigit() else 0
+
+
+def reset_current_usage_period():
+    """
+    Starts a fresh usage period for every user at once (O(1), no key scan): bumps the month's
+    generation so all counters are read from new keys; the old ones expire on their own.
+    """
+    month = billing_month()
+    key = usage_generation_key(month)
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.incr(key)
+    pipe.expire(key, usage_period_ttl(month))
+    pipe.publish(CACHE_INVALIDATION_CHANNEL, _invalidation_message([key]))
+    generation = pipe.execute()[0]
+    local_cache.delete(key)
+    return period_id(month, generation)
+
+
 # ✅ Track User Query Counts
 def track_query_count(user_id):
-    """Increments the query count for a user."""
-    redis_client.incr(f"user_query_count:{user_id}")
+    """Increments the query count for a user (current billing period)."""
+    increment_usage(user_id, "queries")
 
 
 def get_user_query_count(user_id):
-    """Retrieves the number of queries a user has made."""
-    count = redis_client.get(f"user_query_count:{user_id}")
-    return int(count) if count and count.isdigit() else 0  # ✅ Convert to int safely
+    """Retrieves the number of queries a user has made this billing period."""
+    return get_usage_count(user_id, "queries")
 
 
 # ✅ Track Follow-Up Query Counts
 def track_follow_up_count(user_id):
-    """Increments the follow-up query count for a user."""
-    redis_client.incr(f"user_follow_up_count:{user_id}")
+    """Increments the follow-up query count for a user (current billing period)."""
+    increment_usage(user_id, "follow_ups")
 
 
 def get_user_follow_up_count(user_id):
-    """Retrieves the number of follow-ups a user has made."""
-    count = redis_client.get(f"user_follow_up_count:{user_id}")
-    return int(count) if count and count.isdigit() else 0  # ✅ Convert to int safely
+    """Retrieves the number of follow-ups a user has made this billing period."""
+    return get_usage_count(user_id, "follow_ups")
 
 
 # ✅ Cache API Responses
 def cache_response(query, response, expiration=86400):
     """Stores query responses in Redis for a set expiration (default: 24 hours)."""
-    redis_client.setex(f"query_cache:{query}", expiration, str(response))  # ✅ Ensure string type
+    _cached_set(query_cache_key(query), str(response), expiration)  # ✅ Ensure string type
 
 
 def get_cached_response(query):
     """Retrieves cached response from Redis, if available."""
-    cached_response = redis_client.get(f"query_cache:{query}")
+    cached_response = _cached_get(query_cache_key(query))
     return str(cached_response) if cached_response else ""  # ✅ Ensure proper type
 
 
+# ✅ Cursor-based key iteration (never blocks Redis like KEYS does)
+def scan_key_batches(pattern, batch_size=SCAN_BATCH_SIZE):
+    """Yields lists of keys matching `pattern`, walking the keyspace with SCAN."""
+    batch = []
+    for key in redis_client.scan_iter(match=pattern, count=batch_size):
+        batch.append(key)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
 # ✅ Clear Expired Cache Entries
-def clear_old_cache_entries():
-    """Removes expired cache keys from Redis to prevent excessive storage."""
-    query_keys = redis_client.keys("query_cache:*")
-    for key in query_keys:
-        if redis_client.ttl(key) == -1:  # ✅ Check if TTL has expired
-            redis_client.delete(key)
+def clear_old_cache_entries(batch_size=SCAN_BATCH_SIZE):
+    """Removes cache keys that were stored without a TTL to prevent excessive storage."""
+    removed = 0
+    for keys in scan_key_batches("query_cache:*", batch_size):
+        pipe = redis_client.pipeline(transaction=False)
+        for key in keys:
+            pipe.ttl(key)
+        ttls = pipe.execute()
+
+        stale_keys = [key for key, ttl in zip(keys, ttls) if ttl == -1]  # ✅ -1 means no expiry set
+        if stale_keys:
+            redis_client.unlink(*stale_keys)  # ✅ Frees memory in the background
+            removed += len(stale_keys)
+
+    trim_query_leaderboard()
+    return removed
 
 
 # ✅ Track Query Frequency
 def track_query_frequency(query):
     """Tracks how often a query is asked."""
-    redis_client.incr(f"query_count:{query}")
+    redis_client.zincrby(QUERY_LEADERBOARD_KEY, 1, query)
 
 
 def get_frequent_queries(top_n=5):
     """Retrieves the most frequently asked queries from Redis."""
-    query_keys = redis_client.keys("query_count:*")
-    query_counts = {key: int(redis_client.get(key) or 0) for key in query_keys}
-    sorted_queries = sorted(query_counts, key=query_counts.get, reverse=True)[:top_n]
-    return [query.replace("query_count:", "") for query in sorted_queries]
+    return redis_client.zrevrange(QUERY_LEADERBOARD_KEY, 0, top_n - 1)
+
+
+def trim_query_leaderboard(max_size=QUERY_LEADERBOARD_MAX_SIZE):
+    """Drops the least frequent queries so the leaderboard stays bounded."""
+    return redis_client.zremrangebyrank(QUERY_LEADERBOARD_KEY, 0, -(max_size + 1))
+
+
+def migrate_query_counts_to_leaderboard(batch_size=SCAN_BATCH_SIZE):
+    """One-off migration of legacy `query_count:*` counters into the leaderboard sorted set."""
+    migrated = 0
+    for keys in scan_key_batches("query_count:*", batch_size):
+        pipe = redis_client.pipeline(transaction=False)
+        for key in keys:
+            pipe.get(key)
+        counts = pipe.execute()
+
+        pipe = redis_client.pipeline(transaction=False)
+        for key, count in zip(keys, counts):
+            if count and count.isdigit():
+                pipe.zincrby(QUERY_LEADERBOARD_KEY, int(count), key.replace("query_count:", "", 1))
+            pipe.unlink(key)
+        pipe.execute()
+        migrated += len(keys)
+
+    return migrated
+
+
+def delete_legacy_usage_counters(batch_size=SCAN_BATCH_SIZE):
+    """
+    One-off cleanup of the never-expiring `user_query_count:*` / `user_follow_up_count:*` counters.
+    Usage is counted per billing period under `usage:*` (see `check_and_increment_usage`).
+    """
+    deleted = 0
+    for pattern in ("user_query_count:*", "user_follow_up_count:*"):
+        for keys in scan_key_batches(pattern, batch_size):
+            redis_client.unlink(*keys)
+            deleted += len(keys)
+    return deleted
@@ -0,0 +1,176 @@
+import os
+import bisect
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from app.config import MODEL_PRICING
+from app.token_budget import CHARS_PER_TOKEN_ESTIMATE
+
+METRICS_PORT = os.getenv("METRICS_PORT")  # ✅ Set to expose /metrics for Prometheus scraping
+
+# ✅ Latency histogram buckets (seconds)
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+# ✅ Families whose cached values replace an LLM call, and the model that call would normally use
+LLM_FAMILY_MODELS = {
+    "user_query": "gpt-4-turbo",
+    "follow_up": "gpt-4-turbo",
+    "strategy_pdf": "gpt-4-turbo",
+    "summary": "gpt-3.5-turbo",
+}
+
+COUNTER_NAMES = ("hits", "misses", "writes", "evictions", "bytes_read", "bytes_written",
+                 "tokens_avoided", "cost_avoided_usd")
+
+
+class _Histogram:
+    def __init__(self):
+        self.bucket_counts = [0] * (len(LATENCY_BUCKETS) + 1)  # ✅ Last slot is +Inf
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value):
+        self.bucket_counts[bisect.bisect_left(LATENCY_BUCKETS, value)] += 1
+        self.count += 1
+        self.total += value
+
+
+class CacheMetrics:
+    """Thread-safe, per-process counters and latency histograms per cache key family."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}  # family -> {counter name -> value}
+        self._histograms = {}  # (family, operation) -> _Histogram
+
+    def _family(self, family):
+        counters = self._counters.get(family)
+        if counters is None:
+            counters = self._counters[family] = dict.fromkeys(COUNTER_NAMES, 0)
+        return counters
+
+    def record_hit(self, family, value, tier="redis"):
+        """
+        Counts a hit; for LLM-backed families also the tokens and money it saved.
+        Tokens are estimated from the length (~4 characters each): hits are the hot path, and a full
+        tokenizer pass over every cached report would cost more than the lookup it is measuring.
+        """
+        size = len(value.encode("utf-8")) if isinstance(value, str) else len(value or b"")
+        model = LLM_FAMILY_MODELS.get(family)
+        length = len(value) if isinstance(value, str) else size
+        tokens = length // CHARS_PER_TOKEN_ESTIMATE if model else 0
+        with self._lock:
+            counters = self._family(family)
+            counters["hits"] += 1
+            counters[f"hits_{tier}"] = counters.get(f"hits_{tier}", 0) + 1
+            counters["bytes_read"] += size
+            if model:
+                counters["tokens_avoided"] += tokens
+                counters["cost_avoided_usd"] += tokens / 1000 * MODEL_PRICING.get(model, {}).get("output", 0)
+
+    def record_miss(self, family):
+        with self._lock:
+            self._family(family)["misses"] += 1
+
+    def record_write(self, family, stored_bytes):
+        with self._lock:
+            counters = self._family(family)
+            counters["writes"] += 1
+            counters["bytes_written"] += stored_bytes
+
+    def record_eviction(self, family):
+        with self._lock:
+            self._family(family)["evictions"] += 1
+
+    def observe_latency(self, family, operation, seconds):
+        with self._lock:
+            histogram = self._histograms.get((family, operation))
+            if histogram is None:
+                histogram = self._histograms[(family, operation)] = _Histogram()
+            histogram.observe(seconds)
+
+    def snapshot(self):
+        """Returns counters per family plus latency count/sum per operation."""
+        with self._lock:
+            data = {family: dict(counters) for family, counters in self._counters.items()}
+            for (family, operation), histogram in self._histograms.items():
+                family_data = data.setdefault(family, dict.fromkeys(COUNTER_NAMES, 0))
+                family_data[f"{operation}_latency_count"] = histogram.count
+                family_data[f"{operation}_latency_sum"] = round(histogram.total, 6)
+            return data
+
+    def render_prometheus(self):
+        """Renders all metrics in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            for name in COUNTER_NAMES:
+                metric = f"stratogenic_cache_{name}_total"
+                lines.append(f"# TYPE {metric} counter")
+                for family, counters in sorted(self._counters.items()):
+                    lines.append(f'{metric}{{family="{family}"}} {counters[name]}')
+
+            lines.append("# TYPE stratogenic_cache_hits_by_tier_total counter")
+            for family, counters in sorted(self._counters.items()):
+                for tier in ("local", "redis"):
+                    lines.append(
+                        f'stratogenic_cache_hits_by_tier_total{{family="{family}",tier="{tier}"}} '
+                        f'{counters.get(f"hits_{tier}", 0)}'
+                    )
+
+            metric = "stratogenic_cache_latency_seconds"
+            lines.append(f"# TYPE {metric} histogram")
+            for (family, operation), histogram in sorted(self._histograms.items()):
+                labels = f'family="{family}",operation="{operation}"'
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS + ("+Inf",), histogram.bucket_counts):
+                    cumulative += count
+                    lines.append(f'{metric}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f"{metric}_sum{{{labels}}} {histogram.total}")
+                lines.append(f"{metric}_count{{{labels}}} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+
+cache_metrics = CacheMetrics()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip("/") != "/metrics":
+            self.send_response(404)
+            self.end_headers()
+            return
+        body = cache_metrics.render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # ✅ Keep scrapes out of the app logs
+
+
+_metrics_server = None
+_metrics_server_lock = threading.Lock()
+
+
+def start_metrics_server(port=METRICS_PORT):
+    """Serves /metrics on `port` from a daemon thread (idempotent; no-op when no port is configured)."""
+    global _metrics_server
+    if not port:
+        return None
+    with _metrics_server_lock:
+        if _metrics_server is None:
+            try:
+                _metrics_server = ThreadingHTTPServer(("0.0.0.0", int(port)), _MetricsHandler)
+            except OSError as e:
+                print(f"⚠️ Metrics server not started on port {port}: {e}")
+                return None
+            threading.Thread(target=_metrics_server.serve_forever, daemon=True).start()
+            print(f"✅ Cache metrics available on :{port}/metrics")
+    return _metrics_server
@@ -108,4 +108,10 @@ PLAN_DETAILS = {
         5️⃣ **(Max Length: ~10,000-12,500 words)**
         """,
     },
-}
\ No newline at end of file
+}
+# ✅ OpenAI list prices per 1K tokens (USD), used to estimate what cache hits save
+MODEL_PRICING = {
+    "gpt-4": {"input": 0.03, "output": 0.06},
+    "gpt-4-turbo": {"input": 0.01, "output": 0.03},
+    "gpt-3.5-turbo": {"input": 0.0005, "output": 0.0015},
+}
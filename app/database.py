@@ -1,7 +1,12 @@
-from psycopg2 import pool
 import os
+import time
+import hashlib
+import threading
+from collections import deque
+import psycopg2
 from dotenv import load_dotenv
 from typing import Optional
+from app.storage_backend import storage, HISTORY_PREVIEW_LENGTH
 
 # ✅ Load environment variables
 load_dotenv()
@@ -12,37 +17,218 @@ DB_HOST = os.getenv("DB_HOST")
 DB_PORT = os.getenv("DB_PORT")
 DB_NAME = os.getenv("DB_NAME")
 
+# ✅ Pool sizing and health checks (all overridable per deployment)
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "1"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))  # ✅ Max seconds to wait for a free connection
+DB_POOL_MAX_WAITERS = int(os.getenv("DB_POOL_MAX_WAITERS", "50"))  # ✅ Beyond this, fail fast instead of queueing
+DB_POOL_VALIDATE_IDLE = float(os.getenv("DB_POOL_VALIDATE_IDLE", "30"))  # ✅ Ping connections idle this long
+DB_POOL_MAX_LIFETIME = float(os.getenv("DB_POOL_MAX_LIFETIME", "1800"))  # ✅ Recycle older connections (0 = never)
+
+
+class PoolTimeoutError(Exception):
+    """Raised when no connection becomes available within the timeout (or the wait queue is full)."""
+
+
+class BoundedConnectionPool:
+    """
+    Thread-safe psycopg2 connection pool with a bounded wait queue, stale-connection
+    validation, optional lifetime recycling and usage metrics.
+    """
+
+    def __init__(self, minconn, maxconn, timeout=DB_POOL_TIMEOUT, max_waiters=DB_POOL_MAX_WAITERS,
+                 validate_idle=DB_POOL_VALIDATE_IDLE, max_lifetime=DB_POOL_MAX_LIFETIME, **connect_kwargs):
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.max_waiters = max_waiters
+        self.validate_idle = validate_idle
+        self.max_lifetime = max_lifetime
+        self._connect_kwargs = connect_kwargs
+
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+        self._idle = deque()  # (conn, created_at, last_used)
+        self._in_use = {}  # id(conn) -> created_at
+        self._checked_out = 0  # ✅ In use + being opened; checked_out + idle never exceeds maxconn
+        self._waiters = 0
+        self._closed = False
+        self._stats = {
+            "checkouts": 0,
+            "checkout_failures": 0,
+            "connections_created": 0,
+            "connections_recycled": 0,
+            "validation_failures": 0,
+            "wait_time_total": 0.0,
+            "wait_time_max": 0.0,
+        }
+
+        for _ in range(minconn):
+            self._idle.append((self._connect(), time.monotonic(), time.monotonic()))
+
+    def _bump(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def _connect(self):
+        conn = psycopg2.connect(**self._connect_kwargs)
+        self._bump("connections_created")
+        return conn
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _is_healthy(self, conn, created_at, last_used):
+        """Drops connections that are closed, too old, or fail a ping after sitting idle."""
+        now = time.monotonic()
+        if conn.closed:
+            return False
+        if self.max_lifetime and now - created_at > self.max_lifetime:
+            self._bump("connections_recycled")
+            return False
+        if now - last_used > self.validate_idle:
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute("SELECT 1;")
+                if not conn.autocommit:
+                    conn.rollback()
+            except Exception:
+                self._bump("validation_failures")
+                return False
+        return True
+
+    def getconn(self, timeout=None):
+        """Checks out a healthy connection, waiting up to `timeout` seconds for one to free up."""
+        timeout = self.timeout if timeout is None else timeout
+        start = time.monotonic()
+        deadline = start + timeout
+
+        with self._lock:
+            if self._closed:
+                raise PoolTimeoutError("Connection pool is closed.")
+            if self._waiters >= self.max_waiters:
+                self._stats["checkout_failures"] += 1
+                raise PoolTimeoutError(f"Connection pool wait queue is full ({self.max_waiters} waiters).")
+
+            self._waiters += 1
+            try:
+                while not self._idle and self._checked_out >= self.maxconn:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats["checkout_failures"] += 1
+                        raise PoolTimeoutError(f"No database connection available after {timeout}s.")
+                    self._available.wait(remaining)
+            finally:
+                self._waiters -= 1
+
+            self._checked_out += 1  # ✅ Slot reserved before the lock is released
+            candidate = self._idle.popleft() if self._idle else None
+
+        try:
+            conn = None
+            if candidate:
+                if self._is_healthy(*candidate):
+                    conn, created_at = candidate[0], candidate[1]
+                else:
+                    self._close_quietly(candidate[0])
+            if conn is None:
+                conn, created_at = self._connect(), time.monotonic()
+        except Exception:
+            with self._lock:
+                self._checked_out -= 1
+                self._stats["checkout_failures"] += 1
+                self._available.notify()
+            raise
+
+        waited = time.monotonic() - start
+        with self._lock:
+            self._in_use[id(conn)] = created_at
+            self._stats["checkouts"] += 1
+            self._stats["wait_time_total"] += waited
+            self._stats["wait_time_max"] = max(self._stats["wait_time_max"], waited)
+        return conn
+
+    def putconn(self, conn, close=False):
+        """Returns a connection; broken or closed-on-request connections free their slot instead."""
+        with self._lock:
+            created_at = self._in_use.pop(id(conn), None)
+            if created_at is None:
+                self._close_quietly(conn)  # ✅ Not one of ours
+                return
+
+            self._checked_out -= 1
+            broken = conn.closed or conn.get_transaction_status() == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN
+            if close or broken or self._closed:
+                self._close_quietly(conn)
+            else:
+                if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()  # ✅ Never hand out a connection mid-transaction
+                self._idle.append((conn, created_at, time.monotonic()))
+            self._available.notify()
+
+    def closeall(self):
+        """Closes idle connections and stops handing out new ones."""
+        with self._lock:
+            self._closed = True
+            while self._idle:
+                self._close_quietly(self._idle.popleft()[0])
+            self._available.notify_all()
+
+    def stats(self):
+        """Returns in-use/idle counts, wait times and failure counters."""
+        with self._lock:
+            checkouts = self._stats["checkouts"]
+            return {
+                **self._stats,
+                "in_use": self._checked_out,
+                "idle": len(self._idle),
+                "waiting": self._waiters,
+                "max_size": self.maxconn,
+                "wait_time_avg": round(self._stats["wait_time_total"] / checkouts, 6) if checkouts else 0.0,
+            }
+
+
 # ✅ Initialize connection pool
-db_pool: Optional[pool.SimpleConnectionPool] = None
+db_pool: Optional[BoundedConnectionPool] = None
+_db_pool_lock = threading.Lock()
 
 def init_db_pool():
-    """Initializes the database connection pool and creates tables on startup."""
+    """Initializes the database connection pool (Postgres backend) and migrates the schema on startup."""
     global db_pool
-    if db_pool is not None:
-        return  # ✅ Prevent reinitialization if already initialized
+    if storage.name != "postgres":
+        from app.migrations import run_migrations
+        run_migrations()  # ✅ Embedded backends need no pool
+        return
 
-    try:
-        db_pool = pool.SimpleConnectionPool(1, 10,
-            dbname=DB_NAME,
-            user=DB_USER,
-            password=DB_PASSWORD,
-            host=DB_HOST,
-            port=DB_PORT
-        )
-        if db_pool:
-            print("✅ Connection pool initialized successfully!")
-            create_users_table()
-            create_query_logs_table()
-            create_user_feedback_table()
-        else:
-            print("❌ Connection pool creation failed: Pool is None.")
+    with _db_pool_lock:
+        if db_pool is not None:
+            return  # ✅ Prevent reinitialization if already initialized
 
-    except Exception as e:
-        db_pool = None  # ✅ Ensure db_pool is reset if failure occurs
-        print(f"❌ Connection pool initialization failed: {e}")
+        try:
+            db_pool = BoundedConnectionPool(DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE,
+                dbname=DB_NAME,
+                user=DB_USER,
+                password=DB_PASSWORD,
+                host=DB_HOST,
+                port=DB_PORT
+            )
+            print(f"✅ Connection pool initialized successfully! (size {DB_POOL_MIN_SIZE}-{DB_POOL_MAX_SIZE})")
+        except Exception as e:
+            db_pool = None  # ✅ Ensure db_pool is reset if failure occurs
+            print(f"❌ Connection pool initialization failed: {e}")
+            return
 
-def get_db_connection():
-    """Retrieves a database connection from the pool safely."""
+    from app.migrations import run_migrations  # ✅ Imported here: migrations depends on this module
+    from app.query_log_partitions import ensure_query_log_partitions
+    if run_migrations():
+        ensure_query_log_partitions()
+
+def get_db_connection(timeout=None):
+    """Retrieves a database connection from the pool, waiting up to `timeout` seconds for one."""
     global db_pool
     if db_pool is None:
         print("⚠️ Database connection pool is not initialized. Attempting to reinitialize...")
@@ -50,10 +236,9 @@ def get_db_connection():
 
     if db_pool:
         try:
-            conn = db_pool.getconn()
-            if conn:
-                conn.autocommit = True
-                return conn  # ✅ Returns only `conn`, not a tuple
+            conn = db_pool.getconn(timeout)
+            conn.autocommit = True
+            return conn  # ✅ Returns only `conn`, not a tuple
         except Exception as e:
             print(f"❌ Failed to get DB connection: {e}")
 
@@ -72,224 +257,62 @@ def release_db_connection(conn):
         except Exception as e:
             print(f"❌ Failed to release DB connection: {e}")
 
-# ✅ Create Users Table
-def create_users_table():
-    """Creates the users table if it does not exist."""
-    conn = get_db_connection()
-    if not conn:
-        return
-
-    cursor = None
-    try:
-        cursor = conn.cursor()
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                id SERIAL PRIMARY KEY,
-                email TEXT UNIQUE NOT NULL,
-                password_hash TEXT NOT NULL,
-                plan TEXT DEFAULT 'The Foundation (Free)',
-                is_admin BOOLEAN DEFAULT FALSE,  
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            );
-        """)
-        conn.commit()
-        print("✅ Users table ready.")
-    except Exception as e:
-        print(f"❌ Failed to create users table: {e}")
-    finally:
-        if cursor:
-            cursor.close()
-        release_db_connection(conn)
-
-# ✅ Create Query Logs Table
-def create_query_logs_table():
-    """Creates the query logs table if it does not exist."""
-    conn = get_db_connection()
-    if not conn:
-        return
+def get_db_pool_stats():
+    """Returns connection pool metrics (in-use count, wait times, checkout failures)."""
+    return db_pool.stats() if db_pool else {}
 
-    cursor = None
-    try:
-        cursor = conn.cursor()
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS query_logs (
-                id SERIAL PRIMARY KEY,
-                user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
-                query TEXT NOT NULL,
-                plan TEXT NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            );
-        """)
-        conn.commit()
-        print("✅ Query logs table ready.")
-    except Exception as e:
-        print(f"❌ Failed to create query logs table: {e}")
-    finally:
-        if cursor:
-            cursor.close()
-        release_db_connection(conn)
-
-# ✅ Create User Feedback Table
-def create_user_feedback_table():
-    """Creates the user feedback table if it does not exist."""
-    conn = get_db_connection()
-    if not conn:
-        return
-
-    cursor = None
-    try:
-        cursor = conn.cursor()
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS user_feedback (
-                id SERIAL PRIMARY KEY,
-                user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
-                query TEXT NOT NULL,
-                feedback_text TEXT NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            );
-        """)
-        conn.commit()
-        print("✅ User Feedback table ready.")
-    except Exception as e:
-        print(f"❌ Failed to create user feedback table: {e}")
-    finally:
-        if cursor:
-            cursor.close()
-        release_db_connection(conn)
+def response_hash(response):
+    """Content address of a response body (sha256 hex, same as the SQL backfill in migration 6)."""
+    return hashlib.sha256(response.encode("utf-8")).hexdigest()
 
 # ✅ Store user query
-def log_user_query(user_id, query, response, plan, archetype):
-    """Stores user query logs along with AI responses."""
-    conn = get_db_connection()
-    if not conn:
-        return
+def log_user_query(user_id, query, response, plan, archetype=None):
+    """Queues a user query log (with its AI response) for the batched write-behind flush."""
+    from app.queue_processor import enqueue_query_log  # ✅ Imported here: queue_processor depends on this module
+    enqueue_query_log(user_id, query, response, plan, archetype)
 
-    cursor = None
+def get_recent_queries_with_responses(user_id, limit=10):
+    """Fetches the most recent queries along with their responses."""
     try:
-        cursor = conn.cursor()
-        cursor.execute("""
-              INSERT INTO query_logs (user_id, query, archetype, response, plan, created_at)
-            VALUES (%s, %s, %s, %s, %s, CURRENT_TIMESTAMP);
-        """, (user_id, query, response, plan))
-        conn.commit()
+        return storage.get_recent_queries_with_responses(user_id, limit)  # ✅ List of (query, response, timestamp)
     except Exception as e:
-        print(f"❌ Failed to log user query: {e}")
-    finally:
-        if cursor:
-            cursor.close()
-        release_db_connection(conn)
-
-def create_strategy_reports_table():
-    """Creates the strategy_reports table for storing user-generated strategy PDFs."""
-    conn = get_db_connection()
-    if not conn:
-        return
+        print(f"❌ Failed to fetch recent queries: {e}")
+        return []
+
 
+def get_query_history(user_id, limit=20, before=None, search=None):
+    """
+    Returns one page of lightweight history rows (id, created_at, query preview, response bytes)
+    plus the cursor for the next page (None on the last page).
+    `before` is the (created_at, id) cursor of the previous page; `search` filters by full-text match.
+    """
     try:
-        cursor = conn.cursor()
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS strategy_reports (
-                id SERIAL PRIMARY KEY,
-                user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
-                pdf_filename TEXT NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            );
-        """)
-        conn.commit()
-        print("✅ Strategy Reports table ready.")
+        return storage.get_query_history(user_id, limit, before, search)
     except Exception as e:
-        print(f"❌ Failed to create strategy_reports table: {e}")
-    finally:
-        release_db_connection(conn)
-
+        print(f"❌ Failed to fetch query history: {e}")
+        return [], None
 
 
-def get_recent_queries_with_responses(user_id, limit=10):
-    """Fetches the most recent queries along with their responses."""
-    conn = get_db_connection()
-    if not conn:
-        return []
-
-    cursor = None
+def get_query_log(user_id, log_id):
+    """Loads the full query and response of one history entry (scoped to its owner)."""
     try:
-        cursor = conn.cursor()
-
-        # ✅ Check if 'response' column exists before querying
-        cursor.execute("""
-            SELECT column_name FROM information_schema.columns 
-            WHERE table_name = 'query_logs' AND column_name = 'response';
-        """)
-        column_exists = cursor.fetchone()
-
-        if not column_exists:
-            print("⚠️ Column 'response' does not exist in query_logs. Returning only queries.")
-            cursor.execute("""
-                SELECT query, created_at 
-                FROM query_logs 
-                WHERE user_id = %s 
-                ORDER BY created_at DESC 
-                LIMIT %s;
-            """, (user_id, limit))
-            queries = [(q[0], "No response stored", q[1]) for q in cursor.fetchall()]
-        else:
-            cursor.execute("""
-                SELECT query, response, created_at 
-                FROM query_logs 
-                WHERE user_id = %s 
-                ORDER BY created_at DESC 
-                LIMIT %s;
-            """, (user_id, limit))
-            queries = cursor.fetchall()
-
-        return queries  # ✅ Returns list of (query, response, timestamp)
+        return storage.get_query_log(user_id, log_id)
     except Exception as e:
-        print(f"❌ Failed to fetch recent queries: {e}")
-        return []
-    finally:
-        if cursor:
-            cursor.close()
-        release_db_connection(conn)
+        print(f"❌ Failed to fetch query log {log_id}: {e}")
+        return None
 
 
 # ✅ Store user feedback
 def log_user_feedback(user_id, query, feedback_text):
-    """Stores user feedback in the database."""
-    conn = get_db_connection()
-    if not conn:
-        return
-
-    cursor = None
-    try:
-        cursor = conn.cursor()
-        cursor.execute("""
-            INSERT INTO user_feedback (user_id, query, feedback_text, created_at)
-            VALUES (%s, %s, %s, NOW());
-        """, (user_id, query, feedback_text))
-        conn.commit()
-    except Exception as e:
-        print(f"❌ Failed to log user feedback: {e}")
-    finally:
-        if cursor:
-            cursor.close()
-        release_db_connection(conn)
+    """Queues user feedback for the batched write-behind flush."""
+    from app.queue_processor import enqueue_user_feedback
+    enqueue_user_feedback(user_id, query, feedback_text)
 
 # ✅ Fetch user details by email
 def get_user_by_email(email):
     """Fetches user details by email."""
-    conn = get_db_connection()
-    if not conn:
-        return None
-
-    cursor = None
     try:
-        cursor = conn.cursor()
-        cursor.execute("SELECT id, email, plan, is_admin FROM users WHERE email = %s;", (email,))
-        user = cursor.fetchone()
-        return user
+        return storage.get_user_by_email(email)
     except Exception as e:
         print(f"❌ Failed to fetch user by email: {e}")
         return None
-    finally:
-        if cursor:
-            cursor.close()
-        release_db_connection(conn)
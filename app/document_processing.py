@@ -1,10 +1,15 @@
-import openai
 import fitz  # PyMuPDF for PDF processing
 import docx
 import pandas as pd
 import re  # ✅ Regular expressions (built-in, no installation needed)
 
 from prompt_library.archetype_prompts import archetype_prompts
+from app.token_budget import count_tokens, truncate_to_tokens
+from app.llm_client import complete, acomplete
+
+DOCUMENT_ANALYSIS_MODEL = "gpt-4"
+PRE_SCREEN_DOCUMENT_TOKENS = 2000  # ✅ Condensed document content sent for pre-screening
+PATTERN_ANALYSIS_TOKENS = 1250  # ✅ Shared by all documents in a pattern analysis
 
 def extract_text(files, summarize=False, user_plan="The Foundation (Free)", archetype=None):
     """
@@ -83,20 +88,9 @@ def extract_financial_data(files, summarize=False, user_plan="The Foundation (Fr
 
     return extracted_data
 
-def pre_screen_documents(extracted_texts, archetype=None):
-    """
-    Pre-screens documents to determine relevance, contradictions, and compatibility.
-    """
-    if len(extracted_texts) < 3:
-        return "🔍 Not enough documents for pre-screening."
-
-    def truncate_text(text, max_chars=8000):
-        """Safely truncates text while ensuring whole sentences are preserved."""
-        if len(text) <= max_chars:
-            return text
-        return text[:max_chars].rsplit('.', 1)[0] + "..."  # ✅ Stops at last full sentence
-
-    combined_texts = truncate_text("\n\n".join(extracted_texts.values()), max_chars=8000)
+def _pre_screen_prompt(extracted_texts, archetype=None):
+    combined_texts = truncate_to_tokens("\n\n".join(extracted_texts.values()), PRE_SCREEN_DOCUMENT_TOKENS,
+                                        DOCUMENT_ANALYSIS_MODEL, whole_sentences=True)
 
     pre_screen_prompt = f"""
     You are an AI document analyst specializing in {archetype} strategic thinking.
@@ -111,42 +105,53 @@ def pre_screen_documents(extracted_texts, archetype=None):
     📖 **Condensed Document Content:**  
     {combined_texts}
     """
+    return pre_screen_prompt
+
+def pre_screen_documents(extracted_texts, archetype=None):
+    """
+    Pre-screens documents to determine relevance, contradictions, and compatibility.
+    """
+    if len(extracted_texts) < 3:
+        return "🔍 Not enough documents for pre-screening."
 
     try:
-        response = openai.ChatCompletion.create(
-            model="gpt-4",
-            messages=[{"role": "system", "content": pre_screen_prompt}]
-        )
-        return response.choices[0].message["content"]
+        return complete(_pre_screen_prompt(extracted_texts, archetype), DOCUMENT_ANALYSIS_MODEL)
     except Exception as e:
         return f"Pre-screening failed: {str(e)}"
 
-def analyze_patterns(extracted_texts, max_chars=5000, archetype=None):
-    """
-    Performs AI-powered pattern recognition if 3 or more documents are uploaded.
-    Prioritizes key sections before truncating.
-    """
+async def async_pre_screen_documents(extracted_texts, archetype=None):
+    """Async version of `pre_screen_documents` (cancellable while the request is in flight)."""
     if len(extracted_texts) < 3:
-        return "🔍 Not enough documents for AI pattern recognition."
+        return "🔍 Not enough documents for pre-screening."
+
+    try:
+        return await acomplete(_pre_screen_prompt(extracted_texts, archetype), DOCUMENT_ANALYSIS_MODEL)
+    except Exception as e:
+        return f"Pre-screening failed: {str(e)}"
 
-    def extract_relevant_sections(text, max_length=2500):
+def _pattern_prompt(extracted_texts, max_tokens=PATTERN_ANALYSIS_TOKENS, archetype=None):
+    def extract_relevant_sections(text, max_length=625):
         """
-        Extracts key sections from a document: beginning, conclusion, and important headings.
+        Extracts key sections from a document (within `max_length` tokens): beginning, conclusion, and important headings.
         """
-        # ✅ Extract first 20% (introduction) and last 20% (conclusion)
-        first_part = text[:max_length // 2]
-        last_part = text[-(max_length // 2):]
+        if count_tokens(text, DOCUMENT_ANALYSIS_MODEL) <= max_length:
+            return text  # ✅ Short documents are sent whole
+
+        # ✅ Extract the introduction and the conclusion
+        first_part = truncate_to_tokens(text, max_length // 4, DOCUMENT_ANALYSIS_MODEL)
+        last_part = truncate_to_tokens(text, max_length // 4, DOCUMENT_ANALYSIS_MODEL, from_end=True)
 
         # ✅ Prioritize key sentences containing 'Summary', 'Conclusion', 'Findings', 'Results'
         important_sentences = re.findall(r'([^.]*?(Summary|Conclusion|Findings|Results|Insights)[^.]*\.)', text, re.IGNORECASE)
-        important_text = " ".join([sent[0] for sent in important_sentences])[:max_length // 2]
+        important_text = truncate_to_tokens(" ".join([sent[0] for sent in important_sentences]), max_length // 2,
+                                            DOCUMENT_ANALYSIS_MODEL)
 
-        # ✅ Combine sections: Important Sentences + First 20% + Last 20%
+        # ✅ Combine sections: Important Sentences + Introduction + Conclusion
         combined = f"{important_text}\n\n{first_part}\n\n{last_part}"
-        return combined[:max_length]  # ✅ Ensure final text does not exceed limit
+        return truncate_to_tokens(combined, max_length, DOCUMENT_ANALYSIS_MODEL)  # ✅ Ensure final text does not exceed limit
 
     # ✅ Apply priority-based truncation
-    truncated_texts = [extract_relevant_sections(text, max_chars // len(extracted_texts)) for text in extracted_texts.values()]
+    truncated_texts = [extract_relevant_sections(text, max_tokens // len(extracted_texts)) for text in extracted_texts.values()]
 
     combined_texts = "\n\n".join(truncated_texts)
 
@@ -161,15 +166,30 @@ def analyze_patterns(extracted_texts, max_chars=5000, archetype=None):
     3️⃣ **What immediate actions should be taken based on these insights?**  
 
     📖 **Strategic Content Extracted:**  
-    {combined_texts[:5000]}  # ✅ Now only analyzing the first 5,000 high-priority tokens
+    {combined_texts}
+    """
+    return pattern_prompt
+
+def analyze_patterns(extracted_texts, max_tokens=PATTERN_ANALYSIS_TOKENS, archetype=None):
     """
+    Performs AI-powered pattern recognition if 3 or more documents are uploaded.
+    Prioritizes key sections before truncating.
+    """
+    if len(extracted_texts) < 3:
+        return "🔍 Not enough documents for AI pattern recognition."
+
+    try:
+        return complete(_pattern_prompt(extracted_texts, max_tokens, archetype), DOCUMENT_ANALYSIS_MODEL)
+    except Exception as e:
+        return f"AI pattern analysis failed: {str(e)}"
+
+async def async_analyze_patterns(extracted_texts, max_tokens=PATTERN_ANALYSIS_TOKENS, archetype=None):
+    """Async version of `analyze_patterns` (cancellable while the request is in flight)."""
+    if len(extracted_texts) < 3:
+        return "🔍 Not enough documents for AI pattern recognition."
 
     try:
-        response = openai.ChatCompletion.create(
-            model="gpt-4",
-            messages=[{"role": "system", "content": pattern_prompt}]
-        )
-        return response.choices[0].message["content"]
+        return await acomplete(_pattern_prompt(extracted_texts, max_tokens, archetype), DOCUMENT_ANALYSIS_MODEL)
     except Exception as e:
         return f"AI pattern analysis failed: {str(e)}"
 
@@ -190,14 +210,10 @@ def summarize_text(text, max_tokens=1000, archetype=None):
     3️⃣ **How should a {archetype} thinker act on this information?**  
     
     📖 **Source Document (Condensed to {max_tokens} tokens):**  
-    {text[:max_tokens * 4]}  # ✅ Dynamically apply `max_tokens` for input truncation
+    {truncate_to_tokens(text, max_tokens, "gpt-3.5-turbo")}
     """
 
     try:
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=[{"role": "system", "content": summary_prompt}]
-        )
-        return response.choices[0].message["content"]
+        return complete(summary_prompt, "gpt-3.5-turbo")
     except Exception as e:
         return f"Summarization failed: {str(e)}"
@@ -0,0 +1,152 @@
+"""
+The single entry point for OpenAI chat completions.
+
+Every call gets a request timeout and is retried on rate limits (429), server errors (5xx),
+timeouts and connection failures with jittered exponential backoff. A `Retry-After` header from
+the API takes precedence over the computed delay. Other errors (bad request, auth) are raised at once.
+
+`LLM_BASE_URL` points all calls at another OpenAI-compatible endpoint, e.g. the local mock server
+for offline load tests: `python benchmarks/mock_llm_server.py` + `LLM_BASE_URL=http://127.0.0.1:8089/v1`.
+"""
+import os
+import time
+import random
+import asyncio
+from email.utils import parsedate_to_datetime
+
+import openai
+
+LLM_BASE_URL = os.getenv("LLM_BASE_URL") or None  # ✅ Default: the OpenAI API
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "120"))  # ✅ Seconds per attempt (per read while streaming)
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "1.0"))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "30"))
+LLM_MAX_RETRY_AFTER = float(os.getenv("LLM_MAX_RETRY_AFTER", "60"))  # ✅ Never sleep longer than this on one hint
+LOG_MESSAGE_MAX_CHARS = 200
+
+if not openai.api_key:
+    openai.api_key = os.getenv("OPENAI_API_KEY")
+
+RETRYABLE_ERRORS = (
+    openai.error.RateLimitError,
+    openai.error.ServiceUnavailableError,
+    openai.error.Timeout,
+    openai.error.APIConnectionError,
+    openai.error.TryAgain,
+)
+
+
+def is_retryable(error):
+    """429s, 5xx responses, timeouts and connection failures are worth another attempt."""
+    if isinstance(error, RETRYABLE_ERRORS):
+        return True
+    if isinstance(error, openai.error.APIError):
+        return error.http_status is None or error.http_status >= 500  # ✅ No status: the stream broke off
+    return False
+
+
+def _retry_after(error):
+    """Seconds requested by a `Retry-After` header (delta-seconds or HTTP date), or None."""
+    value = (getattr(error, "headers", None) or {}).get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def retry_delay(attempt, error=None):
+    """Delay before retry number `attempt` (0-based): the server's Retry-After, else full-jitter backoff."""
+    retry_after = _retry_after(error) if error is not None else None
+    if retry_after is not None:
+        return min(retry_after, LLM_MAX_RETRY_AFTER)
+    return random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * 2 ** attempt))
+
+
+def _request_params(model, messages, max_tokens, timeout, params):
+    request = {"model": model, "messages": messages, "request_timeout": timeout or LLM_TIMEOUT, **params}
+    if max_tokens is not None:
+        request["max_tokens"] = max_tokens
+    if LLM_BASE_URL:
+        request["api_base"] = LLM_BASE_URL
+    return request
+
+
+def _log_retry(model, attempt, delay, error):
+    # ✅ Type, status and a short excerpt only: the body and headers can echo prompts and request metadata
+    message = " ".join(str(getattr(error, "_message", None) or "").split())
+    if len(message) > LOG_MESSAGE_MAX_CHARS:
+        message = message[:LOG_MESSAGE_MAX_CHARS] + "..."
+    print(f"⚠️ LLM call to {model} failed ({type(error).__name__}, "
+          f"status {getattr(error, 'http_status', None) or 'n/a'}: {message or 'no message'}); "
+          f"retry {attempt + 1}/{LLM_MAX_RETRIES} in {delay:.1f}s")
+
+
+def chat_completion(model, messages, max_tokens=None, timeout=None, **params):
+    """`openai.ChatCompletion.create` with a timeout and retries. Returns the response object."""
+    request = _request_params(model, messages, max_tokens, timeout, params)
+    for attempt in range(LLM_MAX_RETRIES + 1):
+        try:
+            return openai.ChatCompletion.create(**request)
+        except openai.error.OpenAIError as e:
+            if attempt >= LLM_MAX_RETRIES or not is_retryable(e):
+                raise
+            delay = retry_delay(attempt, e)
+            _log_retry(model, attempt, delay, e)
+            time.sleep(delay)
+
+
+async def achat_completion(model, messages, max_tokens=None, timeout=None, **params):
+    """Async version of `chat_completion` (`openai.ChatCompletion.acreate`)."""
+    request = _request_params(model, messages, max_tokens, timeout, params)
+    for attempt in range(LLM_MAX_RETRIES + 1):
+        try:
+            return await openai.ChatCompletion.acreate(**request)
+        except openai.error.OpenAIError as e:
+            if attempt >= LLM_MAX_RETRIES or not is_retryable(e):
+                raise
+            delay = retry_delay(attempt, e)
+            _log_retry(model, attempt, delay, e)
+            await asyncio.sleep(delay)
+
+
+def complete(prompt, model, max_tokens=None, timeout=None):
+    """Sends `prompt` as the system message and returns the reply text."""
+    response = chat_completion(model, [{"role": "system", "content": prompt}], max_tokens, timeout)
+    return response.choices[0].message["content"]
+
+
+async def acomplete(prompt, model, max_tokens=None, timeout=None):
+    """Async version of `complete`."""
+    response = await achat_completion(model, [{"role": "system", "content": prompt}], max_tokens, timeout)
+    return response.choices[0].message["content"]
+
+
+def stream_completion(prompt, model, max_tokens=None, timeout=None):
+    """
+    Streams the reply to `prompt`, yielding content deltas as they arrive.
+    Failures before the first delta are retried like `chat_completion`; once text has been
+    yielded the error is raised, since a retry would repeat what the caller already showed.
+    """
+    request = _request_params(model, [{"role": "system", "content": prompt}], max_tokens, timeout,
+                              {"stream": True})
+    for attempt in range(LLM_MAX_RETRIES + 1):
+        started = False
+        try:
+            for chunk in openai.ChatCompletion.create(**request):
+                content = chunk.choices[0].delta.get("content") if chunk.choices else None
+                if content:
+                    started = True
+                    yield content
+            return
+        except openai.error.OpenAIError as e:
+            if started or attempt >= LLM_MAX_RETRIES or not is_retryable(e):
+                raise
+            delay = retry_delay(attempt, e)
+            _log_retry(model, attempt, delay, e)
+            time.sleep(delay)
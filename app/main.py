@@ -1,6 +1,8 @@
 import sys
 import os
-import openai  # ✅ Ensure OpenAI is only used here
+import asyncio
+import hashlib
+import openai  # ✅ API key is configured here; calls go through app/llm_client.py
 from dotenv import load_dotenv
 
 # ✅ Load environment variables
@@ -16,136 +18,114 @@ print(f"✅ OpenAI API Key Loaded: {openai.api_key[:5]}********")  # ✅ Debuggi
 # ✅ Ensure Python finds 'app/' directory
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
-from app.config import PLAN_DETAILS
-from app.document_processing import extract_text, pre_screen_documents, analyze_patterns  # ✅ Only relevant imports
-from prompt_library.expert_prompts import expert_prompts
-from prompt_library.archetype_prompts import archetype_prompts
 from app.cache_manager import get_cached_response, cache_response
+from app.cache_keys import build_query_cache_key, build_request_context
+from app.query_similarity import find_similar_cached_response
+from app.single_flight import single_flight, single_flight_stream
 from app.database import log_user_query
+from app.prompt_compiler import compile_report_prompt, report_model, REPORT_MAX_TOKENS
+from app.pipeline import run_report_pipeline, format_documents
+from app.llm_client import complete, stream_completion
 
-def process_user_request(user_id, query, archetype, selected_experts, uploaded_files, user_plan,doc_usage_option=None):
+def get_cached_report(context, cache_key, query):
+    """Returns the cached report for `cache_key`, else a near-duplicate query's report, else an empty string."""
+    return get_cached_response(cache_key) or find_similar_cached_response(context, query)
+
+
+def process_user_request(user_id, query, archetype, selected_experts, uploaded_files, user_plan,doc_usage_option=None,
+                         check_cache=True):
     """
     Processes user request, integrates expert guidance, document analysis, and calls OpenAI.
+    Callers that already looked the request up in the cache pass `check_cache=False`.
     """
     # ✅ First, check Redis cache before making an API call
-    cache_key = f"user_query:{user_id}:{archetype}:{query}"
-    cached_response = get_cached_response(cache_key)
+    context = build_request_context(archetype, selected_experts, user_plan, uploaded_files, doc_usage_option)
+    cache_key = build_query_cache_key(query, archetype, context=context)
+    cached_response = get_cached_report(context, cache_key, query) if check_cache else ""
+
+    if cached_response:
+        return cached_response  # ✅ Use cached (or near-duplicate) response if available
+
+    # ✅ Log the user's query before AI processing
+    log_user_query(user_id, query, None, user_plan, archetype)
+
+    # ✅ Concurrent identical requests (other tabs/users) share a single OpenAI call
+    return single_flight(cache_key, lambda: _generate_ai_report(
+        user_id, query, archetype, selected_experts, uploaded_files, user_plan, doc_usage_option
+    ))
+
+
+def stream_user_request(user_id, query, archetype, selected_experts, uploaded_files, user_plan, doc_usage_option=None,
+                        check_cache=True):
+    """
+    Streaming variant of `process_user_request`: yields the report text in chunks as OpenAI produces them.
+    Cached answers are yielded in one piece. Plans with summaries get them on demand (`generate_summary`).
+    """
+    context = build_request_context(archetype, selected_experts, user_plan, uploaded_files, doc_usage_option)
+    cache_key = build_query_cache_key(query, archetype, context=context)
+    cached_response = get_cached_report(context, cache_key, query) if check_cache else ""
 
     if cached_response:
-        return cached_response  # ✅ Use cached response if available
+        yield cached_response
+        return
 
     # ✅ Log the user's query before AI processing
     log_user_query(user_id, query, None, user_plan, archetype)
 
-    expert_prompt = f"📌 **How {archetype} Uses Expert Insights:**\n"
-    expert_prompt += archetype_prompts.get(archetype + "_experts", "Your experts serve as strategic advisors.") + "\n\n"
-    expert_prompt += "\n".join(
-        [f"🔹 **{expert}** → {expert_prompts.get(expert, 'Key insights tailored to this strategy.')}" for expert in
-         selected_experts]
-    )
-
-    # ✅ Document Processing
-    if uploaded_files:
-        extracted_texts = extract_text(uploaded_files)
-
-        if doc_usage_option == "Summarize & Ask Direct Questions":
-            formatted_docs = "\n".join([f"📄 {name}: {text[:500]}" for name, text in extracted_texts.items()])
-        else:
-            formatted_docs = "\n".join([f"📄 {name}: {text}" for name, text in extracted_texts.items()])
-    else:
-        extracted_texts = {}
-        formatted_docs = "📂 No additional documents provided." if not extracted_texts else ""
-
-    # ✅ Ensure only valid documents are processed
-    valid_texts = {name: text for name, text in extracted_texts.items() if "Error extracting" not in text}
-
-    if valid_texts:  # ✅ Only process if `valid_texts` is not empty
-        if len(valid_texts) >= 3:
-            pre_screen_results = pre_screen_documents(valid_texts)
-
-            # ✅ Only Run Pattern Analysis if Docs Are Compatible
-            if "not related" in pre_screen_results.lower():
-                formatted_docs = f"⚠️ AI detected these documents are **not related.** Proceed with caution.\n\n{pre_screen_results}"
-            else:
-                pattern_analysis = analyze_patterns(valid_texts)
-                formatted_docs = f"📂 **AI-Detected Patterns Across Documents:**\n{pattern_analysis}"
-        else:
-            formatted_docs = "\n".join([f"📄 {name}: {text[:1000]}" for name, text in valid_texts.items()])
-
-    # ✅ Fetch Report Depth Based on User Plan
-    report_depth = PLAN_DETAILS.get(user_plan, {}).get("report_depth", """
-    🚀 **Generate a structured response that includes:**
-    1️⃣ **Summary of key insights**
-    2️⃣ **Three actionable steps**
-    3️⃣ **One major risk to consider**
-    """)
-    summary_available = PLAN_DETAILS.get(user_plan, {}).get("summary_available", False)
-
-    # ✅ Format the Query Before Sending to AI
-    structured_query = f"""
-    🎭 **{archetype} Strategic Thinking Model**
-    📌 {archetype_prompts.get(archetype, 'Default archetypal approach.')}
-
-    🛠 **Key Strengths of {archetype} Strategy:**
-    - {archetype_prompts.get(archetype + '_strengths', 'Adaptive execution and high-impact decision-making.')}
-    - {archetype_prompts.get(archetype + '_priority', 'Scalability, competitive positioning, and risk management.')}
-
-    📌 **AI Directive:** Responses must align with {archetype}'s leadership principles.
-
-    🎓 **Expert Contributions (Aligned with {archetype} Thinking):**
-    {expert_prompt}
-
-    📂 **Document Insights (Analyzed Through the {archetype} Lens):**
-    {formatted_docs if formatted_docs else 'No additional documents provided.'}
-
-    📝 **User Query (Framed Within {archetype} Reasoning):**
-    "{query}"
-
-    📊 **Strategic Depth:**  
-    {report_depth}
+    # ✅ Concurrent identical requests share one stream (followers receive the finished text)
+    yield from single_flight_stream(cache_key, lambda: _stream_ai_report(
+        user_id, query, archetype, selected_experts, uploaded_files, user_plan, doc_usage_option
+    ))
+
+
+def _generate_ai_report(user_id, query, archetype, selected_experts, uploaded_files, user_plan, doc_usage_option=None):
+    """
+    Runs the report pipeline (documents → report → summary, see app/pipeline.py) and returns the report text.
+    A summary produced by the pipeline is cached for `generate_summary`, so showing it costs no extra call.
     """
+    report, summary, timings = asyncio.run(run_report_pipeline(
+        query, archetype, selected_experts, uploaded_files, user_plan, doc_usage_option
+    ))
 
-    # ✅ Call OpenAI API
-    response = openai.ChatCompletion.create(
-        model="gpt-4-turbo" if user_plan != "Free" else "gpt-3.5-turbo",
-        messages=[{"role": "system", "content": structured_query}],
-        max_tokens=2000
-    )
+    print(f"✅ Processing Query - User: {user_id}, Archetype: {archetype}, Query: {query}, Stage timings: {timings}")
+
+    if summary:
+        cache_response(summary_cache_key(report), summary)
+    return report
+
+
+def _stream_ai_report(user_id, query, archetype, selected_experts, uploaded_files, user_plan, doc_usage_option=None):
+    """
+    Same request as `_generate_ai_report`, streamed; yields content deltas as they arrive.
+    """
+    formatted_docs = asyncio.run(format_documents(uploaded_files, doc_usage_option))
+    structured_query = compile_report_prompt(archetype, selected_experts, user_plan, query, formatted_docs)
 
-    print(f"✅ Processing Query - User: {user_id}, Archetype: {archetype}, Query: {query}")
+    print(f"✅ Streaming Query - User: {user_id}, Archetype: {archetype}, Query: {query}")
 
-    ai_response = response.choices[0].message["content"]  # ✅ Returns AI-generated response
+    yield from stream_completion(structured_query, report_model(user_plan), REPORT_MAX_TOKENS)
 
-    # ✅ If Summary is Available, Generate One Using AI
-    if summary_available:
-        summary_prompt = f"Summarize this report in ~300 words:\n\n{ai_response}"
-        summary_response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=[{"role": "system", "content": summary_prompt}],
-            max_tokens=500
-        ).choices[0].message["content"]
-        return ai_response, summary_response  # ✅ Return both full report & summary
 
-    return ai_response
+def summary_cache_key(full_report):
+    return f"summary:{hashlib.sha256(str(full_report).encode('utf-8')).hexdigest()}"
 
 
 def generate_summary(full_report, user_id):
     """
     Summarizes a business strategy report using AI while keeping follow-up memory.
     """
-    # ✅ Check Redis cache first
-    cache_key = f"summary:{user_id}"
+    # ✅ Check Redis cache first (keyed by report content, so a new report never gets an old summary)
+    cache_key = summary_cache_key(full_report)
     cached_summary = get_cached_response(cache_key)
 
     if cached_summary:
         return cached_summary  # ✅ Use cached summary if available
 
-    summary_prompt = f"Summarize this business strategy report in a concise and actionable way:\n\n{full_report}"
+    def summarize():
+        summary_prompt = f"Summarize this business strategy report in a concise and actionable way:\n\n{full_report}"
 
-    response = openai.ChatCompletion.create(
-        model="gpt-3.5-turbo",
-        messages=[{"role": "system", "content": summary_prompt}],
-        max_tokens=500
-    )
+        summary = complete(summary_prompt, "gpt-3.5-turbo", max_tokens=500)
+        cache_response(cache_key, summary)
+        return summary
 
-    return response.choices[0].message["content"]
+    return single_flight(cache_key, summarize)  # ✅ Double clicks / multiple tabs share one call
@@ -0,0 +1,333 @@
+"""
+Versioned schema migrations, applied once at startup by `init_db_pool`.
+
+Each migration runs in its own transaction and is recorded in `schema_migrations`,
+so the hot path can rely on the schema instead of probing `information_schema`.
+Append new migrations to MIGRATIONS with the next version number; never edit applied ones.
+Every version also has an entry in SQLITE_MIGRATIONS (possibly empty, for Postgres-only
+features such as partitioning), so both backends share one version history.
+A statement is either SQL or a callable taking the cursor (for data backfills).
+"""
+import hashlib
+
+from app.storage_backend import storage
+
+MIGRATIONS = [
+    (1, "baseline tables", [
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            id SERIAL PRIMARY KEY,
+            email TEXT UNIQUE NOT NULL,
+            password_hash TEXT NOT NULL,
+            plan TEXT DEFAULT 'The Foundation (Free)',
+            is_admin BOOLEAN DEFAULT FALSE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS query_logs (
+            id SERIAL PRIMARY KEY,
+            user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+            query TEXT NOT NULL,
+            plan TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS user_feedback (
+            id SERIAL PRIMARY KEY,
+            user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+            query TEXT NOT NULL,
+            feedback_text TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS strategy_reports (
+            id SERIAL PRIMARY KEY,
+            user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+            pdf_filename TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS enterprise_access (
+            user_id INTEGER PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+            used BOOLEAN DEFAULT FALSE,
+            follow_ups_remaining INTEGER DEFAULT 2
+        );
+        """,
+    ]),
+    (2, "query_logs archetype and response columns", [
+        "ALTER TABLE query_logs ADD COLUMN IF NOT EXISTS archetype TEXT;",
+        "ALTER TABLE query_logs ADD COLUMN IF NOT EXISTS response TEXT;",
+    ]),
+    (3, "indexes for per-user history lookups", [
+        "CREATE INDEX IF NOT EXISTS idx_query_logs_user_created ON query_logs (user_id, created_at DESC);",
+        "CREATE INDEX IF NOT EXISTS idx_user_feedback_user_created ON user_feedback (user_id, created_at DESC);",
+        "CREATE INDEX IF NOT EXISTS idx_strategy_reports_user_created ON strategy_reports (user_id, created_at DESC);",
+    ]),
+    (4, "query history keyset index and full-text search", [
+        # ✅ (created_at, id) keyset needs the id tiebreaker; the old index is a redundant prefix of this one
+        "CREATE INDEX IF NOT EXISTS idx_query_logs_user_created_id ON query_logs (user_id, created_at DESC, id DESC);",
+        "DROP INDEX IF EXISTS idx_query_logs_user_created;",
+        """
+        ALTER TABLE query_logs ADD COLUMN IF NOT EXISTS search_vector tsvector
+            GENERATED ALWAYS AS (
+                setweight(to_tsvector('english', coalesce(query, '')), 'A') ||
+                setweight(to_tsvector('english', coalesce(response, '')), 'B')
+            ) STORED;
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_query_logs_search ON query_logs USING GIN (search_vector);",
+    ]),
+    (5, "monthly range partitioning of query_logs", [
+        "ALTER TABLE query_logs RENAME TO query_logs_unpartitioned;",
+        "ALTER INDEX IF EXISTS query_logs_pkey RENAME TO query_logs_unpartitioned_pkey;",
+        "ALTER INDEX IF EXISTS idx_query_logs_user_created_id RENAME TO idx_query_logs_unpartitioned_user_created_id;",
+        "ALTER INDEX IF EXISTS idx_query_logs_search RENAME TO idx_query_logs_unpartitioned_search;",
+        # ✅ The partition key must be part of the primary key; ids keep coming from the SERIAL sequence
+        """
+        CREATE TABLE query_logs (
+            id INTEGER NOT NULL DEFAULT nextval('query_logs_id_seq'),
+            user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+            query TEXT NOT NULL,
+            plan TEXT NOT NULL,
+            created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            archetype TEXT,
+            response TEXT,
+            search_vector tsvector GENERATED ALWAYS AS (
+                setweight(to_tsvector('english', coalesce(query, '')), 'A') ||
+                setweight(to_tsvector('english', coalesce(response, '')), 'B')
+            ) STORED,
+            PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at);
+        """,
+        "ALTER SEQUENCE query_logs_id_seq OWNED BY query_logs.id;",
+        "CREATE TABLE query_logs_default PARTITION OF query_logs DEFAULT;",
+        # ✅ One partition per month of existing data, plus the next two months
+        """
+        DO $$
+        DECLARE month_start DATE;
+        BEGIN
+            FOR month_start IN
+                SELECT generate_series(
+                    date_trunc('month', COALESCE((SELECT MIN(created_at) FROM query_logs_unpartitioned), CURRENT_TIMESTAMP)),
+                    date_trunc('month', CURRENT_TIMESTAMP) + INTERVAL '2 months',
+                    INTERVAL '1 month'
+                )::date
+            LOOP
+                EXECUTE format(
+                    'CREATE TABLE IF NOT EXISTS %I PARTITION OF query_logs FOR VALUES FROM (%L) TO (%L)',
+                    'query_logs_' || to_char(month_start, 'YYYY_MM'), month_start, (month_start + INTERVAL '1 month')::date
+                );
+            END LOOP;
+        END $$;
+        """,
+        """
+        INSERT INTO query_logs (id, user_id, query, plan, created_at, archetype, response)
+        SELECT id, user_id, query, plan, COALESCE(created_at, CURRENT_TIMESTAMP), archetype, response
+        FROM query_logs_unpartitioned;
+        """,
+        "DROP TABLE query_logs_unpartitioned;",
+        "CREATE INDEX idx_query_logs_user_created_id ON query_logs (user_id, created_at DESC, id DESC);",
+        "CREATE INDEX idx_query_logs_search ON query_logs USING GIN (search_vector);",
+    ]),
+    (6, "content-addressed responses table", [
+        """
+        CREATE TABLE IF NOT EXISTS responses (
+            hash TEXT PRIMARY KEY,
+            body TEXT NOT NULL,
+            size_bytes INTEGER NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            search_vector tsvector GENERATED ALWAYS AS (to_tsvector('english', body)) STORED
+        );
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_responses_search ON responses USING GIN (search_vector);",
+        "ALTER TABLE query_logs ADD COLUMN IF NOT EXISTS response_hash TEXT REFERENCES responses(hash);",
+        """
+        INSERT INTO responses (hash, body, size_bytes)
+        SELECT DISTINCT ON (hash) hash, response, OCTET_LENGTH(response)
+        FROM (
+            SELECT encode(sha256(convert_to(response, 'UTF8')), 'hex') AS hash, response
+            FROM query_logs
+            WHERE response IS NOT NULL
+        ) logged
+        ON CONFLICT (hash) DO NOTHING;
+        """,
+        """
+        UPDATE query_logs SET response_hash = encode(sha256(convert_to(response, 'UTF8')), 'hex')
+        WHERE response IS NOT NULL;
+        """,
+        # ✅ Response text now lives once in `responses`; the log's search vector covers the query only
+        "ALTER TABLE query_logs DROP COLUMN search_vector;",
+        "ALTER TABLE query_logs DROP COLUMN response;",
+        """
+        ALTER TABLE query_logs ADD COLUMN search_vector tsvector
+            GENERATED ALWAYS AS (to_tsvector('english', coalesce(query, ''))) STORED;
+        """,
+        "CREATE INDEX idx_query_logs_search ON query_logs USING GIN (search_vector);",
+        "CREATE INDEX idx_query_logs_response_hash ON query_logs (response_hash);",
+    ]),
+    (7, "usage_periods billing history", [
+        """
+        CREATE TABLE IF NOT EXISTS usage_periods (
+            user_id INTEGER NOT NULL,
+            period TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            used INTEGER NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (user_id, period, kind)
+        );
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_usage_periods_period ON usage_periods (period);",
+    ]),
+]
+
+
+def _sqlite_backfill_responses(cursor):
+    """Moves query_logs.response into content-addressed responses rows (SQLite has no sha256())."""
+    cursor.execute("SELECT id, response FROM query_logs WHERE response IS NOT NULL;")
+    rows = cursor.fetchall()
+    for log_id, response in rows:
+        body_hash = hashlib.sha256(response.encode("utf-8")).hexdigest()
+        cursor.execute("INSERT INTO responses (hash, body, size_bytes) VALUES (%s, %s, %s) ON CONFLICT (hash) DO NOTHING;",
+                       (body_hash, response, len(response.encode("utf-8"))))
+        cursor.execute("UPDATE query_logs SET response_hash = %s WHERE id = %s;", (body_hash, log_id))
+
+
+# ✅ SQLite equivalents of MIGRATIONS, by version (same resulting tables, columns and indexes)
+SQLITE_MIGRATIONS = {
+    1: [
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            email TEXT UNIQUE NOT NULL,
+            password_hash TEXT NOT NULL,
+            plan TEXT DEFAULT 'The Foundation (Free)',
+            is_admin BOOLEAN DEFAULT FALSE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS query_logs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+            query TEXT NOT NULL,
+            plan TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS user_feedback (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+            query TEXT NOT NULL,
+            feedback_text TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS strategy_reports (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+            pdf_filename TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS enterprise_access (
+            user_id INTEGER PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+            used BOOLEAN DEFAULT FALSE,
+            follow_ups_remaining INTEGER DEFAULT 2
+        );
+        """,
+    ],
+    2: [
+        "ALTER TABLE query_logs ADD COLUMN archetype TEXT;",
+        "ALTER TABLE query_logs ADD COLUMN response TEXT;",
+    ],
+    3: MIGRATIONS[2][2],
+    4: [
+        "CREATE INDEX IF NOT EXISTS idx_query_logs_user_created_id ON query_logs (user_id, created_at DESC, id DESC);",
+        "DROP INDEX IF EXISTS idx_query_logs_user_created;",
+    ],
+    5: [],  # ✅ Partitioning is Postgres-only
+    6: [
+        """
+        CREATE TABLE IF NOT EXISTS responses (
+            hash TEXT PRIMARY KEY,
+            body TEXT NOT NULL,
+            size_bytes INTEGER NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        """,
+        "ALTER TABLE query_logs ADD COLUMN response_hash TEXT REFERENCES responses(hash);",
+        _sqlite_backfill_responses,
+        "ALTER TABLE query_logs DROP COLUMN response;",
+        "CREATE INDEX IF NOT EXISTS idx_query_logs_response_hash ON query_logs (response_hash);",
+    ],
+    7: MIGRATIONS[6][2],
+}
+
+
+def _ensure_migrations_table(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+    """)
+
+
+def get_schema_version(cursor):
+    """Returns the highest applied migration version (0 for a fresh database)."""
+    cursor.execute("SELECT COALESCE(MAX(version), 0) FROM schema_migrations;")
+    return cursor.fetchone()[0]
+
+
+def _statements_for(version, statements):
+    return statements if storage.name == "postgres" else SQLITE_MIGRATIONS[version]
+
+
+def run_migrations():
+    """
+    Brings the schema up to the latest version. Returns the resulting version, or None on failure.
+    Every step runs in one transaction holding the migration lock, and re-reads the version after
+    taking it, so workers starting together apply each migration exactly once.
+    """
+    try:
+        with storage.transaction() as cursor:
+            storage.lock_migrations(cursor)
+            _ensure_migrations_table(cursor)
+            version = get_schema_version(cursor)
+
+        for migration_version, description, statements in MIGRATIONS:
+            if migration_version <= version:
+                continue
+            try:
+                with storage.transaction() as cursor:  # ✅ Each migration is applied atomically
+                    storage.lock_migrations(cursor)
+                    version = get_schema_version(cursor)
+                    if migration_version <= version:
+                        continue  # ✅ Another worker applied it while we waited for the lock
+                    for statement in _statements_for(migration_version, statements):
+                        if callable(statement):
+                            statement(cursor)
+                        else:
+                            cursor.execute(statement)
+                    cursor.execute(
+                        "INSERT INTO schema_migrations (version, description) VALUES (%s, %s);",
+                        (migration_version, description),
+                    )
+            except Exception as e:
+                print(f"❌ Migration {migration_version} ({description}) failed: {e}")
+                return version
+            version = migration_version
+            print(f"✅ Applied migration {migration_version}: {description}")
+
+        print(f"✅ Database schema at version {version}.")
+        return version
+    except Exception as e:
+        print(f"❌ Failed to run migrations: {e}")
+        return None
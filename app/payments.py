@@ -1,8 +1,9 @@
 import stripe
 import os
-from app.database import get_db_connection, release_db_connection  # ✅ Use connection pooling
+from app.storage_backend import storage  # ✅ Postgres pool or embedded SQLite (STORAGE_BACKEND)
 from app.config import PLAN_DETAILS  # ✅ Import PLAN_DETAILS
 from app.user_management import update_user_plan  # ✅ Ensure function is imported
+from app.user_profile import invalidate_user_profile
 
 # ✅ Load Stripe API Key from Environment Variables
 stripe.api_key = os.getenv("STRIPE_SECRET_KEY")
@@ -13,6 +14,7 @@ def process_upgrade(user_id, new_plan):
         return "Invalid Plan"
     try:
         update_user_plan(user_id, new_plan)
+        invalidate_user_profile(user_id)  # ✅ Also covers identifiers update_user_plan could not match
         return f"Plan updated to {new_plan} successfully."
     except Exception as e:
         print(f"❌ Plan upgrade failed: {e}")
@@ -41,26 +43,11 @@ def process_one_time_payment(user_id, amount=25):
         )
 
         # ✅ Store purchase in database
-        conn = get_db_connection()
-        if not conn:
-            print("❌ Database connection failed")
-            return None
-
-        cursor = None  # ✅ Initialize cursor to prevent reference errors
-
         try:
-            cursor = conn.cursor()
-            cursor.execute("""
-                INSERT INTO enterprise_access (user_id, used, follow_ups_remaining)
-                VALUES (%s, %s, %s) ON CONFLICT (user_id) DO UPDATE SET used = FALSE, follow_ups_remaining = 2;
-            """, (user_id, False, 2))
-            conn.commit()
+            storage.grant_one_time_access(user_id, follow_ups=2)
+            invalidate_user_profile(user_id)
         except Exception as e:
             print(f"❌ Database error: {e}")
-        finally:
-            if cursor:  # ✅ Only close cursor if it was successfully assigned
-                cursor.close()
-            release_db_connection(conn)
 
         return session.url
     except Exception as e:
@@ -0,0 +1,112 @@
+"""
+Async orchestration of the multi-call report pipeline used by `process_user_request`.
+
+Stages and what they wait for:
+- `extract`: text extraction, one worker thread per uploaded file.
+- `pre_screen` and `pattern_analysis` (3+ documents): both start as soon as the text is
+  extracted. Pattern analysis is speculative and is cancelled if pre-screening finds the
+  documents are not related.
+- `report`: the main completion, once the document insights are ready.
+- `summary`: only on plans with `summary_available`; it summarizes the report, so it runs last.
+
+Every stage's wall time (seconds) is returned with the result, e.g.
+`{"extract": 0.41, "pre_screen": 6.2, "pattern_analysis": 5.8, "report": 24.9, "total": 31.5}`.
+Cancelled stages are reported as `"<stage>_cancelled"`.
+"""
+import time
+import asyncio
+
+from app.config import PLAN_DETAILS
+from app.llm_client import acomplete
+from app.document_processing import extract_text, async_pre_screen_documents, async_analyze_patterns
+from app.prompt_compiler import compile_report_prompt, report_model, REPORT_MAX_TOKENS
+
+NO_DOCUMENTS_TEXT = "📂 No additional documents provided."
+
+
+async def _timed(timings, stage, awaitable):
+    """Awaits `awaitable` and records its wall time under `stage`."""
+    start = time.perf_counter()
+    try:
+        result = await awaitable
+    except asyncio.CancelledError:
+        timings[f"{stage}_cancelled"] = round(time.perf_counter() - start, 3)
+        raise
+    timings[stage] = round(time.perf_counter() - start, 3)
+    return result
+
+
+async def _extract_documents(uploaded_files):
+    """Extracts every file in its own worker thread; keeps the upload order."""
+    results = await asyncio.gather(*(asyncio.to_thread(extract_text, [file]) for file in uploaded_files))
+    extracted_texts = {}
+    for result in results:
+        extracted_texts.update(result)
+    return extracted_texts
+
+
+async def _cancel(task):
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+
+
+async def format_documents(uploaded_files, doc_usage_option=None, timings=None):
+    """Turns the uploaded files into the "Document Insights" section of the report prompt."""
+    timings = {} if timings is None else timings
+    if not uploaded_files:
+        return NO_DOCUMENTS_TEXT
+
+    extracted_texts = await _timed(timings, "extract", _extract_documents(uploaded_files))
+    if doc_usage_option == "Summarize & Ask Direct Questions":
+        formatted_docs = "\n".join([f"📄 {name}: {text[:500]}" for name, text in extracted_texts.items()])
+    else:
+        formatted_docs = "\n".join([f"📄 {name}: {text}" for name, text in extracted_texts.items()])
+
+    # ✅ Ensure only valid documents are processed
+    valid_texts = {name: text for name, text in extracted_texts.items() if "Error extracting" not in text}
+    if not valid_texts:
+        return formatted_docs
+    if len(valid_texts) < 3:
+        return "\n".join([f"📄 {name}: {text[:1000]}" for name, text in valid_texts.items()])
+
+    # ✅ Both calls only need the extracted text, so pattern analysis starts alongside pre-screening
+    pre_screen_task = asyncio.create_task(_timed(timings, "pre_screen", async_pre_screen_documents(valid_texts)))
+    pattern_task = asyncio.create_task(_timed(timings, "pattern_analysis", async_analyze_patterns(valid_texts)))
+    try:
+        pre_screen_results = await pre_screen_task
+    except BaseException:
+        await _cancel(pattern_task)
+        raise
+
+    if "not related" in pre_screen_results.lower():
+        await _cancel(pattern_task)  # ✅ Incompatible documents: the speculative analysis is not used
+        return f"⚠️ AI detected these documents are **not related.** Proceed with caution.\n\n{pre_screen_results}"
+
+    pattern_analysis = await pattern_task
+    return f"📂 **AI-Detected Patterns Across Documents:**\n{pattern_analysis}"
+
+
+async def run_report_pipeline(query, archetype, selected_experts, uploaded_files, user_plan, doc_usage_option=None):
+    """
+    Runs the whole report pipeline. Returns `(report, summary, timings)`: `summary` is None unless the
+    plan includes one, and `timings` maps stage → seconds.
+    """
+    timings = {}
+    start = time.perf_counter()
+
+    formatted_docs = await format_documents(uploaded_files, doc_usage_option, timings)
+    structured_query = compile_report_prompt(archetype, selected_experts, user_plan, query, formatted_docs)
+    report = await _timed(timings, "report",
+                          acomplete(structured_query, report_model(user_plan), REPORT_MAX_TOKENS))
+
+    # ✅ If Summary is Available, Generate One Using AI
+    summary = None
+    if PLAN_DETAILS.get(user_plan, {}).get("summary_available", False):
+        summary_prompt = f"Summarize this report in ~300 words:\n\n{report}"
+        summary = await _timed(timings, "summary", acomplete(summary_prompt, "gpt-3.5-turbo", 500))
+
+    timings["total"] = round(time.perf_counter() - start, 3)
+    return report, summary, timings
@@ -0,0 +1,114 @@
+"""
+Compiles the report prompt from a memoized static prefix and a per-request suffix.
+
+Everything that depends only on (archetype, experts, plan) — the archetype model, expert
+contributions and report depth — is rendered once per combination and cached together with its
+token count. Per-request data (document insights, then the query) is always appended after it,
+so identical prefixes reach the provider byte-for-byte and its prompt prefix caching can apply.
+"""
+import json
+from functools import lru_cache
+
+from app.config import PLAN_DETAILS
+from app.token_budget import count_tokens, fit_sections
+from prompt_library.archetype_prompts import archetype_prompts
+from prompt_library.expert_prompts import expert_prompts
+
+REPORT_MAX_TOKENS = 2000
+PREFIX_CACHE_SIZE = 1024
+# ✅ Lower numbers are kept whole first; the static prefix is never trimmed
+REPORT_SECTION_PRIORITIES = {"query": 0, "documents": 1}
+NO_DOCUMENTS_TEXT = "No additional documents provided."
+DEFAULT_REPORT_DEPTH = """
+    🚀 **Generate a structured response that includes:**
+    1️⃣ **Summary of key insights**
+    2️⃣ **Three actionable steps**
+    3️⃣ **One major risk to consider**
+    """
+
+
+def report_model(user_plan):
+    return "gpt-4-turbo" if user_plan != "Free" else "gpt-3.5-turbo"
+
+
+def _render_prefix(archetype, experts, user_plan):
+    expert_prompt = f"📌 **How {archetype} Uses Expert Insights:**\n"
+    expert_prompt += archetype_prompts.get(archetype + "_experts", "Your experts serve as strategic advisors.") + "\n\n"
+    expert_prompt += "\n".join(
+        [f"🔹 **{expert}** → {expert_prompts.get(expert, 'Key insights tailored to this strategy.')}" for expert in
+         experts]
+    )
+
+    # ✅ Fetch Report Depth Based on User Plan
+    report_depth = PLAN_DETAILS.get(user_plan, {}).get("report_depth", DEFAULT_REPORT_DEPTH)
+
+    prefix = f"""
+    🎭 **{archetype} Strategic Thinking Model**
+    📌 {archetype_prompts.get(archetype, 'Default archetypal approach.')}
+
+    🛠 **Key Strengths of {archetype} Strategy:**
+    - {archetype_prompts.get(archetype + '_strengths', 'Adaptive execution and high-impact decision-making.')}
+    - {archetype_prompts.get(archetype + '_priority', 'Scalability, competitive positioning, and risk management.')}
+
+    📌 **AI Directive:** Responses must align with {archetype}'s leadership principles.
+
+    🎓 **Expert Contributions (Aligned with {archetype} Thinking):**
+    {expert_prompt}
+
+    📊 **Strategic Depth:**
+    {report_depth}
+    """
+    return prefix
+
+
+@lru_cache(maxsize=PREFIX_CACHE_SIZE)
+def compile_report_prefix(archetype, experts, user_plan):
+    """
+    Static part of the report prompt for one (archetype, experts, plan) combination.
+    `experts` must be a sorted tuple. Returns `(prefix, prefix_tokens)`.
+    """
+    prefix = _render_prefix(archetype, experts, user_plan)
+    return prefix, count_tokens(prefix, report_model(user_plan))
+
+
+def _render_suffix(archetype, documents, query):
+    return f"""
+    📂 **Document Insights (Analyzed Through the {archetype} Lens):**
+    {documents}
+
+    📝 **User Query (Framed Within {archetype} Reasoning):**
+    "{query}"
+    """
+
+
+def report_template_fingerprint():
+    """
+    Everything in the report prompt that is not per-request data: the rendered template, each plan's
+    report depth and model, and the output budget. Part of `PROMPT_LIBRARY_VERSION` (app/cache_keys.py).
+    """
+    return json.dumps({
+        "template": _render_prefix("{archetype}", ("{expert}",), None)
+        + _render_suffix("{archetype}", "{documents}", "{query}") + NO_DOCUMENTS_TEXT,
+        "report_depth": {plan: details.get("report_depth", DEFAULT_REPORT_DEPTH)
+                         for plan, details in PLAN_DETAILS.items()},
+        "models": {plan: report_model(plan) for plan in PLAN_DETAILS},
+        "max_tokens": REPORT_MAX_TOKENS,
+    }, sort_keys=True, ensure_ascii=False)
+
+
+def compile_report_prompt(archetype, selected_experts, user_plan, query, formatted_docs):
+    """
+    Builds the report prompt: the memoized static prefix, then the document insights and the query.
+    `formatted_docs` comes from the document stage of the report pipeline (`app.pipeline.format_documents`).
+    Documents are trimmed first (then the query) to fit the model's context window.
+    """
+    prefix, prefix_tokens = compile_report_prefix(archetype, tuple(sorted(selected_experts or [])), user_plan)
+    model = report_model(user_plan)
+
+    template_tokens = count_tokens(_render_suffix(archetype, "", ""), model)
+    sections = fit_sections(
+        [("documents", formatted_docs or NO_DOCUMENTS_TEXT, REPORT_SECTION_PRIORITIES["documents"]),
+         ("query", query, REPORT_SECTION_PRIORITIES["query"])],
+        model, reserved_tokens=REPORT_MAX_TOKENS + prefix_tokens + template_tokens,
+    )
+    return prefix + _render_suffix(archetype, sections["documents"], sections["query"])
@@ -0,0 +1,218 @@
+"""
+Maintenance for the monthly partitions of query_logs (see migration 5).
+
+- `ensure_query_log_partitions` creates partitions ahead of time so rows never land in
+  the DEFAULT partition (run at startup and daily).
+- `archive_expired_partitions` exports partitions older than the retention window to
+  gzip-compressed JSONL files (response bodies inlined), drops them, and then deletes
+  responses no remaining log references. Expired rows that landed in the DEFAULT partition
+  are exported and deleted the same way, since that partition is never dropped.
+"""
+import os
+import re
+import json
+import gzip
+from datetime import date, datetime
+
+from app.database import get_db_connection, release_db_connection
+from app.storage_backend import storage, QUERY_LOG_RETENTION_MONTHS
+
+QUERY_LOG_PARTITIONS_AHEAD = int(os.getenv("QUERY_LOG_PARTITIONS_AHEAD", "2"))
+QUERY_LOG_ARCHIVE_DIR = os.getenv("QUERY_LOG_ARCHIVE_DIR", "archives/query_logs")
+ARCHIVE_FETCH_SIZE = 1000
+
+PARTITION_NAME_PATTERN = re.compile(r"^query_logs_(\d{4})_(\d{2})$")
+DEFAULT_PARTITION = "query_logs_default"
+ARCHIVE_COLUMNS = ("id", "user_id", "query", "plan", "created_at", "archetype", "response_hash", "response")
+
+
+def _add_months(month_start, months):
+    month_index = month_start.year * 12 + month_start.month - 1 + months
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+
+def partition_name(month_start):
+    return f"query_logs_{month_start:%Y_%m}"
+
+
+def list_query_log_partitions(cursor):
+    """Returns {month_start: partition name} for every monthly partition of query_logs."""
+    cursor.execute("""
+        SELECT child.relname
+        FROM pg_inherits
+        JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        WHERE parent.relname = 'query_logs';
+    """)
+    partitions = {}
+    for (name,) in cursor.fetchall():
+        match = PARTITION_NAME_PATTERN.match(name)
+        if match:
+            partitions[date(int(match.group(1)), int(match.group(2)), 1)] = name
+    return partitions
+
+
+def ensure_query_log_partitions(months_ahead=QUERY_LOG_PARTITIONS_AHEAD):
+    """Creates the partitions for the current month and the next `months_ahead` months."""
+    if storage.name != "postgres":
+        return []  # ✅ Partitioning is Postgres-only
+    conn = get_db_connection()
+    if not conn:
+        return []
+
+    cursor = None
+    created = []
+    try:
+        cursor = conn.cursor()
+        existing = list_query_log_partitions(cursor)
+        this_month = date.today().replace(day=1)
+        for offset in range(months_ahead + 1):
+            month_start = _add_months(this_month, offset)
+            if month_start in existing:
+                continue
+            cursor.execute(
+                f"CREATE TABLE IF NOT EXISTS {partition_name(month_start)} PARTITION OF query_logs "
+                "FOR VALUES FROM (%s) TO (%s);",
+                (month_start, _add_months(month_start, 1)),
+            )
+            created.append(partition_name(month_start))
+        if created:
+            print(f"✅ Created query_logs partitions: {', '.join(created)}")
+        return created
+    except Exception as e:
+        print(f"❌ Failed to create query_logs partitions: {e}")
+        return created
+    finally:
+        if cursor:
+            cursor.close()
+        release_db_connection(conn)
+
+
+def _export_partition(conn, name, archive_path, before=None):
+    """
+    Streams a partition (only rows created before `before`, if given) into a gzip JSONL file,
+    written to a temp file and then renamed. Returns the row count.
+    """
+    os.makedirs(os.path.dirname(archive_path) or ".", exist_ok=True)
+    temp_path = archive_path + ".tmp"
+    rows = 0
+
+    conn.autocommit = False  # ✅ Named (server-side) cursors need a transaction
+    try:
+        with conn.cursor(name=f"archive_{name}") as cursor:
+            cursor.itersize = ARCHIVE_FETCH_SIZE
+            cursor.execute(f"""
+                SELECT ql.id, ql.user_id, ql.query, ql.plan, ql.created_at, ql.archetype, ql.response_hash, r.body
+                FROM {name} ql
+                LEFT JOIN responses r ON r.hash = ql.response_hash
+                {"WHERE ql.created_at < %s" if before else ""}
+                ORDER BY ql.created_at, ql.id;
+            """, (before,) if before else None)
+            with gzip.open(temp_path, "wt", encoding="utf-8") as archive_file:
+                for row in cursor:
+                    record = dict(zip(ARCHIVE_COLUMNS, row))
+                    record["created_at"] = record["created_at"].isoformat()
+                    archive_file.write(json.dumps(record) + "\n")
+                    rows += 1
+        conn.commit()
+    finally:
+        if not conn.closed:
+            conn.rollback()
+            conn.autocommit = True
+
+    with open(temp_path, "rb") as archive_file:
+        os.fsync(archive_file.fileno())  # ✅ The archive must be durable before the partition is dropped
+    os.replace(temp_path, archive_path)
+    return rows
+
+
+def _delete_orphaned_responses(conn, cutoff):
+    """Deletes responses first stored before `cutoff` that no log references any more."""
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                DELETE FROM responses r
+                WHERE r.created_at < %s
+                  AND NOT EXISTS (SELECT 1 FROM query_logs ql WHERE ql.response_hash = r.hash);
+            """, (cutoff,))
+            print(f"✅ Deleted {cursor.rowcount} orphaned responses.")
+    except Exception as e:
+        print(f"❌ Failed to delete orphaned responses: {e}")
+
+
+def _archive_default_partition(conn, cutoff, archive_dir):
+    """
+    Exports and deletes rows of the DEFAULT partition created before `cutoff`. Rows only land
+    there when a month had no partition, so a non-empty DEFAULT partition is logged.
+    Returns the number of rows archived.
+    """
+    with conn.cursor() as cursor:
+        cursor.execute(f"SELECT COUNT(*), COUNT(*) FILTER (WHERE created_at < %s) FROM {DEFAULT_PARTITION};",
+                       (cutoff,))
+        total, expired = cursor.fetchone()
+    if not total:
+        return 0
+    print(f"⚠️ {DEFAULT_PARTITION} holds {total} rows ({expired} past retention); "
+          "check that ensure_query_log_partitions runs ahead of time.")
+    if not expired:
+        return 0
+
+    archive_path = os.path.join(archive_dir, f"{DEFAULT_PARTITION}_{datetime.now():%Y_%m_%d_%H%M%S}.jsonl.gz")
+    rows = _export_partition(conn, DEFAULT_PARTITION, archive_path, before=cutoff)
+    with conn.cursor() as cursor:
+        # ✅ New rows are timestamped now, so nothing older than the cutoff arrives after the export
+        cursor.execute(f"DELETE FROM {DEFAULT_PARTITION} WHERE created_at < %s;", (cutoff,))
+    print(f"✅ Archived {rows} expired rows from {DEFAULT_PARTITION} to {archive_path}")
+    return rows
+
+
+def archive_expired_partitions(retention_months=QUERY_LOG_RETENTION_MONTHS, archive_dir=QUERY_LOG_ARCHIVE_DIR):
+    """
+    Exports every monthly partition that ended more than `retention_months` ago to
+    `<archive_dir>/query_logs_YYYY_MM.jsonl.gz`, then detaches and drops it. Expired rows of the
+    DEFAULT partition are exported to `<archive_dir>/query_logs_default_<timestamp>.jsonl.gz` and deleted.
+    Returns the list of archived partition names.
+    """
+    conn = get_db_connection()
+    if not conn:
+        return []
+
+    cutoff = _add_months(date.today().replace(day=1), -retention_months)
+    archived = []
+    try:
+        with conn.cursor() as cursor:
+            partitions = list_query_log_partitions(cursor)
+
+        for month_start, name in sorted(partitions.items()):
+            if _add_months(month_start, 1) > cutoff:
+                continue
+            archive_path = os.path.join(archive_dir, f"{name}.jsonl.gz")
+            try:
+                rows = _export_partition(conn, name, archive_path)
+                with conn.cursor() as cursor:
+                    cursor.execute(f"ALTER TABLE query_logs DETACH PARTITION {name};")
+                    cursor.execute(f"DROP TABLE {name};")
+                archived.append(name)
+                print(f"✅ Archived {rows} rows from {name} to {archive_path}")
+            except Exception as e:
+                print(f"❌ Failed to archive {name}: {e}")  # ✅ Partition is kept; retried on the next run
+
+        try:
+            if _archive_default_partition(conn, cutoff, archive_dir):
+                archived.append(DEFAULT_PARTITION)
+        except Exception as e:
+            print(f"❌ Failed to archive expired rows of {DEFAULT_PARTITION}: {e}")  # ✅ Retried on the next run
+
+        if archived:
+            _delete_orphaned_responses(conn, cutoff)
+        return archived
+    finally:
+        release_db_connection(conn)
+
+
+def run_query_log_maintenance():
+    """Daily job: pre-create upcoming partitions, then archive expired ones (Postgres only)."""
+    if storage.name != "postgres":
+        return
+    ensure_query_log_partitions()
+    archive_expired_partitions()
@@ -0,0 +1,275 @@
+import os
+import re
+import json
+import time
+import random
+import hashlib
+import threading
+from collections import OrderedDict
+
+from app.cache_keys import normalize_query
+from app.cache_manager import redis_client, scan_key_batches, get_cached_response, query_cache_key
+
+# ✅ Near-duplicate queries at or above this Jaccard similarity reuse an existing cached report.
+# 0.75 lets "customer retention strategies for SaaS" reuse "SaaS retention strategy"; queries that
+# differ by a number or a named entity never match, whatever their score.
+SIMILARITY_THRESHOLD = float(os.getenv("QUERY_SIMILARITY_THRESHOLD", "0.75"))
+# ✅ Below this many content words a similarity score cannot tell "same question" apart
+SIMILARITY_MIN_TOKENS = int(os.getenv("QUERY_SIMILARITY_MIN_TOKENS", "3"))
+SIMILARITY_MAX_ENTRIES = int(os.getenv("QUERY_SIMILARITY_MAX_ENTRIES", "20000"))
+SIMILARITY_ENABLED = os.getenv("QUERY_SIMILARITY_ENABLED", "true").lower() == "true"
+# ✅ Redis sorted set per request context: [original query, cache key] scored by when it was cached.
+# Replaces the unbounded `query_index:*` hashes, which are left to expire.
+QUERY_INDEX_PREFIX = "similar_queries"
+
+# ✅ MinHash LSH parameters: 16 bands of 2 rows catch candidates down to ~25% similarity,
+# every candidate is then verified with an exact Jaccard score.
+MINHASH_PERMUTATIONS = 32
+LSH_BANDS = 16
+LSH_ROWS = MINHASH_PERMUTATIONS // LSH_BANDS
+_MERSENNE_PRIME = (1 << 61) - 1
+_rng = random.Random(1337)  # ✅ Fixed seed keeps signatures stable across restarts
+_PERMUTATIONS = [(_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME))
+                 for _ in range(MINHASH_PERMUTATIONS)]
+
+STOP_WORDS = {
+    "a", "an", "the", "for", "of", "to", "in", "on", "and", "or", "with", "my", "our", "your", "is", "are",
+    "what", "which", "how", "do", "does", "can", "should", "i", "we", "best", "some", "me", "about",
+}
+
+
+def _stem(word):
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"  # ✅ strategies -> strategy
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]  # ✅ customers -> customer
+    return word
+
+
+def tokenize_query(query):
+    """Turns a query into a set of lightly stemmed content words."""
+    return frozenset(_stem(word) for word in normalize_query(query).split() if word not in STOP_WORDS)
+
+
+def entity_tokens(query):
+    """
+    Stemmed tokens of `query` that name something specific: numbers, acronyms and capitalized
+    words after the first. Needs the original casing, so pass the query as the user typed it.
+    """
+    entities = set()
+    for position, word in enumerate(re.findall(r"[\w£$€%]+", query or "")):
+        lowered = word.lower()
+        if lowered in STOP_WORDS:
+            continue
+        if any(char.isdigit() for char in word) or (len(word) > 1 and word.isupper()) \
+                or (position > 0 and word[0].isupper()):
+            entities.add(_stem(lowered))
+    return frozenset(entities)
+
+
+def is_distinctive_difference(first, second, first_entities, second_entities):
+    """True if the words two queries do not share include a number or an entity-like word."""
+    difference = first ^ second
+    return any(any(char.isdigit() for char in token) for token in difference) \
+        or bool(difference & (first_entities | second_entities))
+
+
+def _token_hash(token):
+    return int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def minhash_signature(tokens):
+    """Computes a MinHash signature of a token set."""
+    hashes = [_token_hash(token) for token in tokens]
+    return tuple(min((a * h + b) % _MERSENNE_PRIME for h in hashes) for a, b in _PERMUTATIONS)
+
+
+def jaccard_similarity(first, second):
+    """Exact Jaccard similarity of two token sets."""
+    if not first or not second:
+        return 0.0
+    return len(first & second) / len(first | second)
+
+
+class QuerySimilarityIndex:
+    """Bounded in-memory MinHash LSH index of cached queries, partitioned by request context."""
+
+    def __init__(self, max_entries=SIMILARITY_MAX_ENTRIES, threshold=SIMILARITY_THRESHOLD):
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self._entries = OrderedDict()  # (context, normalized query) -> (tokens, entities, cache key, band keys)
+        self._buckets = {}  # (context, band, band hash) -> set of entry ids
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, context, query, cache_key):
+        """Indexes a cached query, evicting the least recently used entries beyond `max_entries`."""
+        tokens = tokenize_query(query)
+        if len(tokens) < SIMILARITY_MIN_TOKENS:
+            return
+        entry_id = (context, normalize_query(query))
+        band_keys = self._band_keys(context, minhash_signature(tokens))
+
+        with self._lock:
+            if entry_id in self._entries:
+                self._remove(entry_id)
+            self._entries[entry_id] = (tokens, entity_tokens(query), cache_key, band_keys)
+            for band_key in band_keys:
+                self._buckets.setdefault(band_key, set()).add(entry_id)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def find(self, context, query):
+        """
+        Returns (cache_key, similarity) of the closest indexed query above the threshold, or None.
+        Candidates that differ by a number or an entity-like word (e.g. another country) never match.
+        """
+        tokens = tokenize_query(query)
+        if len(tokens) < SIMILARITY_MIN_TOKENS:
+            return None
+        entities = entity_tokens(query)
+        band_keys = self._band_keys(context, minhash_signature(tokens))
+
+        with self._lock:
+            candidates = set()
+            for band_key in band_keys:
+                candidates |= self._buckets.get(band_key, set())
+
+            best = None
+            for entry_id in candidates:
+                candidate_tokens, candidate_entities, cache_key, _ = self._entries[entry_id]
+                score = jaccard_similarity(tokens, candidate_tokens)
+                if score < self.threshold or (best is not None and score <= best[2]):
+                    continue
+                if not is_distinctive_difference(tokens, candidate_tokens, entities, candidate_entities):
+                    best = (entry_id, cache_key, score)
+
+            if best is None:
+                return None
+            self._entries.move_to_end(best[0])  # ✅ Popular entries survive eviction
+            return best[1], best[2]
+
+    def remove(self, context, query):
+        """Drops an entry, e.g. once its cached report has expired."""
+        with self._lock:
+            entry_id = (context, normalize_query(query))
+            if entry_id in self._entries:
+                self._remove(entry_id)
+
+    def remove_cache_key(self, context, cache_key):
+        """Drops every entry of a context pointing at `cache_key`."""
+        with self._lock:
+            stale = [entry_id for entry_id, entry in self._entries.items()
+                     if entry_id[0] == context and entry[2] == cache_key]
+            for entry_id in stale:
+                self._remove(entry_id)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._buckets.clear()
+
+    @staticmethod
+    def _band_keys(context, signature):
+        return [(context, band, signature[band * LSH_ROWS:(band + 1) * LSH_ROWS]) for band in range(LSH_BANDS)]
+
+    def _remove(self, entry_id):
+        band_keys = self._entries.pop(entry_id)[3]
+        for band_key in band_keys:
+            bucket = self._buckets.get(band_key)
+            if bucket is not None:
+                bucket.discard(entry_id)
+                if not bucket:
+                    del self._buckets[band_key]
+
+
+similarity_index = QuerySimilarityIndex()
+_index_loaded = False
+_index_load_lock = threading.Lock()
+
+
+def rebuild_similarity_index():
+    """
+    Reloads the in-memory index from the `similar_queries:*` sorted sets in Redis, oldest first,
+    pruning members whose cached report has already expired.
+    """
+    global _index_loaded
+    similarity_index.clear()
+    loaded = pruned = 0
+    for keys in scan_key_batches(f"{QUERY_INDEX_PREFIX}:*"):
+        pipe = redis_client.pipeline(transaction=False)
+        for key in keys:
+            pipe.zrange(key, 0, -1)
+        for key, members in zip(keys, pipe.execute()):
+            context = key.split(":", 1)[1]
+            entries, expired = [], []
+            for member in members:
+                try:
+                    query, cache_key = json.loads(member)
+                    entries.append((member, query, cache_key))
+                except (ValueError, TypeError):
+                    expired.append(member)
+
+            pipe = redis_client.pipeline(transaction=False)
+            for _, _, cache_key in entries:
+                pipe.exists(query_cache_key(cache_key))
+            for (member, query, cache_key), exists in zip(entries, pipe.execute()):
+                if not exists:
+                    expired.append(member)
+                    continue
+                similarity_index.add(context, query, cache_key)
+                loaded += 1
+            if expired:
+                redis_client.zrem(key, *expired)
+                pruned += len(expired)
+    _index_loaded = True
+    print(f"✅ Query similarity index rebuilt with {loaded} entries ({pruned} expired entries pruned).")
+    return loaded
+
+
+def _ensure_index_loaded():
+    with _index_load_lock:
+        if not _index_loaded:
+            try:
+                rebuild_similarity_index()
+            except Exception as e:
+                print(f"⚠️ Could not rebuild query similarity index: {e}")
+
+
+def register_cached_query(context, query, cache_key, expiration=86400):
+    """Records a freshly cached query so near-duplicates can reuse its report."""
+    if not SIMILARITY_ENABLED:
+        return
+    _ensure_index_loaded()
+    similarity_index.add(context, query, cache_key)
+
+    index_key = f"{QUERY_INDEX_PREFIX}:{context}"
+    now = time.time()
+    pipe = redis_client.pipeline(transaction=False)
+    # ✅ Original casing, needed by `entity_tokens` after a rebuild
+    pipe.zadd(index_key, {json.dumps([query, cache_key]): now})
+    pipe.zremrangebyscore(index_key, "-inf", now - expiration)  # ✅ Their reports have expired too
+    pipe.zremrangebyrank(index_key, 0, -(SIMILARITY_MAX_ENTRIES + 1))  # ✅ Keep only the newest entries
+    pipe.expire(index_key, expiration)
+    pipe.execute()
+
+
+def find_similar_cached_response(context, query):
+    """Returns a cached report for a near-duplicate query in the same context, or an empty string."""
+    if not SIMILARITY_ENABLED:
+        return ""
+    _ensure_index_loaded()
+    match = similarity_index.find(context, query)
+    if match is None:
+        return ""
+
+    cache_key, score = match
+    cached_response = get_cached_response(cache_key)
+    if not cached_response:
+        similarity_index.remove_cache_key(context, cache_key)  # ✅ Report expired, forget the entry
+        return ""
+
+    print(f"♻️ Reusing cached report for similar query (similarity {score:.2f}): {query}")
+    return cached_response
@@ -0,0 +1,270 @@
+"""
+Write-behind buffer for query_logs (plus their deduplicated responses) and user_feedback inserts.
+
+Request handlers only enqueue rows; a background thread flushes them in batches with
+multi-row INSERTs once WRITE_BEHIND_BATCH_SIZE rows are pending or every
+WRITE_BEHIND_FLUSH_INTERVAL seconds. Batches that cannot be written are appended to a
+bounded JSONL spill file and replayed on a later flush (at-least-once delivery).
+Pending rows are flushed on interpreter shutdown.
+"""
+import os
+import glob
+import json
+import uuid
+import atexit
+import threading
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # ✅ Windows: claims and appends rely on the atomic rename alone
+
+from app.database import response_hash
+from app.storage_backend import storage
+
+WRITE_BEHIND_BATCH_SIZE = int(os.getenv("WRITE_BEHIND_BATCH_SIZE", "100"))
+WRITE_BEHIND_FLUSH_INTERVAL = float(os.getenv("WRITE_BEHIND_FLUSH_INTERVAL", "2"))
+WRITE_BEHIND_MAX_PENDING = int(os.getenv("WRITE_BEHIND_MAX_PENDING", "10000"))  # ✅ Beyond this, rows go to the spill file
+WRITE_BEHIND_SPILL_PATH = os.getenv("WRITE_BEHIND_SPILL_PATH", "logs/write_behind_spill.jsonl")
+WRITE_BEHIND_SPILL_MAX_BYTES = int(os.getenv("WRITE_BEHIND_SPILL_MAX_BYTES", str(50 * 1024 * 1024)))
+
+# ✅ Table -> columns accepted by the buffer (rows are tuples in this order).
+# Tables are flushed in this order, so a response row always exists before a log references it.
+TABLE_COLUMNS = {
+    "responses": ("hash", "body", "size_bytes"),
+    "query_logs": ("user_id", "query", "archetype", "response_hash", "plan", "created_at"),
+    "user_feedback": ("user_id", "query", "feedback_text", "created_at"),
+}
+
+# ✅ Responses are content-addressed: a duplicate costs one index probe, not another TOAST write
+ON_CONFLICT = {
+    "responses": " ON CONFLICT (hash) DO NOTHING",
+}
+
+
+class WriteBehindBuffer:
+    """Thread-safe in-process buffer that batches inserts into Postgres."""
+
+    def __init__(self, batch_size=WRITE_BEHIND_BATCH_SIZE, flush_interval=WRITE_BEHIND_FLUSH_INTERVAL,
+                 max_pending=WRITE_BEHIND_MAX_PENDING, spill_path=WRITE_BEHIND_SPILL_PATH,
+                 spill_max_bytes=WRITE_BEHIND_SPILL_MAX_BYTES):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.spill_path = spill_path
+        self.spill_max_bytes = spill_max_bytes
+
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()  # ✅ One flush at a time (background thread vs shutdown)
+        self._pending = []  # (table, row)
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Starts the background flusher (idempotent)."""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopped.clear()
+                self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+                self._thread.start()
+
+    def enqueue(self, table, row):
+        """Queues one row for `table`; never touches the database on the caller's thread."""
+        self.enqueue_many([(table, row)])
+
+    def enqueue_many(self, entries):
+        """Queues (table, row) pairs together, so they always land in the same batch."""
+        for table, _ in entries:
+            if table not in TABLE_COLUMNS:
+                raise ValueError(f"Unsupported write-behind table: {table}")
+        if self._thread is None:
+            self.start()
+
+        with self._lock:
+            if len(self._pending) + len(entries) > self.max_pending:
+                overflow = True
+            else:
+                overflow = False
+                self._pending.extend(entries)
+                if len(self._pending) >= self.batch_size:
+                    self._wakeup.set()
+
+        if overflow:
+            self._spill(entries)  # ✅ Database is falling behind; keep the rows on disk instead
+
+    def pending_count(self):
+        with self._lock:
+            return len(self._pending)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def flush(self):
+        """Writes all pending rows (and any spilled rows) to the database. Returns the number written."""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+
+            written = self._replay_spill()
+            if batch:
+                if self._write(batch):
+                    written += len(batch)
+                else:
+                    self._spill(batch)
+            return written
+
+    def shutdown(self):
+        """Stops the flusher and writes out everything still buffered."""
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_interval + 5)
+        self.flush()
+
+    def _write(self, batch):
+        """Inserts `batch` with one multi-row INSERT per table in a single transaction."""
+        by_table = {}
+        for table, row in batch:
+            by_table.setdefault(table, []).append(tuple(row))
+        if "responses" in by_table:
+            by_table["responses"] = list({row[0]: row for row in by_table["responses"]}.values())
+
+        try:
+            storage.insert_rows({
+                table: (columns, by_table.get(table), ON_CONFLICT.get(table, ""))
+                for table, columns in TABLE_COLUMNS.items()
+            })
+            return True
+        except Exception as e:
+            print(f"❌ Write-behind flush failed ({len(batch)} rows): {e}")
+            return False
+
+    def _spill_files(self):
+        """Replay files left by any worker (including crashed or restarted ones), then the spill file."""
+        return sorted(glob.glob(glob.escape(self.spill_path) + ".*.replay")) + [self.spill_path]
+
+    def _spill_bytes(self):
+        total = 0
+        for path in self._spill_files():
+            try:
+                total += os.path.getsize(path)
+            except OSError:
+                pass  # ✅ Claimed or removed meanwhile
+        return total
+
+    def _spill(self, batch):
+        """Appends rows to the spill file unless the spill (including unreplayed claims) has reached its size bound."""
+        try:
+            directory = os.path.dirname(self.spill_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            if self._spill_bytes() >= self.spill_max_bytes:
+                print(f"⚠️ Write-behind spill file full, dropping {len(batch)} rows.")
+                return
+            with self._open_spill_for_append() as spill_file:
+                for table, row in batch:
+                    spill_file.write(json.dumps({"table": table, "row": list(row)}) + "\n")
+                spill_file.flush()
+                os.fsync(spill_file.fileno())
+        except OSError as e:
+            print(f"❌ Failed to spill {len(batch)} rows to {self.spill_path}: {e}")
+
+    def _open_spill_for_append(self):
+        """
+        Opens the spill file for appending under the same exclusive lock `_claim` takes, so rows are
+        never appended to a file a replay has already read. If the file was claimed (renamed) while we
+        waited for the lock, appends go to a fresh spill file instead.
+        """
+        while True:
+            spill_file = open(self.spill_path, "a", encoding="utf-8")
+            if fcntl is None:
+                return spill_file
+            try:
+                fcntl.flock(spill_file.fileno(), fcntl.LOCK_EX)  # ✅ Released on close
+                if os.stat(self.spill_path).st_ino == os.fstat(spill_file.fileno()).st_ino:
+                    return spill_file
+            except FileNotFoundError:
+                pass  # ✅ Renamed away and no new spill file yet
+            except OSError:
+                spill_file.close()
+                raise
+            spill_file.close()
+
+    def _claim(self, path):
+        """
+        Takes over `path` by locking it and renaming it to a name unique to this claim.
+        Returns (claimed path, open locked file) or None if the file is gone or another worker holds it.
+        """
+        try:
+            spill_file = open(path, encoding="utf-8")
+        except OSError:
+            return None
+        try:
+            if fcntl is not None:
+                fcntl.flock(spill_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)  # ✅ Released if this process dies
+            if os.stat(path).st_ino != os.fstat(spill_file.fileno()).st_ino:
+                raise OSError("claimed by another worker")  # ✅ Renamed away between open and lock
+            claimed_path = f"{self.spill_path}.{os.getpid()}.{uuid.uuid4().hex[:8]}.replay"
+            os.rename(path, claimed_path)
+            return claimed_path, spill_file
+        except OSError:
+            spill_file.close()
+            return None
+
+    def _replay_spill(self):
+        """
+        Re-inserts spilled rows, including batches claimed by workers that died or restarted
+        before replaying them. A file is only removed once its rows are committed.
+        """
+        replayed = 0
+        for path in self._spill_files():
+            if not os.path.exists(path):
+                continue
+            claim = self._claim(path)
+            if claim is None:
+                continue
+            claimed_path, spill_file = claim
+            try:
+                batch = []
+                for line in spill_file:
+                    try:
+                        entry = json.loads(line)
+                        batch.append((entry["table"], entry["row"]))
+                    except (json.JSONDecodeError, KeyError):
+                        continue  # ✅ Torn last line from a crash mid-write
+
+                if batch and not self._write(batch):
+                    break  # ✅ Keep the replay file; the next flush (of any worker) retries it
+                os.remove(claimed_path)
+                replayed += len(batch)
+            finally:
+                spill_file.close()
+
+        if replayed:
+            print(f"✅ Replayed {replayed} spilled log rows.")
+        return replayed
+
+
+write_behind = WriteBehindBuffer()
+atexit.register(write_behind.shutdown)  # ✅ Graceful shutdown drains the buffer
+
+
+def enqueue_query_log(user_id, query, response, plan, archetype=None):
+    """Buffers a query_logs row and its content-addressed response (timestamped now, not at flush time)."""
+    entries = []
+    body_hash = None
+    if response:
+        body_hash = response_hash(response)
+        entries.append(("responses", (body_hash, response, len(response.encode("utf-8")))))
+    entries.append(("query_logs", (user_id, query, archetype, body_hash, plan, datetime.now().isoformat(sep=" "))))
+    write_behind.enqueue_many(entries)
+
+
+def enqueue_user_feedback(user_id, query, feedback_text):
+    """Buffers a user_feedback row (timestamped now, not at flush time)."""
+    write_behind.enqueue("user_feedback", (user_id, query, feedback_text, datetime.now().isoformat(sep=" ")))
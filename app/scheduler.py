@@ -2,6 +2,8 @@ import schedule
 import time
 from app.cache_manager import get_frequent_queries, cache_response, get_cached_response  # ✅ Add get_cached_response
 from app.user_queries import generate_response
+from app.query_log_partitions import run_query_log_maintenance
+from app.usage_rollup import rollup_usage_periods
 
 def batch_cache_frequent_queries():
     """Caches responses for the most frequently asked queries to reduce API load."""
@@ -18,9 +20,11 @@ def batch_cache_frequent_queries():
     print(f"✅ Batch cache updated. Cached Queries: {', '.join(cached_queries) if cached_queries else 'None'}")
 
 def start_scheduler():
-    """Starts the scheduler to run batch cache updates daily at 3 AM."""
+    """Starts the scheduler: batch cache updates (3 AM), query_logs maintenance (4 AM), hourly usage rollup."""
     print("✅ Scheduler started. Running batch cache updates daily at 3 AM.")
     schedule.every().day.at("03:00").do(batch_cache_frequent_queries)
+    schedule.every().day.at("04:00").do(run_query_log_maintenance)  # ✅ New partitions + retention archival
+    schedule.every().hour.do(rollup_usage_periods)  # ✅ Usage counters -> usage_periods billing history
 
     while True:
         schedule.run_pending()
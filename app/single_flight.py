@@ -0,0 +1,197 @@
+import os
+import json
+import time
+import uuid
+import threading
+import redis
+
+from app.cache_manager import redis_client
+from app.cache_backend import register_script_fallback
+
+# ✅ The leader renews its lock while computing; a crashed worker's lock expires after this many seconds
+SINGLE_FLIGHT_LOCK_TIMEOUT = int(os.getenv("SINGLE_FLIGHT_LOCK_TIMEOUT", "60"))
+# ✅ How long followers wait for a live leader before computing the result themselves. Kept short on
+# purpose: a leader stuck in retries should cost one duplicate LLM call, not park every follower with it.
+SINGLE_FLIGHT_WAIT_TIMEOUT = float(os.getenv("SINGLE_FLIGHT_WAIT_TIMEOUT", "180"))
+SINGLE_FLIGHT_POLL_INTERVAL = float(os.getenv("SINGLE_FLIGHT_POLL_INTERVAL", "0.5"))
+SINGLE_FLIGHT_RESULT_TTL = 120  # ✅ Result is only kept long enough for waiting followers to pick it up
+
+# ✅ Only the lock owner may release it (the lock may have expired and been re-acquired meanwhile)
+RELEASE_LOCK_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+# ✅ Only the lock owner may extend it
+EXTEND_LOCK_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('EXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+
+def _release_lock_fallback(client, keys, args):
+    """Python version of RELEASE_LOCK_LUA for backends without a Lua engine."""
+    if client.get(keys[0]) == args[0]:
+        return client.delete(keys[0])
+    return 0
+
+
+def _extend_lock_fallback(client, keys, args):
+    """Python version of EXTEND_LOCK_LUA for backends without a Lua engine."""
+    if client.get(keys[0]) == args[0]:
+        return int(client.expire(keys[0], int(args[1])))
+    return 0
+
+
+register_script_fallback(RELEASE_LOCK_LUA, _release_lock_fallback)
+register_script_fallback(EXTEND_LOCK_LUA, _extend_lock_fallback)
+_release_lock_script = redis_client.register_script(RELEASE_LOCK_LUA)
+_extend_lock_script = redis_client.register_script(EXTEND_LOCK_LUA)
+
+
+def _lock_key(key):
+    return f"single_flight_lock:{key}"
+
+
+def _result_key(key):
+    return f"single_flight_result:{key}"
+
+
+def _try_acquire_lock(key, token, lock_timeout):
+    """Returns True/False for lock acquisition, or None when Redis is unreachable."""
+    try:
+        return bool(redis_client.set(_lock_key(key), token, nx=True, ex=lock_timeout))
+    except redis.RedisError as e:
+        print(f"⚠️ Single-flight lock unavailable for {key}: {e}")
+        return None
+
+
+def _release_lock(key, token):
+    try:
+        _release_lock_script(keys=[_lock_key(key)], args=[token])
+    except redis.RedisError as e:
+        print(f"⚠️ Failed to release single-flight lock for {key}: {e}")  # ✅ Lock TTL cleans it up
+
+
+class _LockKeeper:
+    """Renews the leader's lock every third of its timeout until stopped, so long LLM calls keep it."""
+
+    def __init__(self, key, token, lock_timeout):
+        self.key, self.token, self.lock_timeout = key, token, lock_timeout
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stopped.set()
+
+    def _run(self):
+        while not self._stopped.wait(self.lock_timeout / 3):
+            try:
+                if not _extend_lock_script(keys=[_lock_key(self.key)], args=[self.token, self.lock_timeout]):
+                    print(f"⚠️ Single-flight lock for {self.key} was lost; followers may compute it too.")
+                    return
+            except redis.RedisError as e:
+                print(f"⚠️ Failed to extend single-flight lock for {self.key}: {e}")
+
+
+def _publish_result(key, result):
+    """Hands the leader's result to waiting followers."""
+    payload = json.dumps({"value": result})
+    try:
+        redis_client.setex(_result_key(key), SINGLE_FLIGHT_RESULT_TTL, payload)
+    except redis.RedisError as e:
+        print(f"⚠️ Failed to publish single-flight result for {key}: {e}")
+
+
+def _read_result(key):
+    try:
+        payload = redis_client.get(_result_key(key))
+    except redis.RedisError:
+        return None
+    if payload is None:
+        return None
+    data = json.loads(payload)
+    return data["value"]
+
+
+def single_flight(key, compute, lock_timeout=SINGLE_FLIGHT_LOCK_TIMEOUT, wait_timeout=SINGLE_FLIGHT_WAIT_TIMEOUT):
+    """
+    Runs `compute()` at most once at a time per `key` across all workers.
+    The first caller computes (renewing its lock meanwhile); concurrent callers wait and receive the same
+    result. If the leader's lock lapses without a result (crash, lost lock) a follower takes over as the
+    new leader; if the wait times out, the follower computes it directly.
+    """
+    token = uuid.uuid4().hex
+    deadline = time.monotonic() + wait_timeout
+
+    while True:
+        result = _read_result(key)
+        if result is not None:
+            return result  # ✅ A leader already finished this exact request
+
+        acquired = _try_acquire_lock(key, token, lock_timeout)
+        if acquired is None:
+            return compute()  # ✅ Redis outage must not take LLM features down with it
+
+        if acquired:
+            try:
+                with _LockKeeper(key, token, lock_timeout):
+                    result = compute()
+                _publish_result(key, result)
+                return result
+            finally:
+                _release_lock(key, token)
+
+        if time.monotonic() >= deadline:
+            print(f"⚠️ Single-flight wait timed out for {key}, computing directly.")
+            return compute()
+
+        time.sleep(SINGLE_FLIGHT_POLL_INTERVAL)
+
+
+def single_flight_stream(key, stream, lock_timeout=SINGLE_FLIGHT_LOCK_TIMEOUT, wait_timeout=SINGLE_FLIGHT_WAIT_TIMEOUT):
+    """
+    Streaming variant of `single_flight` for text generators.
+    The leader yields the chunks of `stream()` as they arrive and publishes the joined text when it ends;
+    concurrent callers wait and yield that text in one piece. An abandoned stream publishes nothing.
+    """
+    token = uuid.uuid4().hex
+    deadline = time.monotonic() + wait_timeout
+
+    while True:
+        result = _read_result(key)
+        if result is not None:
+            yield result
+            return
+
+        acquired = _try_acquire_lock(key, token, lock_timeout)
+        if acquired is None:
+            yield from stream()  # ✅ Redis outage must not take LLM features down with it
+            return
+
+        if acquired:
+            try:
+                chunks = []
+                with _LockKeeper(key, token, lock_timeout):
+                    for chunk in stream():
+                        chunks.append(chunk)
+                        yield chunk
+                _publish_result(key, "".join(chunks))
+            finally:
+                _release_lock(key, token)
+            return
+
+        if time.monotonic() >= deadline:
+            print(f"⚠️ Single-flight wait timed out for {key}, streaming directly.")
+            yield from stream()
+            return
+
+        time.sleep(SINGLE_FLIGHT_POLL_INTERVAL)
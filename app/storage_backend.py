@@ -0,0 +1,395 @@
+"""
+Repository layer for all relational persistence.
+
+`storage` exposes the data operations the app needs (query logs, feedback, users, one-time
+access, reports, usage history) on top of one of two backends with the same schema and
+migrations (see app/migrations.py):
+
+- "postgres" (default): the pooled psycopg2 connection from app/database.py.
+- "sqlite": an embedded database file at SQLITE_PATH, so the full query flow runs (and can be
+  benchmarked) on a single machine with no external database.
+
+SQL is written once with `%s` placeholders; backends supply the few dialect-specific pieces.
+"""
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime
+
+# ✅ Backend selection: "postgres" (default) or "sqlite" (embedded, no server needed)
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "postgres").lower()
+SQLITE_PATH = os.getenv("SQLITE_PATH", "data/stratogenic.db")
+SQLITE_BUSY_TIMEOUT = float(os.getenv("SQLITE_BUSY_TIMEOUT", "30"))
+
+HISTORY_PREVIEW_LENGTH = 120
+# ✅ Older query_logs partitions are archived (app/query_log_partitions.py), so history never reads past them
+QUERY_LOG_RETENTION_MONTHS = int(os.getenv("QUERY_LOG_RETENTION_MONTHS", "12"))
+
+
+def history_window_start(retention_months=QUERY_LOG_RETENTION_MONTHS, today=None):
+    """
+    Start of the oldest retained query_logs month. History queries filter on `created_at >=` this,
+    so Postgres prunes every older partition (and the DEFAULT one) instead of probing each index.
+    """
+    today = today or date.today()
+    month_index = today.year * 12 + today.month - 1 - retention_months
+    return datetime(month_index // 12, month_index % 12 + 1, 1)
+
+
+class StorageUnavailableError(Exception):
+    """Raised when the backend cannot hand out a connection."""
+
+
+class StorageBackend:
+    """Repository interface shared by every backend; SQL is in `%s` paramstyle."""
+
+    name = "base"
+    greatest = "GREATEST"  # ✅ Scalar max of two values
+
+    # --- Connection handling (implemented per backend) -------------------------------------
+
+    @contextmanager
+    def cursor(self):
+        """Yields a cursor in autocommit mode."""
+        raise NotImplementedError
+
+    @contextmanager
+    def transaction(self):
+        """Yields a cursor whose statements commit together (rolled back on error)."""
+        raise NotImplementedError
+
+    def lock_migrations(self, cursor):
+        """Serializes schema migrations across processes until `cursor`'s transaction ends."""
+
+    def insert_many(self, cursor, table, columns, rows, on_conflict=""):
+        """Inserts `rows` into `table` with as few round trips as the driver allows."""
+        raise NotImplementedError
+
+    def search_condition(self, search):
+        """Returns (SQL condition, params) matching history entries (`ql` joined with `r`) against `search`."""
+        raise NotImplementedError
+
+    # --- Query logs -------------------------------------------------------------------------
+
+    def insert_rows(self, rows_by_table):
+        """Writes {table: (columns, rows, on_conflict)} in one transaction, in the given order."""
+        with self.transaction() as cursor:
+            for table, (columns, rows, on_conflict) in rows_by_table.items():
+                if rows:
+                    self.insert_many(cursor, table, columns, rows, on_conflict)
+
+    def get_recent_queries_with_responses(self, user_id, limit=10):
+        with self.cursor() as cursor:
+            cursor.execute("""
+                SELECT ql.query, r.body, ql.created_at
+                FROM query_logs ql
+                LEFT JOIN responses r ON r.hash = ql.response_hash
+                WHERE ql.user_id = %s AND ql.created_at >= %s
+                ORDER BY ql.created_at DESC
+                LIMIT %s;
+            """, (user_id, history_window_start(), limit))  # ✅ Served by idx_query_logs_user_created_id
+            return cursor.fetchall()
+
+    def get_query_history(self, user_id, limit=20, before=None, search=None):
+        conditions = ["ql.user_id = %s", "ql.created_at >= %s"]
+        params = [HISTORY_PREVIEW_LENGTH, user_id, history_window_start()]
+        if before:
+            conditions.append("(ql.created_at, ql.id) < (%s, %s)")  # ✅ Keyset: cost is independent of page depth
+            params.extend(before)
+        if search and search.strip():
+            condition, search_params = self.search_condition(search.strip())
+            conditions.append(condition)
+            params.extend(search_params)
+        params.append(limit + 1)  # ✅ One extra row tells us whether another page exists
+
+        with self.cursor() as cursor:
+            cursor.execute(f"""
+                SELECT ql.id, ql.created_at, SUBSTR(ql.query, 1, %s), COALESCE(r.size_bytes, 0)
+                FROM query_logs ql
+                LEFT JOIN responses r ON r.hash = ql.response_hash
+                WHERE {" AND ".join(conditions)}
+                ORDER BY ql.created_at DESC, ql.id DESC
+                LIMIT %s;
+            """, params)
+            rows = cursor.fetchall()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = (rows[-1][1], rows[-1][0])
+        return rows, next_cursor
+
+    def get_query_log(self, user_id, log_id):
+        with self.cursor() as cursor:
+            cursor.execute("""
+                SELECT ql.query, r.body, ql.created_at
+                FROM query_logs ql
+                LEFT JOIN responses r ON r.hash = ql.response_hash
+                WHERE ql.id = %s AND ql.user_id = %s;
+            """, (log_id, user_id))
+            return cursor.fetchone()
+
+    # --- Users --------------------------------------------------------------------------------
+
+    def get_user_by_email(self, email):
+        with self.cursor() as cursor:
+            cursor.execute("SELECT id, email, plan, is_admin FROM users WHERE email = %s;", (email,))
+            return cursor.fetchone()
+
+    def get_user_credentials(self, email):
+        """Returns (id, email, password_hash, plan, is_admin) or None."""
+        with self.cursor() as cursor:
+            cursor.execute("SELECT id, email, password_hash, plan, is_admin FROM users WHERE email = %s;", (email,))
+            return cursor.fetchone()
+
+    def create_user(self, email, password_hash, plan):
+        """Inserts a user and returns its id, or None if the email is already registered."""
+        with self.transaction() as cursor:
+            cursor.execute("SELECT id FROM users WHERE email = %s;", (email,))
+            if cursor.fetchone():
+                return None
+            cursor.execute("INSERT INTO users (email, password_hash, plan) VALUES (%s, %s, %s) RETURNING id;",
+                           (email, password_hash, plan))
+            return cursor.fetchone()[0]
+
+    def update_user_plan(self, user_identifier, plan):
+        """Updates the plan by user id (int) or email; returns the ids of the updated users."""
+        column = "id" if isinstance(user_identifier, int) else "email"
+        with self.transaction() as cursor:
+            cursor.execute(f"UPDATE users SET plan = %s WHERE {column} = %s RETURNING id;", (plan, user_identifier))
+            return [row[0] for row in cursor.fetchall()]
+
+    def is_admin(self, user_id):
+        with self.cursor() as cursor:
+            cursor.execute("SELECT is_admin FROM users WHERE id = %s;", (user_id,))
+            result = cursor.fetchone()
+            return bool(result[0]) if result else False
+
+    def load_user_profile(self, user_id):
+        """Returns (plan, is_admin, one-time used, one-time follow-ups remaining) or None."""
+        with self.cursor() as cursor:
+            cursor.execute("""
+                SELECT u.plan, u.is_admin, ea.used, ea.follow_ups_remaining
+                FROM users u
+                LEFT JOIN enterprise_access ea ON ea.user_id = u.id
+                WHERE u.id = %s;
+            """, (user_id,))
+            return cursor.fetchone()
+
+    # --- One-time Enterprise access -----------------------------------------------------------
+
+    def grant_one_time_access(self, user_id, follow_ups=2):
+        with self.transaction() as cursor:
+            cursor.execute("""
+                INSERT INTO enterprise_access (user_id, used, follow_ups_remaining)
+                VALUES (%s, %s, %s)
+                ON CONFLICT (user_id) DO UPDATE SET used = FALSE, follow_ups_remaining = %s;
+            """, (user_id, False, follow_ups, follow_ups))
+
+    def use_one_time_follow_up(self, user_id):
+        with self.transaction() as cursor:
+            cursor.execute(
+                "UPDATE enterprise_access SET follow_ups_remaining = follow_ups_remaining - 1 WHERE user_id = %s;",
+                (user_id,),
+            )
+
+    # --- Feedback, reports and usage history --------------------------------------------------
+
+    def store_generated_pdf(self, user_id, pdf_filename):
+        with self.transaction() as cursor:
+            cursor.execute("""
+                INSERT INTO strategy_reports (user_id, pdf_filename, created_at)
+                VALUES (%s, %s, CURRENT_TIMESTAMP);
+            """, (user_id, pdf_filename))
+
+    def get_user_reports(self, user_id):
+        with self.cursor() as cursor:
+            cursor.execute(
+                "SELECT pdf_filename, created_at FROM strategy_reports WHERE user_id = %s ORDER BY created_at DESC;",
+                (user_id,),
+            )
+            return cursor.fetchall()
+
+    def upsert_usage_periods(self, rows):
+        """Upserts (user_id, period, kind, used) rows, keeping the highest count seen."""
+        with self.transaction() as cursor:
+            self.insert_many(
+                cursor, "usage_periods", ("user_id", "period", "kind", "used"), rows,
+                f" ON CONFLICT (user_id, period, kind) DO UPDATE SET "
+                f"used = {self.greatest}(usage_periods.used, EXCLUDED.used), updated_at = CURRENT_TIMESTAMP",
+            )
+
+
+class PostgresStorageBackend(StorageBackend):
+    """Postgres through the bounded psycopg2 pool in app/database.py."""
+
+    name = "postgres"
+
+    # ✅ Arbitrary constant so concurrent workers starting together don't migrate twice
+    MIGRATION_LOCK_ID = 720_114_001
+
+    @contextmanager
+    def _connection(self):
+        from app.database import get_db_connection, release_db_connection  # ✅ database imports this module
+        conn = get_db_connection()
+        if not conn:
+            raise StorageUnavailableError("Database connection unavailable.")
+        try:
+            yield conn
+        finally:
+            release_db_connection(conn)
+
+    @contextmanager
+    def cursor(self):
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            try:
+                yield cursor
+            finally:
+                cursor.close()
+
+    @contextmanager
+    def transaction(self):
+        with self._connection() as conn:
+            conn.autocommit = False
+            cursor = conn.cursor()
+            try:
+                yield cursor
+                conn.commit()
+            except Exception:
+                if not conn.closed:
+                    conn.rollback()
+                raise
+            finally:
+                cursor.close()
+                if not conn.closed:
+                    conn.autocommit = True
+
+    def lock_migrations(self, cursor):
+        # ✅ Transaction-scoped: released at COMMIT/ROLLBACK, so it never outlives the migration on a
+        # pooled (PgBouncer transaction mode) connection and needs no second connection
+        cursor.execute("SELECT pg_advisory_xact_lock(%s);", (self.MIGRATION_LOCK_ID,))
+
+    def insert_many(self, cursor, table, columns, rows, on_conflict=""):
+        from psycopg2.extras import execute_values
+        execute_values(cursor, f"INSERT INTO {table} ({', '.join(columns)}) VALUES %s{on_conflict}",
+                       rows, page_size=max(len(rows), 1))
+
+    def search_condition(self, search):
+        # ✅ Each side uses its own GIN index (query text on query_logs, report text on responses)
+        return """(ql.search_vector @@ websearch_to_tsquery('english', %s)
+            OR ql.response_hash IN (SELECT hash FROM responses WHERE search_vector @@ websearch_to_tsquery('english', %s)))""", \
+            [search, search]
+
+
+class _SQLiteCursor:
+    """psycopg2-style cursor over sqlite3: accepts `%s` placeholders."""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, sql, params=()):
+        self._cursor.execute(sql.replace("%s", "?"), tuple(params))
+        return self
+
+    def executemany(self, sql, rows):
+        self._cursor.executemany(sql.replace("%s", "?"), rows)
+        return self
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def close(self):
+        self._cursor.close()
+
+
+def _convert_timestamp(value):
+    return datetime.fromisoformat(value.decode("utf-8"))
+
+
+sqlite3.register_converter("TIMESTAMP", _convert_timestamp)  # ✅ Timestamps come back as datetimes, like psycopg2
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(sep=" "))
+
+
+class SQLiteStorageBackend(StorageBackend):
+    """Embedded SQLite file (WAL mode), one connection per thread."""
+
+    name = "sqlite"
+    greatest = "MAX"
+
+    def __init__(self, path=SQLITE_PATH):
+        self.path = path
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=SQLITE_BUSY_TIMEOUT, isolation_level=None,
+                                   detect_types=sqlite3.PARSE_DECLTYPES)
+            conn.execute("PRAGMA journal_mode = WAL;")
+            conn.execute("PRAGMA synchronous = NORMAL;")
+            conn.execute("PRAGMA foreign_keys = ON;")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def cursor(self):
+        cursor = _SQLiteCursor(self._connection().cursor())
+        try:
+            yield cursor
+        finally:
+            cursor.close()
+
+    @contextmanager
+    def transaction(self):
+        conn = self._connection()
+        cursor = _SQLiteCursor(conn.cursor())
+        cursor.execute("BEGIN IMMEDIATE;")  # ✅ Take the write lock up front; no upgrade deadlocks
+        try:
+            yield cursor
+            cursor.execute("COMMIT;")
+        except Exception:
+            cursor.execute("ROLLBACK;")
+            raise
+        finally:
+            cursor.close()
+
+    def insert_many(self, cursor, table, columns, rows, on_conflict=""):
+        placeholders = ", ".join(["%s"] * len(columns))
+        cursor.executemany(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders}){on_conflict}", rows)
+
+    def search_condition(self, search):
+        # ✅ `%` and `_` typed by the user are literal characters, not wildcards
+        escaped = search.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        pattern = f"%{escaped}%"
+        return "(ql.query LIKE %s ESCAPE '\\' OR r.body LIKE %s ESCAPE '\\')", [pattern, pattern]
+
+
+STORAGE_BACKENDS = {
+    "postgres": PostgresStorageBackend,
+    "sqlite": SQLiteStorageBackend,
+}
+
+
+def create_storage_backend(name=STORAGE_BACKEND):
+    """Builds the configured storage backend."""
+    if name not in STORAGE_BACKENDS:
+        raise ValueError(f"Unknown STORAGE_BACKEND '{name}'. Choose one of: {', '.join(STORAGE_BACKENDS)}")
+    print(f"✅ Storage backend: {name}")
+    return STORAGE_BACKENDS[name]()
+
+
+storage = create_storage_backend()
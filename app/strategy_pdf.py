@@ -1,8 +1,9 @@
 import os
-import openai
 import pdfkit
-from app.database import get_db_connection, release_db_connection
+from app.storage_backend import storage
 from app.cache_manager import cache_response, get_cached_response
+from app.single_flight import single_flight
+from app.llm_client import complete
 from prompt_library.archetype_prompts import archetype_prompts
 from prompt_library.expert_prompts import expert_prompts
 
@@ -70,14 +71,14 @@ def generate_strategy_pdf(user_id, structured_inputs, archetype, selected_expert
     if cached_response:
         strategy_content = cached_response
     else:
-        # ✅ Call OpenAI API to generate structured strategy
-        response = openai.ChatCompletion.create(
-            model="gpt-4-turbo",
-            messages=[{"role": "system", "content": ai_prompt}],
-            max_tokens=3000
-        )
-        strategy_content = response.choices[0].message["content"]
-        cache_response(cache_key, strategy_content)
+        def generate_strategy():
+            # ✅ Call OpenAI API to generate structured strategy
+            content = complete(ai_prompt, "gpt-4-turbo", max_tokens=3000)
+            cache_response(cache_key, content)
+            return content
+
+        # ✅ Concurrent requests for the same report share a single OpenAI call
+        strategy_content = single_flight(cache_key, generate_strategy)
 
     # ✅ Convert AI response to PDF format
     pdf_filename = f"strategy_report_{user_id}.pdf"
@@ -90,35 +91,15 @@ def generate_strategy_pdf(user_id, structured_inputs, archetype, selected_expert
 
 def store_generated_pdf(user_id, pdf_filename):
     """Stores generated strategy reports in the database for user retrieval."""
-    conn = get_db_connection()
-    if not conn:
-        return
-
     try:
-        cursor = conn.cursor()
-        cursor.execute("""
-            INSERT INTO strategy_reports (user_id, pdf_filename, created_at)
-            VALUES (%s, %s, NOW());
-        """, (user_id, pdf_filename))
-        conn.commit()
+        storage.store_generated_pdf(user_id, pdf_filename)
     except Exception as e:
         print(f"❌ Failed to store PDF: {e}")
-    finally:
-        release_db_connection(conn)
 
 def get_user_reports(user_id):
     """Retrieves previously generated strategy reports for a user."""
-    conn = get_db_connection()
-    if not conn:
-        return []
-
     try:
-        cursor = conn.cursor()
-        cursor.execute("SELECT pdf_filename, created_at FROM strategy_reports WHERE user_id = %s ORDER BY created_at DESC;", (user_id,))
-        reports = cursor.fetchall()
-        return reports  # Returns a list of (pdf_filename, timestamp)
+        return storage.get_user_reports(user_id)  # Returns a list of (pdf_filename, timestamp)
     except Exception as e:
         print(f"❌ Failed to fetch reports: {e}")
         return []
-    finally:
-        release_db_connection(conn)
@@ -0,0 +1,103 @@
+"""
+Token-accurate prompt budgeting with tiktoken.
+
+- `count_tokens` / `truncate_to_tokens` measure and trim text with the model's own tokenizer.
+  Encoders are loaded once per model and cached, so counting costs one BPE pass.
+- `fit_sections` shares a model's context window between named prompt sections by priority:
+  the most important sections are kept whole and the least important are trimmed first.
+
+If an encoding cannot be loaded (tiktoken downloads its BPE files on first use), counting falls
+back to the ~4 characters per token estimate the prompts used before.
+"""
+import os
+import math
+from functools import lru_cache
+
+import tiktoken
+
+DEFAULT_ENCODING = "cl100k_base"  # ✅ Used by every chat model we call
+CHARS_PER_TOKEN_ESTIMATE = 4  # ✅ Only when no encoder is available
+MESSAGE_OVERHEAD_TOKENS = 8  # ✅ Chat format framing per request (role markers, priming)
+
+MODEL_CONTEXT_WINDOWS = {
+    "gpt-4": 8192,
+    "gpt-4-turbo": 128000,
+    "gpt-3.5-turbo": 16385,
+}
+DEFAULT_CONTEXT_WINDOW = int(os.getenv("DEFAULT_CONTEXT_WINDOW", "8192"))
+
+
+@lru_cache(maxsize=None)
+def get_encoding(model=None):
+    """Returns the (cached) tiktoken encoder for `model`, or None if it cannot be loaded."""
+    try:
+        try:
+            return tiktoken.encoding_for_model(model) if model else tiktoken.get_encoding(DEFAULT_ENCODING)
+        except KeyError:
+            return tiktoken.get_encoding(DEFAULT_ENCODING)  # ✅ Model unknown to this tiktoken version
+    except Exception as e:
+        print(f"⚠️ Tokenizer unavailable for {model or DEFAULT_ENCODING}, estimating tokens from characters: {e}")
+        return None
+
+
+def context_window(model):
+    return MODEL_CONTEXT_WINDOWS.get(model, DEFAULT_CONTEXT_WINDOW)
+
+
+def count_tokens(text, model=None):
+    """Number of tokens `text` takes for `model`."""
+    if not text:
+        return 0
+    encoding = get_encoding(model)
+    if encoding is None:
+        return math.ceil(len(text) / CHARS_PER_TOKEN_ESTIMATE)
+    return len(encoding.encode_ordinary(text))  # ✅ Special-token strings in user text count as plain text
+
+
+def truncate_to_tokens(text, max_tokens, model=None, whole_sentences=False, from_end=False):
+    """
+    Trims `text` to at most `max_tokens` tokens (keeping the end instead with `from_end`).
+    With `whole_sentences`, a trimmed text is cut back to its last full sentence and marked with "...".
+    """
+    if not text or max_tokens <= 0:
+        return ""
+    encoding = get_encoding(model)
+    if encoding is None:
+        max_chars = max_tokens * CHARS_PER_TOKEN_ESTIMATE
+        if len(text) <= max_chars:
+            return text
+        trimmed = text[-max_chars:] if from_end else text[:max_chars]
+    else:
+        tokens = encoding.encode_ordinary(text)
+        if len(tokens) <= max_tokens:
+            return text
+        trimmed = encoding.decode(tokens[-max_tokens:] if from_end else tokens[:max_tokens])
+
+    if whole_sentences and not from_end and "." in trimmed:
+        trimmed = trimmed.rsplit(".", 1)[0] + "..."  # ✅ Stops at last full sentence
+    return trimmed
+
+
+def fit_sections(sections, model, reserved_tokens=0):
+    """
+    Fits prompt sections into `model`'s context window.
+
+    `sections` is a list of `(name, text, priority)`. Lower priority numbers are served first and
+    kept whole while they fit; the first section that does not fit is trimmed to the remaining
+    budget, and anything after it is dropped. `reserved_tokens` covers the completion
+    (`max_tokens`) and the fixed prompt template.
+    Returns `{name: text}` with every section present (possibly trimmed or empty).
+    """
+    remaining = context_window(model) - reserved_tokens - MESSAGE_OVERHEAD_TOKENS
+    fitted = {}
+    for name, text, _priority in sorted(sections, key=lambda section: section[2]):
+        tokens = count_tokens(text, model)
+        if tokens <= remaining:
+            fitted[name] = text
+            remaining -= tokens
+            continue
+
+        fitted[name] = truncate_to_tokens(text, max(remaining, 0), model, whole_sentences=True)
+        print(f"⚠️ Trimmed prompt section '{name}' from {tokens} to {max(remaining, 0)} tokens for {model}.")
+        remaining = 0
+    return fitted
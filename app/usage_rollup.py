@@ -0,0 +1,48 @@
+"""
+Rolls the per-period usage counters from the cache (see cache_manager's usage section)
+into the `usage_periods` table, the durable billing history.
+
+Each period's counts come from a single HGETALL of its rollup hash, and the upsert keeps the
+highest count seen, so the job is idempotent and safe to run as often as needed.
+"""
+from datetime import date
+
+from app.storage_backend import storage
+from app.cache_manager import (
+    redis_client, billing_month, period_id, usage_generation_key, usage_rollup_key,
+)
+
+
+def _previous_month(month):
+    year, month_number = int(month[:4]), int(month[4:6])
+    return date(year - (month_number == 1), (month_number - 2) % 12 + 1, 1).strftime("%Y%m")
+
+
+def active_usage_periods():
+    """Period ids of the current and previous billing month, including manual-reset generations."""
+    current = billing_month()
+    periods = []
+    for month in (_previous_month(current), current):
+        generation = int(redis_client.get(usage_generation_key(month)) or 0)
+        periods.extend(period_id(month, g) for g in range(generation + 1))
+    return periods
+
+
+def rollup_usage_periods(periods=None):
+    """Upserts the usage counts of `periods` (default: active ones) into usage_periods. Returns rows written."""
+    rows = []
+    for period in periods or active_usage_periods():
+        for field, used in redis_client.hgetall(usage_rollup_key(period)).items():
+            user_id, _, kind = field.rpartition(":")
+            if user_id.isdigit():  # ✅ Skip non-account callers such as the "system" batch user
+                rows.append((int(user_id), period, kind, int(used)))
+    if not rows:
+        return 0
+
+    try:
+        storage.upsert_usage_periods(rows)
+        print(f"✅ Rolled up {len(rows)} usage counters into usage_periods.")
+        return len(rows)
+    except Exception as e:
+        print(f"❌ Usage rollup failed: {e}")
+        return 0
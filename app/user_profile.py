@@ -0,0 +1,92 @@
+"""
+Cached user profile (plan, admin flag, one-time Enterprise access) for quota and routing decisions.
+
+Profiles live in the shared cache (and the local tier) for USER_PROFILE_TTL seconds and are
+invalidated explicitly whenever the underlying rows change, so a steady-state request makes
+no Postgres reads.
+"""
+import os
+import json
+import redis
+
+from app.storage_backend import storage
+from app.cache_manager import _cached_get, _cached_set, invalidate_cache_keys
+
+USER_PROFILE_TTL = int(os.getenv("USER_PROFILE_TTL", "300"))
+USER_PROFILE_MISS_TTL = int(os.getenv("USER_PROFILE_MISS_TTL", "30"))  # ✅ Unknown users, kept short
+
+
+def user_profile_key(user_id):
+    return f"user_profile:{user_id}"
+
+
+def _profile_from_row(user_id, row):
+    if not row:
+        return None
+    plan, admin, used, follow_ups_remaining = row
+    return {
+        "user_id": user_id,
+        "plan": plan,
+        "is_admin": bool(admin),
+        "one_time_follow_ups": follow_ups_remaining if not used and follow_ups_remaining else 0,
+    }
+
+
+def load_user_profile(user_id):
+    """Reads the profile straight from the database (one query). Returns None if the user is unknown."""
+    try:
+        return _profile_from_row(user_id, storage.load_user_profile(user_id))
+    except Exception as e:
+        print(f"❌ Failed to load user profile {user_id}: {e}")
+        return None
+
+
+def get_user_profile(user_id):
+    """
+    Returns the cached profile, loading and caching it on a miss (None if it cannot be loaded).
+    Unknown users are cached too, as a `null` entry for USER_PROFILE_MISS_TTL seconds, so stale
+    sessions and bad ids do not reach the database on every request.
+    """
+    key = user_profile_key(user_id)
+    try:
+        cached = _cached_get(key)
+        if cached is not None:
+            return json.loads(cached)  # ✅ "null" is a cached miss
+    except (redis.RedisError, json.JSONDecodeError) as e:
+        print(f"⚠️ User profile cache read failed for {user_id}: {e}")
+
+    try:
+        profile = _profile_from_row(user_id, storage.load_user_profile(user_id))
+    except Exception as e:
+        print(f"❌ Failed to load user profile {user_id}: {e}")
+        return None  # ✅ Database errors are not cached as misses
+
+    try:
+        _cached_set(key, json.dumps(profile), USER_PROFILE_TTL if profile is not None else USER_PROFILE_MISS_TTL)
+    except redis.RedisError as e:
+        print(f"⚠️ User profile cache write failed for {user_id}: {e}")
+    return profile
+
+
+def invalidate_user_profile(user_id):
+    """Drops the cached profile everywhere; call after any change to plan, admin flag or one-time access."""
+    try:
+        invalidate_cache_keys(user_profile_key(user_id))
+    except redis.RedisError as e:
+        print(f"⚠️ Failed to invalidate user profile {user_id}: {e}")
+
+
+def get_user_plan(user_id, default=None):
+    profile = get_user_profile(user_id)
+    return profile["plan"] if profile else default
+
+
+def get_admin_status(user_id):
+    profile = get_user_profile(user_id)
+    return bool(profile and profile["is_admin"])
+
+
+def get_one_time_follow_ups(user_id):
+    """Remaining follow-ups of an unused one-time Enterprise purchase (0 if none)."""
+    profile = get_user_profile(user_id)
+    return profile["one_time_follow_ups"] if profile else 0
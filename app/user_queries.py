@@ -1,13 +1,24 @@
 import re
-from app.main import process_user_request
-from app.user_management import check_one_time_access, is_admin
+from app.main import process_user_request, stream_user_request, get_cached_report
+from app.user_profile import get_user_profile
 from app.config import PLAN_DETAILS
-from app.cache_manager import get_cached_response, cache_response, track_query_count, track_follow_up_count, get_user_query_count, get_user_follow_up_count
+from app.cache_manager import get_cached_response, cache_response, check_and_increment_usage
+from app.cache_keys import FILLER_WORDS_PATTERN, build_query_cache_key, build_request_context
+from app.query_similarity import register_cached_query
+
+def check_usage_limit(user_id, user_plan, usage_type, admin_status=None):
+    """
+    Checks if the user has exceeded their plan's limit OR if they have one-time Enterprise access.
+    Consumes one unit of usage when allowed (atomic check-and-increment in Redis).
+    Plan, admin flag and one-time access come from the cached user profile.
+    """
+    profile = get_user_profile(user_id)
+    if profile:
+        user_plan = profile["plan"]  # ✅ Authoritative even if the caller's copy is stale
 
-def check_usage_limit(user_id, user_plan, usage_type):
-    """Checks if the user has exceeded their plan's limit OR if they have one-time Enterprise access."""
     # ✅ Bypass all limits for Admin users
-    admin_status = is_admin(user_id)
+    if admin_status is None:
+        admin_status = bool(profile and profile["is_admin"])
     print(f"🔍 Debugging Admin Check - User ID: {user_id}, Is Admin: {admin_status}")
 
     if admin_status:
@@ -15,45 +26,39 @@ def check_usage_limit(user_id, user_plan, usage_type):
         return True  # ✅ Admins have unlimited access
 
     if user_plan == "One-Time Enterprise Report (£25)":
-        return check_one_time_access(user_id) > 0
-
-    if usage_type == "queries":
-        usage_count = get_user_query_count(user_id)
-        max_queries = PLAN_DETAILS[user_plan]["queries"]
-        return usage_count < max_queries  # ✅ Ensure user stays within limits
+        return bool(profile and profile["one_time_follow_ups"] > 0)
 
-    if usage_type == "follow_ups":
-        follow_up_count = get_user_follow_up_count(user_id)
-        max_follow_ups = PLAN_DETAILS[user_plan]["follow_ups"]
-        return follow_up_count < max_follow_ups  # ✅ Ensure follow-up limits are respected
+    if usage_type in ("queries", "follow_ups"):
+        allowed, remaining = check_and_increment_usage(user_id, usage_type, PLAN_DETAILS[user_plan][usage_type])
+        print(f"📊 Usage Check - User ID: {user_id}, {usage_type}: allowed={allowed}, remaining={remaining}")
+        return allowed  # ✅ Ensure user stays within limits
 
     return True  # ✅ If no limit applies, allow request
 
 def preprocess_query(query):
     """Trims unnecessary words from user queries while keeping meaning intact."""
     query = query.strip()
-    query = re.sub(r'\b(hey|hi|thanks|wondering)\b', '', query, flags=re.IGNORECASE)
+    query = FILLER_WORDS_PATTERN.sub('', query)
     query = re.sub(r'\s+', ' ', query).strip()
     return query.capitalize()
 
 def generate_response(query, user_id, archetype, selected_experts, user_plan, uploaded_files=None,
-                          doc_usage_option=None):
+                          doc_usage_option=None, check_cache=True):
     """
     Prepares the structured query, checks Redis, and forwards it to main.py for AI processing.
+    Pass `check_cache=False` if the caller has already looked the request up (one lookup per request).
     """
-    cache_key = f"user_query:{user_id}:{query}"
-    cached_response = get_cached_response(cache_key)
+    context = build_request_context(archetype, selected_experts, user_plan, uploaded_files, doc_usage_option)
+    cache_key = build_query_cache_key(query, archetype, context=context)
+    cached_response = get_cached_report(context, cache_key, query) if check_cache else ""
 
     if cached_response:
-        return cached_response  # ✅ Use cached response if available
+        return cached_response  # ✅ Use cached (or near-duplicate) response if available
 
-    # ✅ Ensure user has not exceeded their allowed query usage
+    # ✅ Ensure user has not exceeded their allowed query usage (also records this query)
     if not check_usage_limit(user_id, user_plan, "queries"):
         return "❌ Query limit reached. Upgrade your plan for more."
 
-    # ✅ Track query usage in Redis
-    track_query_count(user_id)
-
     # ✅ Forward request to main.py for AI processing
     structured_query = {
         "user_id": user_id,
@@ -62,33 +67,62 @@ def generate_response(query, user_id, archetype, selected_experts, user_plan, up
         "selected_experts": selected_experts,
         "uploaded_files": uploaded_files,
         "user_plan": user_plan,
-        "doc_usage_option": doc_usage_option  # ✅ Now explicitly passed
+        "doc_usage_option": doc_usage_option,  # ✅ Now explicitly passed
+        "check_cache": False  # ✅ Already looked up above
     }
 
     ai_response = process_user_request(**structured_query)
 
-    # ✅ Cache AI response for future reuse
+    # ✅ Cache AI response for future reuse (exact and near-duplicate lookups)
     cache_response(cache_key, ai_response)
+    register_cached_query(context, query, cache_key)
 
     return ai_response
 
+def stream_response(query, user_id, archetype, selected_experts, user_plan, uploaded_files=None,
+                    doc_usage_option=None, check_cache=True):
+    """
+    Streaming variant of `generate_response`: yields the report in chunks for progressive rendering.
+    The full text is cached only once the stream finishes, so an interrupted stream is never cached.
+    Pass `check_cache=False` if the caller has already looked the request up.
+    """
+    context = build_request_context(archetype, selected_experts, user_plan, uploaded_files, doc_usage_option)
+    cache_key = build_query_cache_key(query, archetype, context=context)
+    cached_response = get_cached_report(context, cache_key, query) if check_cache else ""
+
+    if cached_response:
+        yield cached_response
+        return
+
+    # ✅ Ensure user has not exceeded their allowed query usage (also records this query)
+    if not check_usage_limit(user_id, user_plan, "queries"):
+        yield "❌ Query limit reached. Upgrade your plan for more."
+        return
+
+    chunks = []
+    for chunk in stream_user_request(user_id, query, archetype, selected_experts, uploaded_files, user_plan,
+                                     doc_usage_option, check_cache=False):
+        chunks.append(chunk)
+        yield chunk
+
+    # ✅ Cache the assembled response for future reuse (exact and near-duplicate lookups)
+    cache_response(cache_key, "".join(chunks))
+    register_cached_query(context, query, cache_key)
+
 def generate_follow_up_response(query, user_id, archetype, user_plan):
     """
     Handles follow-up queries, ensuring they check Redis first and enforce limits.
     """
-    cache_key = f"follow_up:{user_id}:{archetype}:{query}"
+    cache_key = build_query_cache_key(query, archetype, user_plan=user_plan, family="follow_up")
     cached_follow_up = get_cached_response(cache_key)
 
     if cached_follow_up:
         return cached_follow_up  # ✅ Use cached response if available
 
-    # ✅ Ensure user has not exceeded their allowed follow-up usage
+    # ✅ Ensure user has not exceeded their allowed follow-up usage (also records this follow-up)
     if not check_usage_limit(user_id, user_plan, "follow_ups"):
         return "❌ Follow-up limit reached. Upgrade your plan for more."
 
-    # ✅ Track follow-up usage in Redis
-    track_follow_up_count(user_id)
-
     # ✅ Process follow-up query
     structured_query = {
         "user_id": user_id,
@@ -96,7 +130,8 @@ def generate_follow_up_response(query, user_id, archetype, user_plan):
         "archetype": archetype,
         "selected_experts": [],  # ✅ Experts are only assigned in the initial query
         "uploaded_files": None,
-        "user_plan": user_plan
+        "user_plan": user_plan,
+        "check_cache": False  # ✅ The follow-up cache was already checked above
     }
 
     ai_follow_up_response = process_user_request(**structured_query)
@@ -0,0 +1,85 @@
+"""
+Benchmarks cache_manager lookups as the Redis keyspace grows.
+
+Compares the sorted-set leaderboard (`get_frequent_queries`) against the old
+KEYS + GET-per-key scan, and times the SCAN-based `clear_old_cache_entries`.
+
+⚠️ With CACHE_BACKEND=redis this uses a dedicated database (BENCH_REDIS_DB, default 15) and FLUSHES it.
+Usage: python benchmarks/bench_cache_manager.py
+       CACHE_BACKEND=memory python benchmarks/bench_cache_manager.py  (no Redis server needed)
+"""
+import sys
+import os
+import time
+import redis
+
+# ✅ Ensure Python finds 'app/' directory
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app import cache_manager
+
+BENCH_REDIS_DB = int(os.getenv("BENCH_REDIS_DB", "15"))
+KEYSPACE_SIZES = [1_000, 10_000, 100_000]
+DISTINCT_QUERIES = 500
+REPEATS = 20
+
+
+def legacy_get_frequent_queries(client, top_n=5):
+    """The previous KEYS-based implementation, kept for comparison."""
+    query_keys = client.keys("query_count:*")
+    query_counts = {key: int(client.get(key) or 0) for key in query_keys}
+    sorted_queries = sorted(query_counts, key=query_counts.get, reverse=True)[:top_n]
+    return [query.replace("query_count:", "") for query in sorted_queries]
+
+
+def populate(client, size):
+    """Fills the database with `size` cache entries plus query frequency data in both formats."""
+    pipe = client.pipeline(transaction=False)
+    for i in range(size):
+        pipe.set(f"query_cache:bench query {i}", "x" * 64)
+        if i % 1000 == 999:
+            pipe.execute()
+    for i in range(DISTINCT_QUERIES):
+        pipe.set(f"query_count:bench query {i}", i)
+        pipe.zadd(cache_manager.QUERY_LEADERBOARD_KEY, {f"bench query {i}": i})
+    pipe.execute()
+
+
+def time_call(func, *args):
+    """Returns the median wall time of `func(*args)` in milliseconds."""
+    timings = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        func(*args)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return timings[len(timings) // 2]
+
+
+def run():
+    if cache_manager.cache_backend.name == "redis":
+        client = redis.Redis.from_url(cache_manager.cache_backend.url, db=BENCH_REDIS_DB, decode_responses=True)
+        cache_manager.redis_client = client  # ✅ Point the module at the scratch database
+    else:
+        client = cache_manager.redis_client
+
+    print(f"{'keys':>10} | {'leaderboard ms':>15} | {'legacy KEYS ms':>15} | {'SCAN cleanup ms':>16}")
+    for size in KEYSPACE_SIZES:
+        client.flushdb()
+        populate(client, size)
+
+        leaderboard_ms = time_call(cache_manager.get_frequent_queries, 5)
+        legacy_ms = time_call(legacy_get_frequent_queries, client, 5)
+
+        start = time.perf_counter()
+        cache_manager.clear_old_cache_entries()
+        cleanup_ms = (time.perf_counter() - start) * 1000
+
+        print(f"{size:>10} | {leaderboard_ms:>15.3f} | {legacy_ms:>15.3f} | {cleanup_ms:>16.1f}")
+
+    client.flushdb()
+    print("✅ Benchmark complete.")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,76 @@
+"""
+Load-tests app/llm_client.py against an OpenAI-compatible endpoint (normally the local mock server).
+
+Runs CONCURRENCY workers that each send REQUESTS_PER_WORKER calls, and reports latency
+percentiles, time to first token for streamed calls, and failures left after retries.
+
+Usage: python benchmarks/mock_llm_server.py --rate-limit 20 --error-rate 0.05 &
+       LLM_BASE_URL=http://127.0.0.1:8089/v1 python benchmarks/bench_llm_client.py
+"""
+import sys
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# ✅ Ensure Python finds 'app/' directory
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+os.environ.setdefault("OPENAI_API_KEY", "mock")
+os.environ.setdefault("LLM_BASE_URL", "http://127.0.0.1:8089/v1")
+
+from app.llm_client import complete, stream_completion
+
+CONCURRENCY = int(os.getenv("BENCH_CONCURRENCY", "16"))
+REQUESTS_PER_WORKER = int(os.getenv("BENCH_REQUESTS_PER_WORKER", "5"))
+PROMPT = "Give three growth strategies for a B2B SaaS company."
+
+
+def percentile(values, fraction):
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def run_blocking():
+    start = time.perf_counter()
+    complete(PROMPT, "gpt-3.5-turbo", max_tokens=200)
+    return time.perf_counter() - start, None
+
+
+def run_streaming():
+    start = time.perf_counter()
+    first_token = None
+    for _ in stream_completion(PROMPT, "gpt-3.5-turbo", max_tokens=200):
+        if first_token is None:
+            first_token = time.perf_counter() - start
+    return time.perf_counter() - start, first_token
+
+
+def worker(call):
+    results = []
+    for _ in range(REQUESTS_PER_WORKER):
+        try:
+            results.append(call())
+        except Exception as e:
+            results.append(e)
+    return results
+
+
+def bench(name, call):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=CONCURRENCY) as pool:
+        results = [result for batch in pool.map(lambda _: worker(call), range(CONCURRENCY)) for result in batch]
+    elapsed = time.perf_counter() - start
+
+    timings = [result for result in results if not isinstance(result, Exception)]
+    latencies = [latency for latency, _ in timings]
+    first_tokens = [first for _, first in timings if first is not None]
+    print(f"{name:<10} {len(results):>5} calls in {elapsed:6.2f}s | "
+          f"p50 {percentile(latencies, 0.5):6.2f}s  p95 {percentile(latencies, 0.95):6.2f}s | "
+          f"TTFT p50 {percentile(first_tokens, 0.5):6.2f}s | failed {len(results) - len(timings)}")
+
+
+if __name__ == "__main__":
+    print(f"Endpoint: {os.environ['LLM_BASE_URL']}  concurrency={CONCURRENCY}")
+    bench("blocking", run_blocking)
+    bench("streaming", run_streaming)
@@ -0,0 +1,157 @@
+"""
+A local stand-in for the OpenAI chat completions API, for offline load tests.
+
+Simulates response latency, token streaming (SSE), rate limits (429 + Retry-After) and
+random server errors. Serves `POST /v1/chat/completions` in the OpenAI response format.
+
+Usage: python benchmarks/mock_llm_server.py --port 8089 --latency 0.5 --rate-limit 20 --error-rate 0.05
+       LLM_BASE_URL=http://127.0.0.1:8089/v1 OPENAI_API_KEY=mock streamlit run frontend/app.py
+"""
+import time
+import json
+import uuid
+import random
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+MOCK_WORDS = ("strategy", "growth", "market", "customers", "pricing", "execution", "risk", "scale", "insight", "plan")
+
+
+class RateLimiter:
+    """Token bucket: `rate` requests per second with bursts of up to `burst`."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Returns 0 if the request may proceed, else the seconds until a slot frees up."""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+
+class MockLLMHandler(BaseHTTPRequestHandler):
+    settings = None  # ✅ argparse namespace, set in main()
+    rate_limiter = None
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        if self.settings.verbose:
+            super().log_message(format, *args)
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error(self, status, message, error_type, headers=None):
+        self._send_json(status, {"error": {"message": message, "type": error_type, "param": None, "code": None}},
+                        headers)
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_error(404, f"Unknown path {self.path}", "invalid_request_error")
+            return
+
+        if self.rate_limiter:
+            wait = self.rate_limiter.acquire()
+            if wait:
+                self._send_error(429, "Rate limit reached for requests (mock).", "requests",
+                                 {"Retry-After": f"{max(wait, self.settings.retry_after):.2f}"})
+                return
+
+        if random.random() < self.settings.error_rate:
+            status = random.choice((500, 502, 503))
+            self._send_error(status, "The server had an error while processing your request (mock).", "server_error")
+            return
+
+        words = [random.choice(MOCK_WORDS) for _ in range(min(request.get("max_tokens") or 256,
+                                                              self.settings.response_tokens))]
+        time.sleep(max(0.0, random.gauss(self.settings.latency, self.settings.jitter)))  # ✅ Time to first token
+        if request.get("stream"):
+            self._stream(request, words)
+        else:
+            time.sleep(self.settings.token_delay * len(words))  # ✅ Generation time of the whole reply
+            self._send_json(200, {
+                "id": f"chatcmpl-mock-{uuid.uuid4().hex[:12]}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": request.get("model", "mock"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": " ".join(words)},
+                             "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": 0, "completion_tokens": len(words), "total_tokens": len(words)},
+            })
+
+    def _stream(self, request, words):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")  # ✅ End of stream = end of connection (no chunked encoding)
+        self.end_headers()
+        self.close_connection = True
+
+        completion_id = f"chatcmpl-mock-{uuid.uuid4().hex[:12]}"
+
+        def event(delta, finish_reason=None):
+            chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                     "model": request.get("model", "mock"),
+                     "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        event({"role": "assistant"})
+        for i, word in enumerate(words):
+            event({"content": word if i == 0 else f" {word}"})
+            time.sleep(self.settings.token_delay)
+        event({}, "stop")
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock OpenAI chat completions server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", type=float, default=0.5, help="mean seconds before the first token")
+    parser.add_argument("--jitter", type=float, default=0.1, help="standard deviation of the latency")
+    parser.add_argument("--token-delay", type=float, default=0.02, help="seconds per generated token")
+    parser.add_argument("--response-tokens", type=int, default=200, help="tokens per reply (capped by max_tokens)")
+    parser.add_argument("--rate-limit", type=float, default=0, help="requests per second (0 = unlimited)")
+    parser.add_argument("--burst", type=int, default=5, help="requests allowed at once under the rate limit")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="minimum Retry-After on 429s")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests failing with 5xx")
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+    settings = parser.parse_args()
+
+    MockLLMHandler.settings = settings
+    if settings.rate_limit > 0:
+        MockLLMHandler.rate_limiter = RateLimiter(settings.rate_limit, settings.burst)
+
+    server = ThreadingHTTPServer((settings.host, settings.port), MockLLMHandler)
+    server.daemon_threads = True
+    print(f"✅ Mock LLM server on http://{settings.host}:{settings.port}/v1 "
+          f"(latency {settings.latency}s, rate limit {settings.rate_limit or 'off'}, error rate {settings.error_rate})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -12,16 +12,22 @@ from app.strategy_pdf import generate_strategy_pdf  # ✅ Import the strategy PD
 
 from prompt_library.short_descriptions import archetype_descriptions, expert_descriptions
 from prompt_library.expert_prompts import EXPERT_CATEGORIES  # ✅ Now correctly imported
-from app.cache_manager import get_cached_response, cache_response
-from app.database import init_db_pool, log_user_query, get_recent_queries_with_responses
+from app.cache_manager import get_cached_response, cache_response, store_user_session
+from app.cache_keys import build_query_cache_key, build_request_context
+from app.user_profile import get_user_profile, invalidate_user_profile
+from app.cache_metrics import start_metrics_server
+from app.database import init_db_pool, log_user_query, get_query_history, get_query_log
 from app.plan_limits import PLAN_DETAILS
-from app.user_queries import generate_response
-from app.main import generate_summary
+from app.user_queries import generate_response, stream_response
+from app.main import generate_summary, get_cached_report
 
 
 # ✅ Ensure database tables are created
 init_db_pool()
 
+# ✅ Expose cache metrics for scraping (only when METRICS_PORT is set)
+start_metrics_server()
+
 # ✅ Initialize session state if not set
 if "user_id" not in st.session_state:
     st.session_state["user_id"] = None
@@ -81,6 +87,16 @@ if "user_id" not in st.session_state or st.session_state["user_id"] is None:
                 # ✅ Check if user is an admin (Stored in Supabase)
                 st.session_state["is_admin"] = user.get("is_admin", False)
 
+                store_user_session(user["user_id"], {
+                    "email": user["email"],
+                    "plan": user["plan"],
+                    "is_admin": st.session_state["is_admin"]
+                })
+
+                # ✅ Warm the cached profile so quota checks make no database reads
+                invalidate_user_profile(user["user_id"])
+                get_user_profile(user["user_id"])
+
                 # ✅ Debugging (Print Admin Status)
                 print(f"🛠 Admin Check: {st.session_state['email']} | Admin: {st.session_state['is_admin']}")
 
@@ -165,24 +181,40 @@ if st.session_state["user_id"]:
 if "user_id" in st.session_state and st.session_state["user_id"]:
     user_id = st.session_state["user_id"]
 
-    # ✅ Fetch recent queries & responses from the database
-    recent_queries = get_recent_queries_with_responses(user_id)
+    # ✅ Search & page through past queries (full responses load only for the selected entry)
+    history_search = st.text_input("🔎 Search your past queries:", key="history_search")
+    if st.session_state.get("history_search_applied") != history_search:
+        st.session_state["history_search_applied"] = history_search
+        st.session_state["history_cursors"] = [None]  # ✅ A new search restarts at the newest page
+    history_cursors = st.session_state.setdefault("history_cursors", [None])
+    history_rows, next_cursor = get_query_history(user_id, before=history_cursors[-1], search=history_search)
 
     # ✅ Ensure user has selected a previous query before showing it
     selected_query = None
     selected_response = None
 
     # ✅ Dropdown to select a past query (Only show if queries exist)
-    if recent_queries:
+    if history_rows:
         formatted_queries = {
-            f"{q[2].strftime('%Y-%m-%d %H:%M')} - {q[0][:50]}...": (q[0], q[1]) for q in recent_queries
+            f"{created_at.strftime('%Y-%m-%d %H:%M')} - {preview[:50]}... ({size / 1024:.1f} KB)": log_id
+            for log_id, created_at, preview, size in history_rows
         }
         selected_query_label = st.selectbox("🔍 Load a previous query:",
                                             ["Select a query..."] + list(formatted_queries.keys()))
 
-        # ✅ Only assign selected query if the user actually picks one
+        # ✅ Only load the selected entry's full query & response
         if selected_query_label != "Select a query...":
-            selected_query, selected_response = formatted_queries[selected_query_label]
+            history_entry = get_query_log(user_id, formatted_queries[selected_query_label])
+            if history_entry:
+                selected_query, selected_response = history_entry[0], history_entry[1] or "No response stored"
+
+    newer_col, older_col = st.columns(2)
+    if len(history_cursors) > 1 and newer_col.button("⬅️ Newer queries"):
+        history_cursors.pop()
+        st.rerun()
+    if next_cursor and older_col.button("Older queries ➡️"):
+        history_cursors.append(next_cursor)
+        st.rerun()
 
     # ✅ Display previous query & response ONLY if a query was selected
     if selected_query:
@@ -349,58 +381,52 @@ if st.session_state["user_id"]:
                     st.warning("⚠ Please enter a query.")
                 else:
                     with st.spinner("✨ Generating AI-powered strategy..."):
-                        cache_key = f"user_query:{st.session_state['user_id']}:{query}"
-                        cached_response = get_cached_response(cache_key)
-
-
-                        if "full_report" not in st.session_state:
-                            st.session_state["full_report"] = None  # ✅ Ensure `full_report` exists
-                        if cached_response:
-                            full_report = cached_response  # ✅ Use cached response if available
-                        else:
-                            full_report = generate_response(
-                                query=query,
-                                user_id=st.session_state["user_id"],
-                                archetype=st.session_state["selected_archetype_tab1"],  # ✅ Correct variable
-                                selected_experts=st.session_state["selected_experts_tab1"],
-                                # ✅ Correct variable ✅ Ensure experts are passed correctly
-                                uploaded_files=uploaded_files if uploaded_files else None,
-                                # ✅ Ensure document uploads are handled
-                                user_plan=st.session_state["user_plan"],
-                                doc_usage_option=doc_usage_option
-                            )
-                            cache_response(cache_key, full_report)  # ✅ Cache AI response
-
-                        if full_report:
-                            st.session_state["full_report"] = full_report  # ✅ Store it persistently
-
-                        # ✅ Store full report in session for summary generation
-                        st.session_state["full_report"] = full_report
-                        st.session_state["initial_response"] = full_report  # ✅ Enables follow-ups
-
-                        # ✅ Ensure follow-up count tracking is initialized correctly
-                        if "follow_up_count" not in st.session_state:
-                            st.session_state["follow_up_count"] = 0
-
-                        # ✅ Log query only if it’s a new AI call (not from cache)
-                        if not cached_response:
-                            log_user_query(st.session_state["user_id"], query, full_report, st.session_state["user_plan"])
-
-                        st.subheader("📜 AI Strategy Report")
-                        st.write(full_report)
-
-                        # ✅ Store full report in session for summary generation
-                        st.session_state["full_report"] = full_report
-
-                        # ✅ Store initial response to enable follow-ups
-                        st.session_state["initial_response"] = full_report  # ✅ This enables follow-ups
+                        context = build_request_context(
+                            st.session_state["selected_archetype_tab1"],
+                            st.session_state["selected_experts_tab1"],
+                            st.session_state["user_plan"],
+                            uploaded_files if uploaded_files else None,
+                            doc_usage_option
+                        )
+                        cache_key = build_query_cache_key(query, st.session_state["selected_archetype_tab1"],
+                                                          context=context)
+                        cached_response = get_cached_report(context, cache_key, query)
 
-                        # ✅ Initialize follow-up count if not set
-                        if "follow_up_count" not in st.session_state:
-                            st.session_state["follow_up_count"] = 0  # ✅ Ensures tracking starts
+                    if "full_report" not in st.session_state:
+                        st.session_state["full_report"] = None  # ✅ Ensure `full_report` exists
 
-                            # ✅ Fix: Log the correct query and response (Fix: Replace follow_up_response)
-                            log_user_query(st.session_state["user_id"], query, full_report, st.session_state["user_plan"])
+                    st.subheader("📜 AI Strategy Report")
+                    if cached_response:
+                        full_report = cached_response  # ✅ Use cached response if available
+                        st.write(full_report)
+                    else:
+                        # ✅ Render tokens as they arrive; returns the assembled text once the stream ends
+                        full_report = st.write_stream(stream_response(
+                            query=query,
+                            user_id=st.session_state["user_id"],
+                            archetype=st.session_state["selected_archetype_tab1"],  # ✅ Correct variable
+                            selected_experts=st.session_state["selected_experts_tab1"],
+                            # ✅ Correct variable ✅ Ensure experts are passed correctly
+                            uploaded_files=uploaded_files if uploaded_files else None,
+                            # ✅ Ensure document uploads are handled
+                            user_plan=st.session_state["user_plan"],
+                            doc_usage_option=doc_usage_option,
+                            check_cache=False  # ✅ Looked up above; one cache lookup per request
+                        ))
+
+                        # ✅ Log query only if it’s a new AI call (not from cache), with the complete text
+                        log_user_query(st.session_state["user_id"], query, full_report, st.session_state["user_plan"],
+                                       st.session_state["selected_archetype_tab1"])
+
+                    # ✅ Store full report in session for summary generation
+                    st.session_state["full_report"] = full_report
+
+                    # ✅ Store initial response to enable follow-ups
+                    st.session_state["initial_response"] = full_report  # ✅ This enables follow-ups
+
+                    # ✅ Initialize follow-up count if not set
+                    if "follow_up_count" not in st.session_state:
+                        st.session_state["follow_up_count"] = 0  # ✅ Ensures tracking starts
 
             # ✅ Show Executive Summary Button ONLY if a report has been generated
             if "full_report" in st.session_state and st.session_state["full_report"]:
@@ -545,24 +571,23 @@ if st.session_state["user_id"]:
 
             st.warning("❌ You have reached your follow-up query limit. Upgrade your plan for more.")
         else:
-            with st.spinner("🔄 Processing your follow-up..."):
-                st.session_state["follow_up_response"] = generate_response(
-                    user_id=st.session_state["user_id"],
-                    query=follow_up_query,
-                    archetype=st.session_state["selected_archetype_tab2"],  # ✅ Correct variable
-                    selected_experts=st.session_state["selected_experts_tab2"],  # ✅ Correct variable
-                    uploaded_files=None,
-                    user_plan=st.session_state["user_plan"],
-                    doc_usage_option=doc_usage_option  # ✅ No longer undefined
-                )
-
-                if st.session_state["follow_up_response"]:
-                    st.session_state["follow_up_count"] = used_follow_ups + 1
-                    st.subheader("📜 Follow-Up Response:")
-                    st.write(st.session_state["follow_up_response"])
-
-                    # ✅ Log the query & response at the same time
-                    log_user_query(st.session_state["user_id"], follow_up_query,
-                                   st.session_state["follow_up_response"],
-                                   st.session_state["user_plan"])
+            st.subheader("📜 Follow-Up Response:")
+            st.session_state["follow_up_response"] = st.write_stream(stream_response(
+                user_id=st.session_state["user_id"],
+                query=follow_up_query,
+                archetype=st.session_state["selected_archetype_tab2"],  # ✅ Correct variable
+                selected_experts=st.session_state["selected_experts_tab2"],  # ✅ Correct variable
+                uploaded_files=None,
+                user_plan=st.session_state["user_plan"],
+                doc_usage_option=doc_usage_option  # ✅ No longer undefined
+            ))
+
+            if st.session_state["follow_up_response"]:
+                st.session_state["follow_up_count"] = used_follow_ups + 1
+
+                # ✅ Log the query & response once the stream has finished
+                log_user_query(st.session_state["user_id"], follow_up_query,
+                               st.session_state["follow_up_response"],
+                               st.session_state["user_plan"],
+                               st.session_state["selected_archetype_tab2"])
 
@@ -0,0 +1,42 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# ✅ Run everything locally: in-process cache, embedded SQLite, no OpenAI calls.
+# Set before any `app` import, since backends are chosen when their modules load.
+_TEST_DIR = tempfile.mkdtemp(prefix="stratogenic-tests-")
+os.environ.setdefault("CACHE_BACKEND", "memory")
+os.environ.setdefault("STORAGE_BACKEND", "sqlite")
+os.environ.setdefault("SQLITE_PATH", os.path.join(_TEST_DIR, "app.db"))
+os.environ.setdefault("WRITE_BEHIND_SPILL_PATH", os.path.join(_TEST_DIR, "spill.jsonl"))
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+
+@pytest.fixture(autouse=True)
+def clean_cache():
+    from app.cache_manager import redis_client
+    redis_client.flushdb()
+    yield
+    redis_client.flushdb()
+
+
+@pytest.fixture
+def sqlite_storage(tmp_path, monkeypatch):
+    """A freshly migrated SQLite database, used by every module under test instead of the shared one."""
+    from app import migrations, queue_processor
+    from app.storage_backend import SQLiteStorageBackend
+
+    backend = SQLiteStorageBackend(str(tmp_path / "test.db"))
+    monkeypatch.setattr(migrations, "storage", backend)
+    monkeypatch.setattr(queue_processor, "storage", backend)
+    assert migrations.run_migrations() == migrations.MIGRATIONS[-1][0]
+    return backend
+
+
+@pytest.fixture
+def user_id(sqlite_storage):
+    return sqlite_storage.create_user("founder@example.com", "hash", "The Foundation (Free)")
@@ -0,0 +1,57 @@
+import pytest
+
+from app import main, user_queries
+
+
+def test_follow_up_skips_the_report_cache_it_already_checked(monkeypatch):
+    requests = []
+
+    def process_user_request(**request):
+        requests.append(request)
+        return "follow-up answer"
+
+    monkeypatch.setattr(user_queries, "process_user_request", process_user_request)
+    monkeypatch.setattr(user_queries, "check_usage_limit", lambda *args: True)
+
+    answer = user_queries.generate_follow_up_response("And for B2B?", 1, "Visionary", "The Foundation (Free)")
+    assert answer == "follow-up answer"
+    assert requests[0]["check_cache"] is False
+
+    # ✅ The follow-up is now cached under its own key
+    assert user_queries.generate_follow_up_response("And for B2B?", 1, "Visionary", "The Foundation (Free)") == \
+        "follow-up answer"
+    assert len(requests) == 1
+
+
+STREAM_REQUEST = ("Pricing for a B2B analytics tool", 1, "Visionary", [], "The Foundation (Free)")
+
+
+@pytest.fixture
+def streamed_llm(monkeypatch):
+    """Replaces the OpenAI stream with three chunks and counts the calls."""
+    calls = []
+
+    def stream_completion(prompt, model, max_tokens):
+        calls.append(model)
+        yield from ("Three ", "actionable ", "steps")
+
+    monkeypatch.setattr(main, "stream_completion", stream_completion)
+    monkeypatch.setattr(main, "log_user_query", lambda *args: None)
+    monkeypatch.setattr(user_queries, "check_usage_limit", lambda *args: True)
+    return calls
+
+
+def test_stream_yields_chunks_then_serves_the_cached_text(streamed_llm):
+    assert list(user_queries.stream_response(*STREAM_REQUEST)) == ["Three ", "actionable ", "steps"]
+    assert list(user_queries.stream_response(*STREAM_REQUEST)) == ["Three actionable steps"]
+    assert user_queries.generate_response(*STREAM_REQUEST) == "Three actionable steps"
+    assert len(streamed_llm) == 1
+
+
+def test_interrupted_stream_is_not_cached(streamed_llm):
+    stream = user_queries.stream_response(*STREAM_REQUEST)
+    assert next(stream) == "Three "
+    stream.close()
+
+    assert list(user_queries.stream_response(*STREAM_REQUEST)) == ["Three ", "actionable ", "steps"]
+    assert len(streamed_llm) == 2
@@ -0,0 +1,55 @@
+import asyncio
+
+from app import async_cache_manager, cache_manager
+
+
+def test_sync_and_async_apis_read_each_others_entries():
+    report = "## Executive Summary\n" * 200  # ✅ Large enough to be stored compressed
+    asyncio.run(async_cache_manager.cache_response("user_query:async", report))
+    assert cache_manager.get_cached_response("user_query:async") == report
+
+    cache_manager.cache_response("user_query:sync", "sync report")
+    assert asyncio.run(async_cache_manager.get_cached_response("user_query:sync")) == "sync report"
+    assert asyncio.run(async_cache_manager.get_cached_response("user_query:missing")) == ""
+
+
+def test_session_and_memory_round_trip():
+    async def scenario():
+        await async_cache_manager.store_user_session(7, {"plan": "The Foundation (Free)"})
+        await async_cache_manager.store_ai_memory(7, "pricing?", "Raise prices.")
+        return await async_cache_manager.get_user_session(7), await async_cache_manager.get_ai_memory(7)
+
+    session, memory = asyncio.run(scenario())
+    assert session == {"plan": "The Foundation (Free)"}
+    assert memory == {"query": "pricing?", "response": "Raise prices."}
+    assert cache_manager.get_user_session(7) == session
+
+
+def test_check_and_increment_shares_the_sync_counters():
+    async def scenario():
+        return [await async_cache_manager.check_and_increment_usage(7, "queries", 2) for _ in range(3)]
+
+    assert asyncio.run(scenario()) == [(True, 1), (True, 0), (False, 0)]
+    assert cache_manager.check_and_increment_usage(7, "queries", 2) == (False, 0)
+    assert asyncio.run(async_cache_manager.get_usage_count(7, "queries")) == 2
+
+
+def test_prefetch_reads_without_consuming_quota():
+    cache_manager.cache_response("user_query:abc", "cached report")
+    cache_manager.store_user_session(7, {"plan": "The Foundation (Free)"})
+    cache_manager.check_and_increment_usage(7, "queries", 10)
+
+    state = asyncio.run(async_cache_manager.prefetch_request_state(7, "user_query:abc"))
+    assert state == {"cached_response": "cached report", "usage_count": 1,
+                     "session": {"plan": "The Foundation (Free)"}}
+    assert cache_manager.get_usage_count(7, "queries") == 1
+
+
+def test_clients_are_bound_to_their_event_loop():
+    async def clients():
+        first = async_cache_manager.get_async_clients()
+        assert async_cache_manager.get_async_clients() is first
+        await async_cache_manager.close_async_clients()
+        return first
+
+    assert asyncio.run(clients()) is not asyncio.run(clients())
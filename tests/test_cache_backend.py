@@ -0,0 +1,114 @@
+import time
+
+import pytest
+import redis
+
+from app.cache_backend import (
+    SCRIPT_FALLBACKS, MemoryCacheBackend, NullCacheBackend, create_cache_backend, register_script_fallback,
+)
+
+
+@pytest.fixture
+def client():
+    return MemoryCacheBackend().client
+
+
+def test_create_cache_backend_rejects_unknown_names():
+    with pytest.raises(ValueError):
+        create_cache_backend("memcached")
+
+
+def test_text_and_binary_clients_share_one_store():
+    backend = MemoryCacheBackend()
+    backend.client.set("greeting", "héllo")
+
+    assert backend.binary_client.get("greeting") == "héllo".encode("utf-8")
+    assert backend.client.get("greeting") == "héllo"
+
+
+def test_keys_expire(client):
+    client.set("short", "value", px=50)
+    client.set("long", "value", ex=60)
+    assert 0 < client.ttl("long") <= 60
+    assert client.ttl("missing") == -2
+
+    time.sleep(0.1)
+    assert client.get("short") is None
+    assert client.exists("short", "long") == 1
+
+
+def test_set_nx_and_xx(client):
+    assert client.set("lock", "first", nx=True)
+    assert client.set("lock", "second", nx=True) is None
+    assert client.set("absent", "value", xx=True) is None
+    assert client.get("lock") == "first"
+
+
+def test_wrong_type_raises_like_redis(client):
+    client.hset("profile", "plan", "Free")
+    with pytest.raises(redis.ResponseError):
+        client.get("profile")
+
+
+def test_pipeline_runs_commands_in_order(client):
+    pipe = client.pipeline(transaction=False)
+    pipe.incr("counter").incr("counter").get("counter")
+    assert pipe.execute() == [1, 2, "2"]
+
+
+def test_scan_iter_matches_patterns(client):
+    for key in ("usage:1:202601:queries", "usage:2:202601:queries", "user_session:1"):
+        client.set(key, "1")
+    assert sorted(client.scan_iter(match="usage:*")) == ["usage:1:202601:queries", "usage:2:202601:queries"]
+
+
+def test_sorted_set_ranking(client):
+    client.zadd("leaderboard", {"pricing": 3, "retention": 5})
+    client.zincrby("leaderboard", 4, "pricing")
+    assert client.zrevrange("leaderboard", 0, -1, withscores=True) == [("pricing", 7.0), ("retention", 5.0)]
+    assert client.zremrangebyrank("leaderboard", 0, 0) == 1
+    assert client.zrevrange("leaderboard", 0, -1) == ["pricing"]
+
+
+def test_sorted_set_range_and_removal(client):
+    client.zadd("recent", {"a": 1, "b": 2, "c": 3, "d": 4})
+    assert client.zrange("recent", 0, 1) == ["a", "b"]
+    assert client.zremrangebyscore("recent", "-inf", 2) == 2
+    assert client.zrem("recent", "c", "missing") == 1
+    assert client.zrange("recent", 0, -1, withscores=True) == [("d", 4.0)]
+
+
+def test_scripts_run_their_registered_fallback(client, monkeypatch):
+    monkeypatch.setitem(SCRIPT_FALLBACKS, "return 1", lambda client, keys, args: [keys, args])
+    assert client.register_script("return 1")(keys=["k"], args=[1]) == [["k"], [1]]
+
+    with pytest.raises(NotImplementedError):
+        client.register_script("return 2")()
+
+
+def test_register_script_fallback_is_keyed_by_source(monkeypatch):
+    monkeypatch.setattr("app.cache_backend.SCRIPT_FALLBACKS", {})
+    register_script_fallback("return 3", print)
+    from app import cache_backend
+    assert cache_backend.SCRIPT_FALLBACKS == {"return 3": print}
+
+
+def test_pubsub_delivers_to_subscribers_until_stopped(client):
+    received = []
+    pubsub = client.pubsub()
+    pubsub.subscribe(**{"invalidations": received.append})
+    thread = pubsub.run_in_thread()
+
+    assert client.publish("invalidations", "key-1") == 1
+    thread.stop()
+    assert client.publish("invalidations", "key-2") == 0
+    assert [message["data"] for message in received] == ["key-1"]
+    assert not thread.is_alive()
+
+
+def test_null_backend_remembers_nothing():
+    client = NullCacheBackend().client
+    client.set("key", "value")
+    assert client.get("key") is None
+    assert client.incr("counter") == 1
+    assert client.incr("counter") == 1
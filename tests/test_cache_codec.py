@@ -0,0 +1,81 @@
+import os
+import zlib
+
+import pytest
+
+from app import cache_manager
+from app.cache_codec import (
+    COMPRESSION_THRESHOLD, HEADER_MAGIC, FORMAT_ZLIB, FORMAT_ZLIB_DICT, decode_value, encode_value, key_family,
+)
+from app.cache_manager import redis_binary_client, redis_client
+
+REPORT = "## Executive Summary\n### Key Insights\nFocus on customer retention and pricing strategy. " * 100
+
+
+def test_small_values_are_stored_as_plain_utf8():
+    assert encode_value("Short answer £") == "Short answer £".encode("utf-8")
+
+
+def test_large_values_round_trip_compressed():
+    data = encode_value(REPORT)
+    assert data.startswith(HEADER_MAGIC + FORMAT_ZLIB_DICT)
+    assert len(data) < len(REPORT) / 5
+    assert decode_value(data) == REPORT
+
+
+def test_incompressible_values_stay_plain():
+    noise = os.urandom(COMPRESSION_THRESHOLD * 2)
+    assert encode_value(noise) == noise
+
+
+def test_legacy_values_are_still_readable():
+    assert decode_value(b"plain value written before compression") == "plain value written before compression"
+    assert decode_value("already decoded") == "already decoded"
+    assert decode_value(None) is None
+    assert decode_value(HEADER_MAGIC + FORMAT_ZLIB + b"\x00" + zlib.compress(b"zlib without dictionary")) == \
+        "zlib without dictionary"
+
+
+def test_unknown_formats_are_rejected():
+    with pytest.raises(ValueError):
+        decode_value(HEADER_MAGIC + FORMAT_ZLIB_DICT + bytes([99]) + b"payload")
+    with pytest.raises(ValueError):
+        decode_value(HEADER_MAGIC + b"?" + b"\x01" + b"payload")
+
+
+@pytest.mark.parametrize("key, family", [
+    ("query_cache:user_query:abc", "user_query"),
+    ("summary:abc", "summary"),
+    (b"user_session:7", "user_session"),
+])
+def test_key_family(key, family):
+    assert key_family(key) == family
+
+
+def test_cached_reports_are_stored_compressed_and_read_back():
+    cache_manager.cache_response("user_query:abc", REPORT)
+
+    stored = redis_binary_client.get(cache_manager.query_cache_key("user_query:abc"))
+    assert stored.startswith(HEADER_MAGIC)
+    assert cache_manager.get_cached_response("user_query:abc") == REPORT
+
+
+def test_byte_accounting_per_family():
+    cache_manager.cache_response("user_query:abc", REPORT)
+    cache_manager.cache_response("user_query:def", "short")
+    stats = cache_manager.get_cache_byte_stats()["user_query"]
+
+    assert stats["writes"] == 2
+    assert stats["raw_bytes"] == len(REPORT.encode("utf-8")) + len("short")
+    assert stats["stored_bytes"] == len(encode_value(REPORT)) + len("short")
+    assert stats["compression_ratio"] > 1
+
+
+def test_memory_by_prefix_groups_live_keys():
+    cache_manager.cache_response("user_query:abc", "short")
+    redis_client.set("user_session:7", "{}")
+    usage = cache_manager.get_cache_memory_by_prefix()
+
+    assert usage["user_query"]["keys"] == 1
+    assert usage["user_session"]["keys"] == 1
+    assert usage["user_query"]["bytes"] > 0
@@ -0,0 +1,87 @@
+import io
+
+import pytest
+
+from app import cache_keys
+from app.cache_keys import build_query_cache_key, build_request_context, hash_document, normalize_query
+
+QUERY = "What are the best customer retention strategies for SaaS?"
+PLAN = "The Foundation (Free)"
+
+
+def _key(**overrides):
+    request = {"query": QUERY, "archetype": "Visionary", "selected_experts": ["Porter", "Drucker"],
+               "user_plan": PLAN, "uploaded_files": None, "doc_usage_option": None}
+    request.update(overrides)
+    return build_query_cache_key(**request)
+
+
+def test_key_is_fixed_size_and_prefixed_by_family():
+    key = _key()
+    assert key.startswith("user_query:")
+    assert len(key) == len("user_query:") + 64
+    assert build_query_cache_key(QUERY, "Visionary", family="follow_up").startswith("follow_up:")
+
+
+def test_equivalent_queries_share_a_key():
+    assert _key(query="hey, what are the BEST customer retention strategies for SaaS") == _key()
+    assert normalize_query("Thanks!  Growth   plan?") == "growth plan"
+
+
+def test_currency_and_percent_signs_change_the_key():
+    assert _key(query="Raise prices by 10%") != _key(query="Raise prices by 10")
+    assert _key(query="Budget of £500") != _key(query="Budget of 500")
+
+
+def test_expert_order_does_not_matter_but_the_set_does():
+    assert _key(selected_experts=["Drucker", "Porter"]) == _key()
+    assert _key(selected_experts=["Porter"]) != _key()
+
+
+@pytest.mark.parametrize("overrides", [
+    {"archetype": "Strategist"},
+    {"user_plan": "The Growth (£500/month)"},
+    {"uploaded_files": [io.BytesIO(b"Q3 churn report")]},
+])
+def test_anything_that_changes_the_answer_changes_the_key(overrides):
+    assert _key(**overrides) != _key()
+
+
+def test_documents_are_keyed_by_content_not_name_or_order():
+    first, second = io.BytesIO(b"Q3 churn report"), io.BytesIO(b"Pricing survey")
+    assert _key(uploaded_files=[first, second]) == _key(uploaded_files=[io.BytesIO(b"Pricing survey"),
+                                                                      io.BytesIO(b"Q3 churn report")])
+    assert _key(uploaded_files=[first]) != _key(uploaded_files=[io.BytesIO(b"Q4 churn report")])
+
+
+def test_doc_usage_option_only_matters_with_documents():
+    files = [io.BytesIO(b"Q3 churn report")]
+    assert _key(doc_usage_option="Summarize & Ask Direct Questions") == _key()
+    assert _key(uploaded_files=files, doc_usage_option="Summarize & Ask Direct Questions") != \
+        _key(uploaded_files=files, doc_usage_option="Full analysis")
+
+
+def test_hash_document_does_not_consume_the_stream():
+    file = io.BytesIO(b"Q3 churn report")
+    file.read(3)
+    position = file.tell()
+    hash_document(file)
+    assert file.tell() == position
+
+
+def test_prompt_library_version_is_part_of_the_key(monkeypatch):
+    before = _key()
+    monkeypatch.setattr(cache_keys, "PROMPT_LIBRARY_VERSION", "changed")
+    assert _key() != before
+
+
+def test_prompt_library_version_follows_plan_report_depth(monkeypatch):
+    from app.config import PLAN_DETAILS
+    before = cache_keys._compute_prompt_library_version()
+    monkeypatch.setitem(PLAN_DETAILS[PLAN], "report_depth", "A one-line answer.")
+    assert cache_keys._compute_prompt_library_version() != before
+
+
+def test_precomputed_context_gives_the_same_key():
+    context = build_request_context("Visionary", ["Porter", "Drucker"], PLAN)
+    assert build_query_cache_key(QUERY, "Visionary", context=context) == _key()
@@ -0,0 +1,107 @@
+import threading
+
+import pytest
+
+from app import cache_manager
+from app.cache_manager import (
+    CHECK_AND_INCREMENT_LUA, _check_and_increment_fallback, check_and_increment_usage, get_usage_count,
+    usage_counter_key, usage_rollup_key, current_usage_period, redis_client,
+)
+
+
+# --- Quota check-and-increment ------------------------------------------------------------------
+
+def test_check_and_increment_stops_at_the_limit():
+    assert check_and_increment_usage(7, "queries", 2) == (True, 1)
+    assert check_and_increment_usage(7, "queries", 2) == (True, 0)
+    assert check_and_increment_usage(7, "queries", 2) == (False, 0)
+    assert get_usage_count(7, "queries") == 2
+
+
+def test_check_and_increment_records_rollup_and_expiry():
+    check_and_increment_usage(7, "follow_ups", 5)
+
+    period = current_usage_period()
+    assert redis_client.hgetall(usage_rollup_key(period)) == {"7:follow_ups": "1"}
+    assert redis_client.ttl(usage_counter_key(7, "follow_ups", period)) > 0
+    assert redis_client.ttl(usage_rollup_key(period)) > 0
+
+
+def test_usage_counters_are_independent_per_service():
+    check_and_increment_usage(7, "queries", 1)
+    assert check_and_increment_usage(7, "follow_ups", 1) == (True, 0)
+    assert check_and_increment_usage(8, "queries", 1) == (True, 0)
+
+
+def test_concurrent_submits_never_exceed_the_limit():
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(check_and_increment_usage(7, "queries", 5)[0]))
+               for _ in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results.count(True) == 5
+    assert get_usage_count(7, "queries") == 5
+
+
+@pytest.mark.parametrize("limit, ttl", [(3, 60), (1, 0)])
+def test_lua_script_matches_python_fallback(limit, ttl):
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")  # ✅ fakeredis needs it to run Lua
+
+    lua_client = fakeredis.FakeRedis(server=fakeredis.FakeServer(), decode_responses=True)
+    fallback_client = fakeredis.FakeRedis(server=fakeredis.FakeServer(), decode_responses=True)
+    script = lua_client.register_script(CHECK_AND_INCREMENT_LUA)
+    keys = ["usage:7:202601:queries", "usage_rollup:202601"]
+    args = [limit, ttl, "7:queries"]
+
+    for _ in range(limit + 2):
+        assert [int(value) for value in script(keys=keys, args=args)] == \
+            [int(value) for value in _check_and_increment_fallback(fallback_client, keys, args)]
+
+    for client in (lua_client, fallback_client):
+        assert client.get(keys[0]) == str(limit)
+        assert client.hgetall(keys[1]) == {"7:queries": str(limit)}
+    assert (lua_client.ttl(keys[0]) > 0) == (fallback_client.ttl(keys[0]) > 0) == (ttl > 0)
+
+
+# --- Billing-period counters --------------------------------------------------------------------
+
+def test_counters_are_keyed_by_billing_month():
+    month = cache_manager.billing_month()
+    assert current_usage_period() == month
+    assert usage_counter_key(7, "queries") == f"usage:7:{month}:queries"
+    check_and_increment_usage(7, "queries", 5)
+    assert 0 < redis_client.ttl(usage_counter_key(7, "queries")) <= cache_manager.usage_period_ttl(month)
+
+
+def test_reset_starts_every_user_from_zero_without_touching_old_keys():
+    check_and_increment_usage(7, "queries", 5)
+    check_and_increment_usage(8, "queries", 5)
+    old_key = usage_counter_key(7, "queries")
+
+    period = cache_manager.reset_current_usage_period()
+    assert period == f"{cache_manager.billing_month()}-r1"
+    assert current_usage_period() == period
+    assert get_usage_count(7, "queries") == get_usage_count(8, "queries") == 0
+    assert redis_client.get(old_key) == "1"  # ✅ Left to expire on its own
+    assert check_and_increment_usage(7, "queries", 5) == (True, 4)
+
+
+def test_store_ai_memory_does_not_create_legacy_counters():
+    cache_manager.store_ai_memory(7, "a follow-up question", "answer")
+
+    assert list(redis_client.scan_iter("user_*")) == []
+    assert cache_manager.get_ai_memory(7) == {"query": "a follow-up question", "response": "answer"}
+
+
+def test_delete_legacy_usage_counters():
+    redis_client.set("user_query_count:7", 12)
+    redis_client.set("user_follow_up_count:7", 3)
+    redis_client.set("user_session:7", "{}")
+
+    assert cache_manager.delete_legacy_usage_counters(batch_size=1) == 2
+    assert sorted(redis_client.scan_iter("user_*")) == ["user_session:7"]
+
@@ -0,0 +1,73 @@
+import threading
+import urllib.error
+import urllib.request
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+from app import cache_manager
+from app.cache_metrics import CacheMetrics, _MetricsHandler, cache_metrics
+
+
+@pytest.fixture(autouse=True)
+def fresh_metrics():
+    cache_metrics.reset()
+    yield
+    cache_metrics.reset()
+
+
+def test_hits_misses_and_writes_are_counted_per_family():
+    cache_manager.cache_response("user_query:abc", "x" * 400)
+    cache_manager.get_cached_response("user_query:abc")
+    cache_manager.get_cached_response("user_query:missing")
+    counters = cache_manager.get_cache_metrics()["user_query"]
+
+    assert (counters["writes"], counters["hits"], counters["misses"]) == (1, 1, 1)
+    assert counters["hits_redis"] == 1
+    assert counters["bytes_read"] == 400
+    assert counters["get_latency_count"] == 2
+    assert counters["set_latency_count"] == 1
+
+
+def test_hits_on_llm_families_estimate_tokens_and_cost_avoided():
+    metrics = CacheMetrics()
+    metrics.record_hit("user_query", "x" * 4000)
+    metrics.record_hit("user_session", "x" * 4000)
+    snapshot = metrics.snapshot()
+
+    assert snapshot["user_query"]["tokens_avoided"] == 1000
+    assert snapshot["user_query"]["cost_avoided_usd"] == pytest.approx(0.03)  # ✅ 1k gpt-4-turbo output tokens
+    assert snapshot["user_session"]["tokens_avoided"] == 0
+
+
+def test_prometheus_output():
+    metrics = CacheMetrics()
+    metrics.record_hit("summary", "cached", tier="local")
+    metrics.record_miss("summary")
+    metrics.observe_latency("summary", "get", 0.003)
+    text = metrics.render_prometheus()
+
+    assert "# TYPE stratogenic_cache_hits_total counter" in text
+    assert 'stratogenic_cache_hits_total{family="summary"} 1' in text
+    assert 'stratogenic_cache_misses_total{family="summary"} 1' in text
+    assert 'stratogenic_cache_hits_by_tier_total{family="summary",tier="local"} 1' in text
+    assert 'stratogenic_cache_latency_seconds_bucket{family="summary",operation="get",le="0.0025"} 0' in text
+    assert 'stratogenic_cache_latency_seconds_bucket{family="summary",operation="get",le="0.005"} 1' in text
+    assert 'stratogenic_cache_latency_seconds_bucket{family="summary",operation="get",le="+Inf"} 1' in text
+    assert 'stratogenic_cache_latency_seconds_count{family="summary",operation="get"} 1' in text
+
+
+def test_metrics_endpoint_serves_prometheus_text():
+    cache_metrics.record_miss("user_query")
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        with urllib.request.urlopen(f"{base_url}/metrics") as response:
+            assert response.headers["Content-Type"].startswith("text/plain")
+            assert 'stratogenic_cache_misses_total{family="user_query"} 1' in response.read().decode("utf-8")
+        with pytest.raises(urllib.error.HTTPError):
+            urllib.request.urlopen(f"{base_url}/other")
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,204 @@
+import time
+import threading
+from datetime import datetime, timedelta
+
+import psycopg2
+import psycopg2.extensions
+import pytest
+
+from app import database
+from app.database import BoundedConnectionPool, PoolTimeoutError
+
+
+def _insert_logs(storage, user_id, created_at_values):
+    columns = ("user_id", "query", "archetype", "response_hash", "plan", "created_at")
+    rows = [(user_id, f"query {index}", "Visionary", None, "The Foundation (Free)", created_at)
+            for index, created_at in enumerate(created_at_values)]
+    storage.insert_rows({"query_logs": (columns, rows, "")})
+
+
+class FakeConnection:
+    """Just enough of a psycopg2 connection for the pool."""
+
+    def __init__(self, healthy=True):
+        self.closed = 0
+        self.autocommit = False
+        self.healthy = healthy
+        self.status = psycopg2.extensions.TRANSACTION_STATUS_IDLE
+        self.rollbacks = 0
+
+    def cursor(self):
+        connection = self
+
+        class Cursor:
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc_info):
+                return False
+
+            def execute(self, sql):
+                if not connection.healthy:
+                    raise psycopg2.OperationalError("server closed the connection unexpectedly")
+
+        return Cursor()
+
+    def get_transaction_status(self):
+        return self.status
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.status = psycopg2.extensions.TRANSACTION_STATUS_IDLE
+
+    def close(self):
+        self.closed = 1
+
+
+@pytest.fixture
+def connections(monkeypatch):
+    created = []
+
+    def connect(**kwargs):
+        created.append(FakeConnection())
+        return created[-1]
+
+    monkeypatch.setattr(psycopg2, "connect", connect)
+    return created
+
+
+def test_pool_never_opens_more_than_maxconn(connections):
+    pool = BoundedConnectionPool(1, 2, timeout=0.1)
+    first, second = pool.getconn(), pool.getconn()
+
+    with pytest.raises(PoolTimeoutError):
+        pool.getconn()
+    assert len(connections) == 2
+    assert pool.stats()["checkout_failures"] == 1
+    assert pool.stats()["in_use"] == 2
+
+
+def test_waiters_get_the_next_released_connection(connections):
+    pool = BoundedConnectionPool(1, 1, timeout=5)
+    held = pool.getconn()
+    threading.Timer(0.2, pool.putconn, args=(held,)).start()
+
+    assert pool.getconn() is held
+    assert pool.stats()["wait_time_max"] >= 0.1
+
+
+def test_full_wait_queue_fails_fast(connections):
+    pool = BoundedConnectionPool(1, 1, timeout=1, max_waiters=1)
+    pool.getconn()
+    waiter = threading.Thread(target=lambda: pytest.raises(PoolTimeoutError, pool.getconn))
+    waiter.start()
+    time.sleep(0.1)
+
+    start = time.monotonic()
+    with pytest.raises(PoolTimeoutError, match="wait queue is full"):
+        pool.getconn()
+    assert time.monotonic() - start < 0.5
+    waiter.join()
+
+
+def test_idle_connections_failing_the_health_check_are_replaced(connections):
+    pool = BoundedConnectionPool(1, 1, validate_idle=0)
+    connections[0].healthy = False
+
+    conn = pool.getconn()
+    assert conn is connections[1]
+    assert connections[0].closed
+    assert pool.stats()["validation_failures"] == 1
+
+
+def test_old_connections_are_recycled(connections):
+    pool = BoundedConnectionPool(1, 1, max_lifetime=0.05)
+    time.sleep(0.1)
+
+    assert pool.getconn() is connections[1]
+    assert pool.stats()["connections_recycled"] == 1
+
+
+def test_broken_and_mid_transaction_connections_on_return(connections):
+    pool = BoundedConnectionPool(0, 2)
+    broken, busy = pool.getconn(), pool.getconn()
+    broken.status = psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN
+    busy.status = psycopg2.extensions.TRANSACTION_STATUS_INTRANS
+    pool.putconn(broken)
+    pool.putconn(busy)
+
+    assert broken.closed  # ✅ Freed its slot instead of going back to the pool
+    assert busy.rollbacks == 1 and not busy.closed
+    assert pool.stats()["idle"] == 1 and pool.stats()["in_use"] == 0
+
+
+def test_get_db_connection_returns_none_when_exhausted(connections, monkeypatch):
+    pool = BoundedConnectionPool(1, 1, timeout=0.1)
+    monkeypatch.setattr(database, "db_pool", pool)
+    conn = database.get_db_connection()
+
+    assert conn.autocommit is True
+    assert database.get_db_connection() is None
+    database.release_db_connection(conn)
+    assert database.get_db_connection() is conn
+
+
+def test_query_history_pages_cover_every_row_once(sqlite_storage, user_id):
+    now = datetime.now().replace(microsecond=0)
+    # ✅ Pairs of rows share a timestamp, so pages must break ties by id
+    _insert_logs(sqlite_storage, user_id, [now - timedelta(minutes=index // 2) for index in range(25)])
+
+    seen, cursor, pages = [], None, 0
+    while True:
+        rows, cursor = sqlite_storage.get_query_history(user_id, limit=10, before=cursor)
+        seen.extend(rows)
+        pages += 1
+        if cursor is None:
+            break
+
+    assert pages == 3
+    assert len(seen) == 25
+    assert len({row[0] for row in seen}) == 25
+    keys = [(row[1], row[0]) for row in seen]
+    assert keys == sorted(keys, reverse=True)
+
+
+def test_query_history_last_full_page_has_no_cursor(sqlite_storage, user_id):
+    _insert_logs(sqlite_storage, user_id, [datetime.now() - timedelta(seconds=index) for index in range(10)])
+
+    rows, cursor = sqlite_storage.get_query_history(user_id, limit=10)
+    assert len(rows) == 10
+    assert cursor is None
+
+
+def test_query_history_is_scoped_to_user(sqlite_storage, user_id):
+    other_user = sqlite_storage.create_user("other@example.com", "hash", "The Foundation (Free)")
+    _insert_logs(sqlite_storage, other_user, [datetime.now()])
+
+    rows, cursor = sqlite_storage.get_query_history(user_id)
+    assert rows == []
+    assert cursor is None
+
+
+def test_query_history_skips_rows_outside_retention_window(sqlite_storage, user_id):
+    now = datetime.now()
+    _insert_logs(sqlite_storage, user_id, [now, now - timedelta(days=3 * 365)])
+
+    rows, _ = sqlite_storage.get_query_history(user_id)
+    assert [row[2] for row in rows] == ["query 0"]
+    assert [row[0] for row in sqlite_storage.get_recent_queries_with_responses(user_id)] == ["query 0"]
+
+
+def test_sqlite_search_treats_wildcards_literally(sqlite_storage, user_id):
+    columns = ("user_id", "query", "archetype", "response_hash", "plan", "created_at")
+    queries = ["grow MRR by 10%", "grow MRR by 100", "user_id mapping", "userXid mapping", "C:\\reports\\q3"]
+    sqlite_storage.insert_rows({"query_logs": (columns, [
+        (user_id, query, "Visionary", None, "The Foundation (Free)", datetime.now()) for query in queries
+    ], "")})
+
+    def search(text):
+        return sorted(row[2] for row in sqlite_storage.get_query_history(user_id, search=text)[0])
+
+    assert search("10%") == ["grow MRR by 10%"]
+    assert search("user_id") == ["user_id mapping"]
+    assert search("\\reports") == ["C:\\reports\\q3"]
+    assert search("mrr") == ["grow MRR by 10%", "grow MRR by 100"]
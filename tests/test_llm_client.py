@@ -0,0 +1,133 @@
+import asyncio
+from types import SimpleNamespace
+from email.utils import formatdate
+
+import openai
+import pytest
+
+from app import llm_client
+from app.llm_client import complete, acomplete, is_retryable, retry_delay, stream_completion
+
+
+def _reply(text):
+    return SimpleNamespace(choices=[SimpleNamespace(message={"content": text})])
+
+
+def _chunks(*texts):
+    return [SimpleNamespace(choices=[SimpleNamespace(delta={"content": text})]) for text in texts]
+
+
+def _rate_limited(retry_after=None):
+    return openai.error.RateLimitError("Rate limit reached", http_status=429,
+                                       headers={"retry-after": retry_after} if retry_after else {})
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Records retry delays instead of sleeping."""
+    delays = []
+    monkeypatch.setattr(llm_client.time, "sleep", delays.append)
+    return delays
+
+
+@pytest.fixture
+def api(monkeypatch):
+    """Scripted `openai.ChatCompletion.create`: each call pops the next outcome (exception or value)."""
+    state = SimpleNamespace(outcomes=[], requests=[])
+
+    def create(**request):
+        state.requests.append(request)
+        outcome = state.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    monkeypatch.setattr(openai.ChatCompletion, "create", create)
+    return state
+
+
+@pytest.mark.parametrize("error, retryable", [
+    (_rate_limited(), True),
+    (openai.error.Timeout("read timed out"), True),
+    (openai.error.APIConnectionError("connection reset"), True),
+    (openai.error.APIError("bad gateway", http_status=502), True),
+    (openai.error.APIError("stream broke off"), True),
+    (openai.error.InvalidRequestError("context length exceeded", param=None, http_status=400), False),
+    (openai.error.AuthenticationError("bad key", http_status=401), False),
+])
+def test_which_errors_are_retried(error, retryable):
+    assert is_retryable(error) is retryable
+
+
+def test_transient_errors_are_retried_until_success(api, sleeps):
+    api.outcomes = [_rate_limited(), openai.error.Timeout("read timed out"), _reply("report")]
+
+    assert complete("prompt", "gpt-4-turbo", max_tokens=100) == "report"
+    assert len(api.requests) == 3 and len(sleeps) == 2
+    assert api.requests[0]["request_timeout"] == llm_client.LLM_TIMEOUT
+    assert api.requests[0]["max_tokens"] == 100
+
+
+def test_gives_up_after_max_retries(api, sleeps, monkeypatch):
+    monkeypatch.setattr(llm_client, "LLM_MAX_RETRIES", 2)
+    api.outcomes = [_rate_limited() for _ in range(3)]
+
+    with pytest.raises(openai.error.RateLimitError):
+        complete("prompt", "gpt-4-turbo")
+    assert len(api.requests) == 3 and len(sleeps) == 2
+
+
+def test_client_errors_are_raised_at_once(api, sleeps):
+    api.outcomes = [openai.error.InvalidRequestError("context length exceeded", param=None, http_status=400)]
+
+    with pytest.raises(openai.error.InvalidRequestError):
+        complete("prompt", "gpt-4-turbo")
+    assert sleeps == []
+
+
+def test_backoff_is_jittered_exponential_and_capped(monkeypatch):
+    monkeypatch.setattr(llm_client, "LLM_BACKOFF_BASE", 1.0)
+    monkeypatch.setattr(llm_client, "LLM_BACKOFF_MAX", 5.0)
+    monkeypatch.setattr(llm_client.random, "uniform", lambda low, high: high)  # ✅ Upper end of the jitter
+
+    assert [retry_delay(attempt) for attempt in range(5)] == [1.0, 2.0, 4.0, 5.0, 5.0]
+
+
+def test_retry_after_takes_precedence_and_is_capped(monkeypatch):
+    monkeypatch.setattr(llm_client, "LLM_MAX_RETRY_AFTER", 60)
+
+    assert retry_delay(0, _rate_limited("7")) == 7.0
+    assert retry_delay(0, _rate_limited("3600")) == 60
+    assert 0 < retry_delay(0, _rate_limited(formatdate(llm_client.time.time() + 10, usegmt=True))) <= 10
+    assert retry_delay(0, _rate_limited("soon")) <= llm_client.LLM_BACKOFF_BASE  # ✅ Unparseable: backoff
+
+
+def test_async_calls_retry_too(monkeypatch):
+    outcomes = [_rate_limited("0"), _reply("async report")]
+
+    async def acreate(**request):
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    monkeypatch.setattr(openai.ChatCompletion, "acreate", acreate)
+    assert asyncio.run(acomplete("prompt", "gpt-4-turbo")) == "async report"
+    assert outcomes == []
+
+
+def test_stream_retries_only_before_the_first_delta(api, sleeps):
+    def broken_stream():
+        yield from _chunks("Three ")
+        raise openai.error.APIError("stream broke off")
+
+    api.outcomes = [_rate_limited(), _chunks("Three ", "steps")]
+    assert list(stream_completion("prompt", "gpt-4-turbo")) == ["Three ", "steps"]
+    assert api.requests[0]["stream"] is True
+
+    api.outcomes = [broken_stream()]
+    stream = stream_completion("prompt", "gpt-4-turbo")
+    assert next(stream) == "Three "
+    with pytest.raises(openai.error.APIError):
+        next(stream)
+    assert len(sleeps) == 1
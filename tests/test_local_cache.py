@@ -0,0 +1,111 @@
+import sys
+import json
+import time
+
+import pytest
+
+from app import cache_manager
+from app.cache_manager import LocalCache, CACHE_INVALIDATION_CHANNEL, redis_client
+
+
+@pytest.fixture
+def two_tier(monkeypatch):
+    """Turns the local tier on in front of the in-memory backend, with a live invalidation listener."""
+    local_cache = LocalCache(max_bytes=1024 * 1024, default_ttl=60)
+    monkeypatch.setattr(cache_manager, "local_cache", local_cache)
+    monkeypatch.setattr(cache_manager, "LOCAL_CACHE_ENABLED", True)
+    monkeypatch.setattr(cache_manager, "_invalidation_thread", None)
+    assert cache_manager.start_invalidation_listener()
+    yield local_cache
+    if cache_manager._invalidation_thread is not None:
+        cache_manager._invalidation_thread.stop()
+
+
+def _publish_from_other_replica(*keys):
+    redis_client.publish(CACHE_INVALIDATION_CHANNEL, json.dumps({"origin": "other-replica", "keys": list(keys)}))
+
+
+def test_least_recently_used_entry_is_evicted_by_size():
+    value_size = sys.getsizeof("x" * 100)
+    cache = LocalCache(max_bytes=value_size * 2, default_ttl=60)
+    cache.set("a", "x" * 100)
+    cache.set("b", "y" * 100)
+    cache.get("a")  # ✅ "b" is now the least recently used
+    cache.set("c", "z" * 100)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == "x" * 100
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["bytes"] <= cache.max_bytes
+
+
+def test_oversized_values_are_not_cached():
+    cache = LocalCache(max_bytes=100, default_ttl=60)
+    cache.set("huge", "x" * 1000)
+    assert cache.get("huge") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_entries_expire_and_ttl_is_capped_by_the_default(monkeypatch):
+    cache = LocalCache(default_ttl=1)
+    cache.set("key", "value", ttl=3600)
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now + 1.5)
+
+    assert cache.get("key") is None
+    assert cache.stats()["expirations"] == 1
+
+
+def test_stats_report_hit_rate():
+    cache = LocalCache()
+    cache.set("key", "value")
+    cache.get("key")
+    cache.get("missing")
+    assert cache.stats()["hit_rate"] == 0.5
+
+
+def test_writes_fill_the_local_tier_and_reads_hit_it(two_tier):
+    cache_manager.cache_response("pricing", "cached report")
+    redis_client.flushdb()  # ✅ Only the local tier still has it
+
+    assert cache_manager.get_cached_response("pricing") == "cached report"
+    assert two_tier.stats()["hits"] == 1
+
+
+def test_other_replicas_writes_invalidate_the_local_copy(two_tier):
+    cache_manager.cache_response("pricing", "old report")
+    key = cache_manager.query_cache_key("pricing")
+    redis_client.set(key, "new report")  # ✅ Another replica's write...
+    _publish_from_other_replica(key)  # ✅ ...and its invalidation broadcast
+
+    assert two_tier.get(key) is None
+    assert cache_manager.get_cached_response("pricing") == "new report"
+
+
+def test_own_invalidation_messages_are_ignored(two_tier):
+    cache_manager.cache_response("pricing", "report")
+    assert two_tier.get(cache_manager.query_cache_key("pricing")) == "report"
+    assert two_tier.stats()["invalidations"] == 0
+
+
+def test_malformed_invalidation_messages_are_ignored(two_tier):
+    two_tier.set("key", "value")
+    redis_client.publish(CACHE_INVALIDATION_CHANNEL, "not json")
+    assert two_tier.get("key") == "value"
+
+
+def test_invalidate_cache_keys_clears_both_tiers(two_tier):
+    cache_manager.cache_response("pricing", "report")
+    key = cache_manager.query_cache_key("pricing")
+    cache_manager.invalidate_cache_keys(key)
+
+    assert two_tier.get(key) is None
+    assert redis_client.get(key) is None
+
+
+def test_local_tier_is_disabled_when_the_listener_dies(two_tier):
+    two_tier.set("key", "value")
+    cache_manager._handle_invalidation_error(RuntimeError("connection lost"), None, cache_manager._invalidation_thread)
+
+    assert cache_manager._invalidation_thread is None
+    assert two_tier.stats()["entries"] == 0
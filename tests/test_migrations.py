@@ -0,0 +1,45 @@
+import threading
+
+from app import migrations
+from app.storage_backend import SQLiteStorageBackend
+
+
+def test_migrations_apply_every_version_once(sqlite_storage):
+    with sqlite_storage.cursor() as cursor:
+        cursor.execute("SELECT version FROM schema_migrations ORDER BY version;")
+        assert [row[0] for row in cursor.fetchall()] == [version for version, _, _ in migrations.MIGRATIONS]
+
+
+def test_migrations_are_idempotent(sqlite_storage):
+    latest = migrations.MIGRATIONS[-1][0]
+    assert migrations.run_migrations() == latest
+    with sqlite_storage.cursor() as cursor:
+        assert migrations.get_schema_version(cursor) == latest
+        cursor.execute("SELECT COUNT(*) FROM schema_migrations;")
+        assert cursor.fetchone()[0] == len(migrations.MIGRATIONS)
+
+
+def test_concurrent_migration_runners_do_not_apply_twice(tmp_path, monkeypatch):
+    monkeypatch.setattr(migrations, "storage", SQLiteStorageBackend(str(tmp_path / "concurrent.db")))
+    results = []
+    runners = [threading.Thread(target=lambda: results.append(migrations.run_migrations())) for _ in range(4)]
+    for runner in runners:
+        runner.start()
+    for runner in runners:
+        runner.join()
+
+    assert results == [migrations.MIGRATIONS[-1][0]] * 4
+    with migrations.storage.cursor() as cursor:
+        cursor.execute("SELECT COUNT(*) FROM schema_migrations;")
+        assert cursor.fetchone()[0] == len(migrations.MIGRATIONS)
+
+
+def test_failed_migration_keeps_earlier_versions(tmp_path, monkeypatch):
+    monkeypatch.setattr(migrations, "storage", SQLiteStorageBackend(str(tmp_path / "failing.db")))
+    broken = migrations.MIGRATIONS[-1][0] + 1
+    monkeypatch.setattr(migrations, "MIGRATIONS", migrations.MIGRATIONS + [(broken, "broken", [])])
+    monkeypatch.setitem(migrations.SQLITE_MIGRATIONS, broken, ["CREATE TABLE users (id INTEGER);"])
+
+    assert migrations.run_migrations() == broken - 1
+    with migrations.storage.cursor() as cursor:
+        assert migrations.get_schema_version(cursor) == broken - 1
@@ -0,0 +1,95 @@
+import io
+import time
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app import pipeline
+from app.pipeline import NO_DOCUMENTS_TEXT, format_documents, run_report_pipeline
+
+STAGE_SECONDS = 0.2
+
+
+def _files(count):
+    files = []
+    for index in range(count):
+        file = io.BytesIO(b"content")
+        file.name = f"doc{index}.pdf"
+        files.append(file)
+    return files
+
+
+@pytest.fixture
+def stages(monkeypatch):
+    """Fake extraction and LLM stages (pattern analysis is the slowest); records what ran."""
+    state = SimpleNamespace(ran=[], pre_screen_result="All documents are related.")
+
+    def extract_text(files):
+        return {files[0].name: f"text of {files[0].name}"}
+
+    async def pre_screen(texts):
+        state.ran.append("pre_screen")
+        await asyncio.sleep(STAGE_SECONDS)
+        return state.pre_screen_result
+
+    async def analyze_patterns(texts):
+        state.ran.append("pattern_analysis")
+        await asyncio.sleep(STAGE_SECONDS * 2)
+        return "Churn peaks after onboarding."
+
+    async def acomplete(prompt, model, max_tokens):
+        state.ran.append(model)
+        await asyncio.sleep(0.01)
+        return "summary" if prompt.startswith("Summarize") else "report"
+
+    monkeypatch.setattr(pipeline, "extract_text", extract_text)
+    monkeypatch.setattr(pipeline, "async_pre_screen_documents", pre_screen)
+    monkeypatch.setattr(pipeline, "async_analyze_patterns", analyze_patterns)
+    monkeypatch.setattr(pipeline, "acomplete", acomplete)
+    return state
+
+
+def test_without_documents_nothing_is_analyzed(stages):
+    assert asyncio.run(format_documents([])) == NO_DOCUMENTS_TEXT
+    assert stages.ran == []
+
+
+def test_few_documents_are_inlined_without_llm_calls(stages):
+    assert asyncio.run(format_documents(_files(2))) == "📄 doc0.pdf: text of doc0.pdf\n📄 doc1.pdf: text of doc1.pdf"
+    assert stages.ran == []
+
+
+def test_pre_screening_and_pattern_analysis_run_concurrently(stages):
+    timings = {}
+    start = time.perf_counter()
+    formatted = asyncio.run(format_documents(_files(3), timings=timings))
+
+    assert formatted.endswith("Churn peaks after onboarding.")
+    assert sorted(stages.ran) == ["pattern_analysis", "pre_screen"]
+    assert time.perf_counter() - start < STAGE_SECONDS * 2.9  # ✅ Sequential stages would take 3x
+    assert set(timings) == {"extract", "pre_screen", "pattern_analysis"}
+
+
+def test_unrelated_documents_cancel_the_pattern_analysis(stages):
+    stages.pre_screen_result = "These documents are not related."
+    timings = {}
+    formatted = asyncio.run(format_documents(_files(3), timings=timings))
+
+    assert "not related" in formatted
+    assert "pattern_analysis" not in timings
+    assert "pattern_analysis_cancelled" in timings
+
+
+@pytest.mark.parametrize("plan, summary", [
+    ("The Foundation (Free)", None),
+    ("The Professional (£69/month)", "summary"),
+])
+def test_summary_only_for_plans_that_include_one(stages, plan, summary):
+    report, produced_summary, timings = asyncio.run(
+        run_report_pipeline("Pricing strategy?", "Visionary", [], None, plan)
+    )
+
+    assert (report, produced_summary) == ("report", summary)
+    assert ("summary" in timings) == (summary is not None)
+    assert timings["total"] >= timings["report"]
@@ -0,0 +1,54 @@
+import pytest
+
+from app import prompt_compiler, token_budget
+from app.prompt_compiler import compile_report_prefix, compile_report_prompt
+
+PLAN = "The Foundation (Free)"
+
+
+@pytest.fixture(autouse=True)
+def empty_prefix_cache():
+    compile_report_prefix.cache_clear()
+    yield
+    compile_report_prefix.cache_clear()
+
+
+def test_prefix_is_rendered_once_per_combination(monkeypatch):
+    renders = []
+    render = prompt_compiler._render_prefix
+
+    def counting_render(*args):
+        renders.append(args)
+        return render(*args)
+
+    monkeypatch.setattr(prompt_compiler, "_render_prefix", counting_render)
+    compile_report_prompt("Visionary", ["Porter", "Drucker"], PLAN, "Pricing?", None)
+    compile_report_prompt("Visionary", ["Drucker", "Porter"], PLAN, "Churn?", "📄 q3.pdf: churn up 4%")
+    compile_report_prompt("Strategist", ["Porter", "Drucker"], PLAN, "Pricing?", None)
+
+    assert renders == [("Visionary", ("Drucker", "Porter"), PLAN), ("Strategist", ("Drucker", "Porter"), PLAN)]
+    assert compile_report_prefix.cache_info().hits == 1
+
+
+def test_requests_share_a_byte_identical_prefix():
+    first = compile_report_prompt("Visionary", ["Porter"], PLAN, "Pricing?", None)
+    second = compile_report_prompt("Visionary", ["Porter"], PLAN, "Hiring plan?", "📄 plan.pdf: hire 3 engineers")
+    prefix, prefix_tokens = compile_report_prefix("Visionary", ("Porter",), PLAN)
+
+    assert first.startswith(prefix) and second.startswith(prefix)
+    assert prefix_tokens > 0
+    assert second.index("hire 3 engineers") < second.index("Hiring plan?")  # ✅ Query goes last
+
+
+def test_missing_documents_are_stated():
+    assert prompt_compiler.NO_DOCUMENTS_TEXT in compile_report_prompt("Visionary", [], PLAN, "Pricing?", "")
+
+
+def test_oversized_documents_are_trimmed_but_the_query_is_kept(monkeypatch):
+    monkeypatch.setattr(prompt_compiler, "REPORT_MAX_TOKENS", 8000)  # ✅ Leaves little of gpt-4-turbo's window
+    monkeypatch.setitem(token_budget.MODEL_CONTEXT_WINDOWS, "gpt-4-turbo", 9000)
+    documents = "📄 survey.pdf: " + "Customers want annual billing. " * 2000
+
+    prompt = compile_report_prompt("Visionary", [], PLAN, "Should we offer annual plans?", documents)
+    assert "Should we offer annual plans?" in prompt
+    assert len(prompt) < len(documents)
@@ -0,0 +1,92 @@
+import gzip
+import json
+from datetime import date, datetime
+
+from app import query_log_partitions
+from app.query_log_partitions import DEFAULT_PARTITION, _archive_default_partition
+
+CUTOFF = date(2024, 1, 1)
+EXPIRED_ROW = (7, 1, "pricing?", "The Foundation (Free)", datetime(2023, 5, 2, 9, 30), "Visionary", "abc", "Raise prices.")
+
+
+class FakeCursor:
+    """Scripted psycopg2 cursor: answers the default-partition count and export, records every statement."""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.itersize = None
+        self.rowcount = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def execute(self, sql, params=None):
+        self.conn.statements.append((" ".join(sql.split()), params))
+
+    def fetchone(self):
+        return self.conn.counts
+
+    def __iter__(self):
+        return iter(self.conn.rows)
+
+
+class FakeConnection:
+    def __init__(self, counts, rows=()):
+        self.counts, self.rows = counts, list(rows)
+        self.statements = []
+        self.autocommit = True
+        self.closed = 0
+
+    def cursor(self, name=None):
+        return FakeCursor(self)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+def test_expired_rows_of_the_default_partition_are_archived_then_deleted(tmp_path, capsys):
+    conn = FakeConnection(counts=(3, 1), rows=[EXPIRED_ROW])
+
+    assert _archive_default_partition(conn, CUTOFF, str(tmp_path)) == 1
+    assert "query_logs_default holds 3 rows (1 past retention)" in capsys.readouterr().out
+
+    export, delete = conn.statements[1], conn.statements[2]
+    assert f"FROM {DEFAULT_PARTITION} ql" in export[0] and "WHERE ql.created_at < %s" in export[0]
+    assert export[1] == (CUTOFF,)
+    assert delete == (f"DELETE FROM {DEFAULT_PARTITION} WHERE created_at < %s;", (CUTOFF,))
+
+    (archive_path,) = tmp_path.glob(f"{DEFAULT_PARTITION}_*.jsonl.gz")
+    with gzip.open(archive_path, "rt", encoding="utf-8") as archive_file:
+        record = json.loads(archive_file.readline())
+    assert record["query"] == "pricing?" and record["response"] == "Raise prices."
+    assert record["created_at"] == "2023-05-02T09:30:00"
+
+
+def test_default_partition_with_only_recent_rows_is_logged_but_kept(tmp_path, capsys):
+    conn = FakeConnection(counts=(2, 0))
+
+    assert _archive_default_partition(conn, CUTOFF, str(tmp_path)) == 0
+    assert "query_logs_default holds 2 rows" in capsys.readouterr().out
+    assert len(conn.statements) == 1
+    assert not list(tmp_path.iterdir())
+
+
+def test_empty_default_partition_is_silent(tmp_path, capsys):
+    assert _archive_default_partition(FakeConnection(counts=(0, 0)), CUTOFF, str(tmp_path)) == 0
+    assert capsys.readouterr().out == ""
+
+
+def test_archive_covers_the_default_partition(tmp_path, monkeypatch):
+    conn = FakeConnection(counts=(1, 1), rows=[EXPIRED_ROW])
+    monkeypatch.setattr(query_log_partitions, "get_db_connection", lambda: conn)
+    monkeypatch.setattr(query_log_partitions, "release_db_connection", lambda conn: None)
+    monkeypatch.setattr(query_log_partitions, "list_query_log_partitions", lambda cursor: {})
+
+    assert query_log_partitions.archive_expired_partitions(archive_dir=str(tmp_path)) == [DEFAULT_PARTITION]
+    assert conn.statements[-1][0].startswith("DELETE FROM responses r")  # ✅ Orphaned responses cleaned up too
@@ -0,0 +1,91 @@
+import pytest
+
+from app import query_similarity
+from app.cache_manager import cache_response, redis_client
+from app.query_similarity import QUERY_INDEX_PREFIX, QuerySimilarityIndex
+
+CONTEXT = "context"
+
+
+@pytest.fixture
+def index():
+    index = QuerySimilarityIndex(max_entries=100)
+    index.add(CONTEXT, "Customer retention strategies for SaaS companies in Germany", "report:germany")
+    index.add(CONTEXT, "Marketing budget allocation plan for 2024 product launch", "report:2024")
+    return index
+
+
+def test_rephrased_query_matches(index):
+    match = index.find(CONTEXT, "customer retention strategy for SaaS company in Germany")
+    assert match is not None and match[0] == "report:germany"
+
+
+def test_shorter_phrasing_of_the_same_question_matches():
+    index = QuerySimilarityIndex()
+    index.add(CONTEXT, "customer retention strategies for SaaS", "report:retention")
+    match = index.find(CONTEXT, "SaaS retention strategy")
+    assert match == ("report:retention", 0.75)
+
+
+def test_different_country_does_not_match(index):
+    assert index.find(CONTEXT, "Customer retention strategies for SaaS companies in France") is None
+
+
+def test_different_year_does_not_match(index):
+    assert index.find(CONTEXT, "Marketing budget allocation plan for 2025 product launch") is None
+
+
+def test_other_context_does_not_match(index):
+    assert index.find("other", "Customer retention strategies for SaaS companies in Germany") is None
+
+
+def test_same_words_with_a_different_business_model_do_not_match():
+    index = QuerySimilarityIndex()
+    index.add(CONTEXT, "B2B SaaS pricing", "report:b2b")
+    assert index.find(CONTEXT, "B2C SaaS pricing") is None
+
+
+def test_short_queries_are_not_indexed():
+    index = QuerySimilarityIndex()
+    index.add(CONTEXT, "pricing strategy", "report:pricing")
+    assert len(index) == 0
+    assert index.find(CONTEXT, "pricing strategy") is None
+
+
+def test_eviction_keeps_the_index_bounded():
+    index = QuerySimilarityIndex(max_entries=2)
+    for number, market in enumerate(["Germany", "France", "Spain"]):
+        index.add(CONTEXT, f"Customer retention strategies for SaaS companies in {market}", f"report:{number}")
+    assert len(index) == 2
+    assert index.find(CONTEXT, "Customer retention strategies for SaaS companies in Germany") is None
+
+
+@pytest.fixture
+def shared_index(monkeypatch):
+    """A fresh module-level index, loaded lazily from Redis like a new replica."""
+    monkeypatch.setattr(query_similarity, "similarity_index", QuerySimilarityIndex())
+    monkeypatch.setattr(query_similarity, "_index_loaded", False)
+    return query_similarity
+
+
+def test_redis_index_is_capped_to_the_newest_entries(shared_index, monkeypatch):
+    monkeypatch.setattr(query_similarity, "SIMILARITY_MAX_ENTRIES", 2)
+    for number, topic in enumerate(["pricing", "retention", "hiring"]):
+        shared_index.register_cached_query(CONTEXT, f"{topic} strategy for growing startups", f"report:{number}")
+
+    assert redis_client.zrange(f"{QUERY_INDEX_PREFIX}:{CONTEXT}", 0, -1) == [
+        '["retention strategy for growing startups", "report:1"]',
+        '["hiring strategy for growing startups", "report:2"]',
+    ]
+
+
+def test_rebuild_prunes_entries_whose_report_expired(shared_index):
+    cache_response("report:live", "live report")
+    shared_index.register_cached_query(CONTEXT, "customer retention strategies for SaaS", "report:live")
+    shared_index.register_cached_query(CONTEXT, "pricing strategy for growing startups", "report:expired")
+
+    assert shared_index.rebuild_similarity_index() == 1
+    assert redis_client.zrange(f"{QUERY_INDEX_PREFIX}:{CONTEXT}", 0, -1) == [
+        '["customer retention strategies for SaaS", "report:live"]',
+    ]
+    assert shared_index.find_similar_cached_response(CONTEXT, "SaaS retention strategy") == "live report"
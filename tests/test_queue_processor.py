@@ -0,0 +1,145 @@
+import os
+import json
+import threading
+from datetime import datetime
+
+from app import queue_processor
+from app.queue_processor import WriteBehindBuffer
+
+
+def _log_row(user_id, query):
+    return ("query_logs", (user_id, query, "Visionary", None, "The Foundation (Free)", datetime.now().isoformat(sep=" ")))
+
+
+def _logged_queries(storage):
+    with storage.cursor() as cursor:
+        cursor.execute("SELECT query FROM query_logs ORDER BY id;")
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _buffer(tmp_path, **kwargs):
+    buffer = WriteBehindBuffer(flush_interval=3600, spill_path=str(tmp_path / "spill.jsonl"), **kwargs)
+    buffer._thread = object()  # ✅ No background flusher: tests call flush() themselves
+    return buffer
+
+
+def _fail_writes(monkeypatch, storage):
+    def insert_rows(rows_by_table):
+        raise RuntimeError("database unavailable")
+    monkeypatch.setattr(storage, "insert_rows", insert_rows)
+
+
+def test_flush_writes_pending_rows(sqlite_storage, user_id, tmp_path):
+    buffer = _buffer(tmp_path)
+    buffer.enqueue_many([_log_row(user_id, "first"), _log_row(user_id, "second")])
+
+    assert buffer.flush() == 2
+    assert buffer.pending_count() == 0
+    assert _logged_queries(sqlite_storage) == ["first", "second"]
+
+
+def test_failed_batch_is_spilled_and_replayed(sqlite_storage, user_id, tmp_path, monkeypatch):
+    buffer = _buffer(tmp_path)
+    buffer.enqueue(*_log_row(user_id, "kept"))
+
+    _fail_writes(monkeypatch, sqlite_storage)
+    assert buffer.flush() == 0
+    with open(buffer.spill_path, encoding="utf-8") as spill_file:
+        assert [json.loads(line)["row"][1] for line in spill_file] == ["kept"]
+
+    monkeypatch.delattr(sqlite_storage, "insert_rows")  # ✅ Database is back
+    assert buffer.flush() == 1
+    assert _logged_queries(sqlite_storage) == ["kept"]
+    assert buffer._spill_files() == [buffer.spill_path]
+    assert not os.path.exists(buffer.spill_path)
+
+
+def test_overflow_goes_to_spill_file(sqlite_storage, user_id, tmp_path):
+    buffer = _buffer(tmp_path, max_pending=1)
+    buffer.enqueue(*_log_row(user_id, "buffered"))
+    buffer.enqueue(*_log_row(user_id, "spilled"))
+
+    assert buffer.pending_count() == 1
+    assert buffer.flush() == 2
+    assert sorted(_logged_queries(sqlite_storage)) == ["buffered", "spilled"]
+
+
+def test_replay_picks_up_batches_stranded_by_other_workers(sqlite_storage, user_id, tmp_path):
+    buffer = _buffer(tmp_path)
+    stranded = f"{buffer.spill_path}.99999.deadbeef.replay"  # ✅ Claimed by a worker that died before replaying
+    with open(stranded, "w", encoding="utf-8") as spill_file:
+        table, row = _log_row(user_id, "stranded")
+        spill_file.write(json.dumps({"table": table, "row": list(row)}) + "\n")
+        spill_file.write('{"table": "query_logs", "ro')  # ✅ Torn last line is skipped
+
+    assert buffer.flush() == 1
+    assert _logged_queries(sqlite_storage) == ["stranded"]
+    assert not os.path.exists(stranded)
+
+
+def test_spill_bound_counts_unreplayed_claims(sqlite_storage, user_id, tmp_path, monkeypatch):
+    buffer = _buffer(tmp_path, spill_max_bytes=10)
+    with open(f"{buffer.spill_path}.99999.deadbeef.replay", "w", encoding="utf-8") as spill_file:
+        spill_file.write("x" * 10)
+
+    _fail_writes(monkeypatch, sqlite_storage)
+    buffer._spill([_log_row(user_id, "dropped")])
+
+    assert not os.path.exists(buffer.spill_path)
+
+
+def test_rows_spilled_during_a_replay_are_not_lost(sqlite_storage, user_id, tmp_path):
+    buffer = _buffer(tmp_path)
+    spilling = [threading.Thread(target=lambda name=name: [buffer._spill([_log_row(user_id, f"{name}-{index}")])
+                                                           for index in range(200)])
+                for name in ("first", "second")]
+    for thread in spilling:
+        thread.start()
+    while any(thread.is_alive() for thread in spilling):
+        buffer.flush()  # ✅ Claims and replays the spill file while both threads keep appending
+    buffer.flush()
+
+    logged = _logged_queries(sqlite_storage)
+    assert len(logged) == 400
+    assert len(set(logged)) == 400
+
+
+def test_replay_never_claims_a_file_mid_append(sqlite_storage, user_id, tmp_path, monkeypatch):
+    buffer = _buffer(tmp_path)
+    buffer._spill([_log_row(user_id, "early")])
+    appending, replayed = threading.Event(), threading.Event()
+    dumps = json.dumps
+
+    def slow_dumps(entry, *args, **kwargs):
+        if isinstance(entry, dict) and entry.get("row", [None, None])[1] == "late":
+            appending.set()  # ✅ Spill file is open; hold the append until a replay has run
+            replayed.wait(2)
+        return dumps(entry, *args, **kwargs)
+
+    monkeypatch.setattr(queue_processor.json, "dumps", slow_dumps)
+    writer = threading.Thread(target=buffer._spill, args=([_log_row(user_id, "late")],))
+    writer.start()
+    appending.wait(2)
+    buffer.flush()
+    replayed.set()
+    writer.join()
+    buffer.flush()
+
+    assert sorted(_logged_queries(sqlite_storage)) == ["early", "late"]
+
+
+def test_repeated_responses_are_stored_once(sqlite_storage, user_id, tmp_path, monkeypatch):
+    buffer = _buffer(tmp_path)
+    monkeypatch.setattr(queue_processor, "write_behind", buffer)
+    queue_processor.enqueue_query_log(user_id, "pricing?", "Raise prices.", "The Foundation (Free)")
+    buffer.flush()
+    queue_processor.enqueue_query_log(user_id, "pricing again?", "Raise prices.", "The Foundation (Free)")
+    queue_processor.enqueue_query_log(user_id, "no answer", None, "The Foundation (Free)")
+    buffer.flush()
+
+    with sqlite_storage.cursor() as cursor:
+        cursor.execute("SELECT COUNT(*) FROM responses;")
+        assert cursor.fetchone()[0] == 1
+    assert sorted(row[:2] for row in sqlite_storage.get_recent_queries_with_responses(user_id)) == [
+        ("no answer", None), ("pricing again?", "Raise prices."), ("pricing?", "Raise prices."),
+    ]
@@ -0,0 +1,126 @@
+import time
+import threading
+
+import redis
+
+from app import single_flight as sf
+from app.cache_manager import redis_client
+
+
+def _run_concurrently(count, target):
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(target())) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+        time.sleep(0.02)  # ✅ The first thread becomes the leader
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_concurrent_callers_share_one_computation(monkeypatch):
+    monkeypatch.setattr(sf, "SINGLE_FLIGHT_POLL_INTERVAL", 0.05)
+    calls = []
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.3)
+        return "report"
+
+    assert _run_concurrently(5, lambda: sf.single_flight("report-key", compute)) == ["report"] * 5
+    assert len(calls) == 1
+    assert redis_client.get(sf._lock_key("report-key")) is None  # ✅ Released after publishing
+
+
+def test_leader_keeps_its_lock_past_the_lock_timeout(monkeypatch):
+    monkeypatch.setattr(sf, "SINGLE_FLIGHT_POLL_INTERVAL", 0.05)
+    calls = []
+
+    def compute():
+        calls.append(1)
+        time.sleep(2.5)  # ✅ Longer than the 1 s lock timeout: only renewal keeps followers waiting
+        return "slow report"
+
+    results = _run_concurrently(3, lambda: sf.single_flight("slow-key", compute, lock_timeout=1))
+    assert results == ["slow report"] * 3
+    assert len(calls) == 1
+
+
+def test_follower_takes_over_when_the_leader_dies(monkeypatch):
+    monkeypatch.setattr(sf, "SINGLE_FLIGHT_POLL_INTERVAL", 0.05)
+    redis_client.set(sf._lock_key("orphaned-key"), "crashed-worker", ex=1)  # ✅ Never renewed or released
+
+    start = time.monotonic()
+    assert sf.single_flight("orphaned-key", lambda: "recomputed", wait_timeout=10) == "recomputed"
+    assert time.monotonic() - start < 5
+
+
+def test_follower_takes_over_when_the_leader_fails_without_a_result(monkeypatch):
+    monkeypatch.setattr(sf, "SINGLE_FLIGHT_POLL_INTERVAL", 0.05)
+    calls = []
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.2)
+        if len(calls) == 1:
+            raise TimeoutError("LLM call timed out")  # ✅ Leader releases its lock without publishing
+        return "recomputed"
+
+    results = []
+
+    def call():
+        try:
+            results.append(sf.single_flight("failing-key", compute))
+        except TimeoutError:
+            results.append("failed")
+
+    leader = threading.Thread(target=call)
+    leader.start()
+    time.sleep(0.05)
+    call()
+    leader.join()
+
+    assert sorted(results) == ["failed", "recomputed"]
+    assert len(calls) == 2
+
+
+def test_wait_timeout_computes_directly(monkeypatch):
+    monkeypatch.setattr(sf, "SINGLE_FLIGHT_POLL_INTERVAL", 0.05)
+    redis_client.set(sf._lock_key("stuck-key"), "stuck-leader", ex=60)  # ✅ Live lock, no result coming
+
+    start = time.monotonic()
+    assert sf.single_flight("stuck-key", lambda: "direct", wait_timeout=0.3) == "direct"
+    assert time.monotonic() - start < 2
+    assert redis_client.get(sf._lock_key("stuck-key")) == "stuck-leader"  # ✅ Not the follower's to take
+
+
+def test_redis_outage_computes_directly(monkeypatch):
+    def unavailable(*args, **kwargs):
+        raise redis.ConnectionError("down")
+
+    monkeypatch.setattr(redis_client, "set", unavailable)
+    assert sf.single_flight("outage-key", lambda: "direct") == "direct"
+
+
+def test_stream_followers_receive_the_leaders_full_text(monkeypatch):
+    monkeypatch.setattr(sf, "SINGLE_FLIGHT_POLL_INTERVAL", 0.05)
+    calls = []
+
+    def stream():
+        calls.append(1)
+        for chunk in ("Three ", "actionable ", "steps"):
+            time.sleep(0.1)
+            yield chunk
+
+    results = _run_concurrently(3, lambda: "".join(sf.single_flight_stream("stream-key", stream)))
+    assert results == ["Three actionable steps"] * 3
+    assert len(calls) == 1
+
+
+def test_abandoned_stream_publishes_nothing():
+    stream = sf.single_flight_stream("abandoned-key", lambda: iter(["partial ", "text"]))
+    assert next(stream) == "partial "
+    stream.close()
+
+    assert sf._read_result("abandoned-key") is None
+    assert redis_client.get(sf._lock_key("abandoned-key")) is None
@@ -0,0 +1,54 @@
+import pytest
+
+from app import token_budget
+from app.token_budget import MESSAGE_OVERHEAD_TOKENS, count_tokens, fit_sections, truncate_to_tokens
+
+WINDOW = 100 + MESSAGE_OVERHEAD_TOKENS  # ✅ 100 tokens of usable budget
+
+
+@pytest.fixture(autouse=True)
+def estimated_tokens(monkeypatch):
+    """Counts ~4 characters per token so budgets do not depend on tiktoken's downloaded files."""
+    monkeypatch.setattr(token_budget, "get_encoding", lambda model=None: None)
+    monkeypatch.setitem(token_budget.MODEL_CONTEXT_WINDOWS, "tiny", WINDOW)
+
+
+def _text(tokens, sentence="Keep churn low. "):
+    return (sentence * tokens)[:tokens * 4]
+
+
+def test_count_and_truncate_with_the_estimate():
+    assert count_tokens("") == 0
+    assert count_tokens("abcde") == 2
+    assert truncate_to_tokens("abcdefgh", 1) == "abcd"
+    assert truncate_to_tokens("abcdefgh", 1, from_end=True) == "efgh"
+    assert truncate_to_tokens("First point. Second point is long", 5, whole_sentences=True) == "First point..."
+
+
+def test_sections_that_fit_are_kept_whole():
+    sections = [("query", _text(20), 0), ("documents", _text(50), 2), ("history", _text(20), 1)]
+    assert fit_sections(sections, "tiny") == {name: text for name, text, _ in sections}
+
+
+def test_lowest_priority_sections_are_trimmed_first():
+    query, history, documents = _text(30), _text(40), _text(60)
+    fitted = fit_sections([("documents", documents, 2), ("query", query, 0), ("history", history, 1)], "tiny")
+
+    assert fitted["query"] == query and fitted["history"] == history
+    assert count_tokens(fitted["documents"]) <= 30
+    assert fitted["documents"].endswith("...")  # ✅ Cut back to a whole sentence
+    assert sum(count_tokens(text) for text in fitted.values()) <= 100
+
+
+def test_sections_after_the_budget_is_spent_are_dropped():
+    fitted = fit_sections([("query", _text(100), 0), ("documents", _text(10), 1)], "tiny")
+    assert fitted == {"query": _text(100), "documents": ""}
+
+
+def test_reserved_tokens_shrink_the_budget():
+    fitted = fit_sections([("documents", _text(80), 0)], "tiny", reserved_tokens=50)
+    assert count_tokens(fitted["documents"]) <= 50
+
+
+def test_unknown_models_use_the_default_window():
+    assert token_budget.context_window("some-new-model") == token_budget.DEFAULT_CONTEXT_WINDOW
@@ -0,0 +1,64 @@
+import pytest
+
+from app import user_management, user_profile
+from app.cache_manager import redis_client
+from app.user_profile import get_user_profile, invalidate_user_profile, user_profile_key
+
+PLAN = "The Foundation (Free)"
+
+
+@pytest.fixture
+def profile_storage(sqlite_storage, monkeypatch):
+    """Counts profile reads that reach the database."""
+    reads = []
+    load = sqlite_storage.load_user_profile
+
+    def counting_load(user_id):
+        reads.append(user_id)
+        return load(user_id)
+
+    monkeypatch.setattr(sqlite_storage, "load_user_profile", counting_load)
+    monkeypatch.setattr(user_profile, "storage", sqlite_storage)
+    monkeypatch.setattr(user_management, "storage", sqlite_storage)
+    return reads
+
+
+def test_profile_is_served_from_the_cache(profile_storage, user_id):
+    expected = {"user_id": user_id, "plan": PLAN, "is_admin": False, "one_time_follow_ups": 0}
+    assert get_user_profile(user_id) == expected
+    assert get_user_profile(user_id) == expected
+    assert profile_storage == [user_id]
+
+
+def test_plan_changes_invalidate_the_cached_profile(profile_storage, user_id):
+    get_user_profile(user_id)
+    user_management.update_user_plan(user_id, "The Growth (£500/month)")
+
+    assert get_user_profile(user_id)["plan"] == "The Growth (£500/month)"
+    assert len(profile_storage) == 2
+
+
+def test_unknown_users_are_cached_briefly(profile_storage):
+    assert get_user_profile(424242) is None
+    assert get_user_profile(424242) is None
+    assert profile_storage == [424242]
+    assert 0 < redis_client.ttl(user_profile_key(424242)) <= user_profile.USER_PROFILE_MISS_TTL
+
+
+def test_registering_a_user_clears_a_cached_miss(profile_storage, sqlite_storage):
+    next_id = sqlite_storage.create_user("probe@example.com", "hash", PLAN) + 1
+    assert get_user_profile(next_id) is None
+
+    assert user_management.register_user("new@example.com", "secret") == next_id
+    assert get_user_profile(next_id)["plan"] == PLAN
+
+
+def test_database_errors_are_not_cached(profile_storage, sqlite_storage, user_id, monkeypatch):
+    invalidate_user_profile(user_id)
+
+    def unavailable(user_id):
+        raise RuntimeError("database unavailable")
+
+    monkeypatch.setattr(sqlite_storage, "load_user_profile", unavailable)
+    assert get_user_profile(user_id) is None
+    assert redis_client.get(user_profile_key(user_id)) is None